@@ -0,0 +1,217 @@
+"""
+Embeds learning path titles that have no embedding, or one produced by another model than
+GEMINI_MODEL_EMBEDDING, and writes them back with the model name in embedding_model.
+
+    python Maintenance/backfill_embeddings.py [--dry-run] [--page-size 500] [--batch-size 50]
+                                              [--concurrency 4] [--requests-per-minute 300]
+    python Maintenance/backfill_embeddings.py --adopt-unlabeled
+    python Maintenance/backfill_embeddings.py --neighbors-only
+
+Paths are read in id order, a page at a time. Each page is split into batches that are embedded
+concurrently (one API request per batch, rate limited), then written in one bulk RPC. After each
+page the last id is saved to a checkpoint file, so an interrupted run resumes where it stopped.
+A page with a batch that still fails after retries stops the run before its checkpoint is
+saved; re-running retries it.
+
+Once a run has embedded anything, the related-paths list of every embedded path is recomputed
+from the new vectors, one path at a time, so GET /paths/<path_id>/related never goes empty
+(skip with --skip-neighbors, or redo only this step with --neighbors-only). Running API
+processes pick up the new vectors in their in-process vector index at the next reconcile
+(VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS); restart them to do it at once.
+
+Uses SUPABASE_URL, SUPABASE_SERVICE_KEY, GEMINI_API_KEY, GEMINI_MODEL_EMBEDDING and
+RELATED_PATHS_COUNT from .env, and needs database/migrations/003_embedding_model.sql applied.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from supabase import create_client
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+load_dotenv()
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.embedding_backfill_checkpoint.json')
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute, across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def load_checkpoint(path, model):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('model') != model:
+        logging.warning(f"Ignoring checkpoint for model {checkpoint.get('model')}; now embedding with {model}.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def embed_batch(titles, model, rate_limiter, retries):
+    for attempt in range(retries):
+        rate_limiter.acquire()
+        try:
+            result = genai.embed_content(model=model, content=titles)
+            embeddings = result['embedding']
+            if len(embeddings) != len(titles):
+                raise ValueError(f"Expected {len(titles)} embeddings, got {len(embeddings)}")
+            return embeddings
+        except Exception as e:
+            if attempt + 1 == retries:
+                raise
+            delay = 2 ** attempt * 5
+            logging.warning(f"Embedding batch attempt {attempt + 1}/{retries} failed, retrying in {delay}s: {e}")
+            time.sleep(delay)
+
+
+def refresh_neighbor_lists(supabase_client, k, page_size):
+    """Recomputes the path_neighbors list of every embedded path, in id order. Returns how many it did."""
+    refreshed, last_id = 0, 0
+    while True:
+        page = supabase_client.table('learning_paths').select('id').not_.is_('title_embedding', 'null').gt(
+            'id', last_id).order('id').limit(page_size).execute().data or []
+        for row in page:
+            try:
+                supabase_client.rpc('compute_path_neighbors', {'p_path_id': row['id'], 'p_k': k}).execute()
+            except Exception as e:
+                if 'compute_path_neighbors' not in str(e):
+                    raise
+                logging.warning(f"compute_path_neighbors does not exist; skipping related paths. Apply "
+                                f"database/migrations/005_path_neighbors.sql to use them. Error: {e}")
+                return refreshed
+        refreshed += len(page)
+        if len(page) < page_size:
+            return refreshed
+        last_id = page[-1]['id']
+        logging.info(f"Recomputed {refreshed} related-paths lists, through id {last_id}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=500, help='Paths read and written per page (default 500)')
+    parser.add_argument('--batch-size', type=int, default=50, help='Titles per embedding request, max 100 (default 50)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Embedding requests in flight (default 4)')
+    parser.add_argument('--requests-per-minute', type=int, default=300,
+                        help='Embedding request rate limit (default 300)')
+    parser.add_argument('--retries', type=int, default=5, help='Attempts per embedding request (default 5)')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='Checkpoint file path')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first path')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the paths that need embedding')
+    parser.add_argument('--skip-neighbors', action='store_true',
+                        help='Do not recompute the related-paths lists after embedding')
+    parser.add_argument('--neighbors-only', action='store_true',
+                        help='Only recompute the related-paths lists from the current embeddings')
+    parser.add_argument('--adopt-unlabeled', action='store_true',
+                        help='Label existing embeddings without a model as GEMINI_MODEL_EMBEDDING instead of '
+                             're-embedding them; only if they are known to come from that model')
+    args = parser.parse_args()
+
+    supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    model = os.getenv("GEMINI_MODEL_EMBEDDING", "models/text-embedding-004")
+    neighbor_count = int(os.getenv("RELATED_PATHS_COUNT", 10))
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+    if args.neighbors_only:
+        refreshed = refresh_neighbor_lists(supabase_client, neighbor_count, args.page_size)
+        logging.info(f"Recomputed {refreshed} related-paths lists.")
+        return
+
+    if args.adopt_unlabeled:
+        adopted = supabase_client.rpc('adopt_unlabeled_embeddings', {'p_model': model}).execute().data
+        logging.info(f"Labeled {adopted} existing embeddings as {model}.")
+        return
+
+    checkpoint = None if args.restart or args.dry_run else load_checkpoint(args.checkpoint, model)
+    if checkpoint:
+        logging.info(f"Resuming after path {checkpoint['last_id']} ({checkpoint['embedded']} embedded so far).")
+    else:
+        checkpoint = {'model': model, 'last_id': 0, 'embedded': 0, 'started_at': time.time()}
+
+    rate_limiter = RateLimiter(args.requests_per_minute)
+    batch_size = max(1, min(args.batch_size, 100))
+    started = time.monotonic()
+    embedded_this_run = 0
+
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='embed') as executor:
+        while True:
+            page = supabase_client.rpc('get_paths_needing_embedding', {
+                'p_model': model,
+                'p_after_id': checkpoint['last_id'],
+                'p_limit': args.page_size
+            }).execute().data or []
+            if not page:
+                break
+            if args.dry_run:
+                checkpoint['embedded'] += len(page)
+                checkpoint['last_id'] = page[-1]['id']
+                continue
+
+            batches = [page[i:i + batch_size] for i in range(0, len(page), batch_size)]
+            futures = [executor.submit(embed_batch, [row['title'] for row in batch], model, rate_limiter, args.retries)
+                       for batch in batches]
+
+            items, failure = [], None
+            for batch, future in zip(batches, futures):
+                try:
+                    items.extend({'id': row['id'], 'embedding': embedding}
+                                 for row, embedding in zip(batch, future.result()))
+                except Exception as e:
+                    failure = e
+            if items:
+                supabase_client.rpc('update_path_embeddings', {'p_model': model, 'p_items': items}).execute()
+                embedded_this_run += len(items)
+            if failure is not None:
+                logging.error(f"Stopping: a batch of the page starting after path {checkpoint['last_id']} failed. "
+                              f"Re-run to resume from there. Error: {failure}")
+                raise SystemExit(1)
+
+            checkpoint['last_id'] = page[-1]['id']
+            checkpoint['embedded'] += len(items)
+            save_checkpoint(args.checkpoint, checkpoint)
+            rate = embedded_this_run / max(time.monotonic() - started, 1e-9)
+            logging.info(f"Embedded {checkpoint['embedded']} paths, through id {checkpoint['last_id']} "
+                         f"({rate:.1f} paths/s).")
+
+    if args.dry_run:
+        logging.info(f"{checkpoint['embedded']} paths need an embedding from {model}.")
+        return
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    logging.info(f"Done. {checkpoint['embedded']} paths embedded with {model} in total, "
+                 f"{embedded_this_run} in this run.")
+
+    if checkpoint['embedded'] and not args.skip_neighbors:
+        refreshed = refresh_neighbor_lists(supabase_client, neighbor_count, args.page_size)
+        logging.info(f"Recomputed {refreshed} related-paths lists from the new embeddings.")
+
+
+if __name__ == '__main__':
+    main()
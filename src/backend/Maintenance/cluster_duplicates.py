@@ -0,0 +1,181 @@
+"""
+Finds near-duplicate learning paths across the whole catalog and maps each duplicate to a
+canonical path, which search, listing and related paths then show in its place.
+
+    python Maintenance/cluster_duplicates.py [--threshold 0.92] [--block-size 2048] [--report duplicates.json]
+    python Maintenance/cluster_duplicates.py --apply
+
+All title embeddings are loaded into one normalized float32 matrix (about 3 KB per path). Cosine
+similarities are computed block by block over the upper triangle, so only block_size^2 of them
+are held in memory at a time. Pairs above the threshold are merged with union-find. In each
+cluster, the path with the most learners is canonical, with the oldest path winning ties.
+
+Without --apply, only the report is written. With --apply, the canonical_path_id mapping is
+replaced in one transaction. Uses SUPABASE_URL and SUPABASE_SERVICE_KEY from .env and needs
+database/migrations/004_canonical_paths.sql applied.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import create_client
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+load_dotenv()
+
+PAGE_SIZE = 1000
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = np.arange(size)
+        self.size = np.ones(size, dtype=np.int64)
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
+
+def load_embeddings(supabase_client):
+    """Returns (rows, matrix), where matrix[i] is the unit-length embedding of rows[i]."""
+    rows, blocks, last_id = [], [], 0
+    while True:
+        page = supabase_client.table('learning_paths').select(
+            'id, title, embedding_model, title_embedding'
+        ).not_.is_('title_embedding', 'null').gt('id', last_id).order('id').limit(PAGE_SIZE).execute().data or []
+        if page:
+            # Convert each page right away: as Python floats an embedding takes about 25 KB, not 3 KB.
+            embeddings = [row.pop('title_embedding') for row in page]
+            blocks.append(np.asarray([json.loads(embedding) if isinstance(embedding, str) else embedding
+                                      for embedding in embeddings], dtype=np.float32))
+            rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        last_id = page[-1]['id']
+        logging.info(f"Loaded {len(rows)} embeddings...")
+
+    matrix = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+    del blocks
+    if len(rows):
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return rows, matrix
+
+
+def find_similar_pairs(matrix, threshold, block_size, union_find):
+    """Unions every pair above the threshold. Returns the number of such pairs."""
+    pair_count = 0
+    total = len(matrix)
+    for row_start in range(0, total, block_size):
+        row_block = matrix[row_start:row_start + block_size]
+        for col_start in range(row_start, total, block_size):
+            similarities = row_block @ matrix[col_start:col_start + block_size].T
+            if col_start == row_start:
+                # Keep each pair once and skip self-similarity on the diagonal block.
+                similarities = np.triu(similarities, k=1)
+            rows, cols = np.nonzero(similarities > threshold)
+            for i, j in zip(rows + row_start, cols + col_start):
+                union_find.union(int(i), int(j))
+            pair_count += len(rows)
+        logging.info(f"Compared rows {row_start}-{min(row_start + block_size, total) - 1} of {total}; "
+                     f"{pair_count} similar pairs so far.")
+    return pair_count
+
+
+def build_clusters(rows, matrix, union_find, popularity):
+    members = {}
+    for index in range(len(rows)):
+        members.setdefault(union_find.find(index), []).append(index)
+
+    clusters = []
+    for indexes in members.values():
+        if len(indexes) < 2:
+            continue
+        canonical = min(indexes, key=lambda i: (-popularity.get(rows[i]['id'], 0), rows[i]['id']))
+        similarities = matrix[indexes] @ matrix[canonical]
+        clusters.append({
+            'canonical': {**rows[canonical], 'learners': popularity.get(rows[canonical]['id'], 0)},
+            'duplicates': sorted(
+                ({**rows[i], 'learners': popularity.get(rows[i]['id'], 0),
+                  'similarity_to_canonical': round(float(similarity), 4)}
+                 for i, similarity in zip(indexes, similarities) if i != canonical),
+                key=lambda duplicate: -duplicate['similarity_to_canonical'])
+        })
+    clusters.sort(key=lambda cluster: -len(cluster['duplicates']))
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threshold', type=float, default=0.92,
+                        help='Cosine similarity above which two titles are duplicates (default 0.92)')
+    parser.add_argument('--block-size', type=int, default=2048,
+                        help='Rows per similarity block; memory is block_size^2 * 4 bytes (default 2048)')
+    parser.add_argument('--report', default='duplicate_clusters.json', help='Report file (default duplicate_clusters.json)')
+    parser.add_argument('--apply', action='store_true', help='Write the canonical_path_id mapping')
+    args = parser.parse_args()
+
+    supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    started = time.monotonic()
+
+    rows, matrix = load_embeddings(supabase_client)
+    logging.info(f"Loaded {len(rows)} embeddings ({matrix.nbytes / 2 ** 20:.0f} MiB).")
+    models = Counter(row.get('embedding_model') for row in rows)
+    if len(models) > 1:
+        logging.warning(f"The catalog mixes embedding models {dict(models)}; similarities across models are "
+                        f"meaningless. Run Maintenance/backfill_embeddings.py first.")
+
+    union_find = UnionFind(len(rows))
+    pair_count = find_similar_pairs(matrix, args.threshold, args.block_size, union_find)
+
+    popularity_res = supabase_client.rpc('get_path_popularity', {}).execute()
+    popularity = {row['path_id']: row['learners'] for row in (popularity_res.data or [])}
+    clusters = build_clusters(rows, matrix, union_find, popularity)
+    duplicate_count = sum(len(cluster['duplicates']) for cluster in clusters)
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'threshold': args.threshold,
+        'paths': len(rows),
+        'similar_pairs': pair_count,
+        'clusters': len(clusters),
+        'duplicates': duplicate_count,
+        # Union-find chains matches, so a low value here flags a cluster worth reviewing by hand.
+        'lowest_similarity_to_canonical': min(
+            (d['similarity_to_canonical'] for cluster in clusters for d in cluster['duplicates']), default=None),
+        'applied': args.apply,
+        'clusters_detail': clusters
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logging.info(f"Found {len(clusters)} clusters holding {duplicate_count} duplicates in "
+                 f"{time.monotonic() - started:.1f}s. Report written to {args.report}.")
+
+    if args.apply:
+        mapping = [{'id': duplicate['id'], 'canonical_path_id': cluster['canonical']['id']}
+                   for cluster in clusters for duplicate in cluster['duplicates']]
+        updated = supabase_client.rpc('set_canonical_paths', {'p_mapping': mapping}).execute().data
+        logging.info(f"Mapped {updated} duplicate paths to their canonical paths.")
+    else:
+        logging.info("Dry run: re-run with --apply to write the canonical_path_id mapping.")
+
+
+if __name__ == '__main__':
+    main()
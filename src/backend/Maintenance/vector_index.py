@@ -0,0 +1,193 @@
+"""
+Manages the HNSW index over learning_paths.title_embedding.
+
+    python Maintenance/vector_index.py status
+    python Maintenance/vector_index.py build [--m 16] [--ef-construction 64] [--concurrently]
+    python Maintenance/vector_index.py tune [--k 10] [--queries 100] [--target-recall 0.95]
+    python Maintenance/vector_index.py compact-storage --yes
+
+Connects to the database in DATABASE_URL (the direct Postgres connection string from
+Supabase > Project Settings > Database). Needs psycopg2: pip install psycopg2-binary
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+load_dotenv()
+
+INDEX_NAME = 'idx_learning_paths_title_embedding_hnsw'
+INDEXED_EXPRESSION = 'title_embedding::halfvec(768)'
+EF_SEARCH_CANDIDATES = [10, 20, 40, 64, 100, 200, 400]
+
+
+def connect():
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL not found in the environment or .env file")
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    return connection
+
+
+def status(cursor, args):
+    cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    row = cursor.fetchone()
+    logging.info(f"pgvector version: {row[0] if row else 'not installed'}")
+
+    cursor.execute("""
+        SELECT format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = 'learning_paths'::regclass AND a.attname = 'title_embedding'
+    """)
+    logging.info(f"title_embedding storage: {cursor.fetchone()[0]}")
+
+    cursor.execute("SELECT count(*), count(title_embedding) FROM learning_paths")
+    total, embedded = cursor.fetchone()
+    logging.info(f"Paths: {total} ({embedded} with an embedding)")
+    cursor.execute("SELECT pg_size_pretty(pg_total_relation_size('learning_paths'))")
+    logging.info(f"learning_paths total size: {cursor.fetchone()[0]}")
+
+    cursor.execute("""
+        SELECT i.indexname, i.indexdef, pg_size_pretty(pg_relation_size(c.oid)), x.indisvalid
+        FROM pg_indexes i
+        JOIN pg_class c ON c.relname = i.indexname
+        JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE i.tablename = 'learning_paths' AND (i.indexdef ILIKE '%hnsw%' OR i.indexdef ILIKE '%ivfflat%')
+    """)
+    indexes = cursor.fetchall()
+    if not indexes:
+        logging.info("No vector index found. Similarity RPCs fall back to a sequential scan.")
+    for name, definition, size, valid in indexes:
+        logging.info(f"Index {name} ({size}{'' if valid else ', INVALID - rebuild it'}): {definition}")
+
+
+def build(cursor, args):
+    """Builds the index under a temporary name and swaps it in, so queries keep an index meanwhile."""
+    cursor.execute("SELECT set_config('maintenance_work_mem', %s, false)", (args.maintenance_work_mem,))
+    concurrently = 'CONCURRENTLY ' if args.concurrently else ''
+    new_index_name = f"{INDEX_NAME}_new"
+    cursor.execute(f"DROP INDEX {concurrently}IF EXISTS {new_index_name}")
+
+    logging.info(f"Building {INDEX_NAME} with m={args.m}, ef_construction={args.ef_construction}...")
+    started = time.monotonic()
+    cursor.execute(f"""
+        CREATE INDEX {concurrently}{new_index_name} ON learning_paths
+        USING hnsw (({INDEXED_EXPRESSION}) halfvec_cosine_ops) WITH (m = %s, ef_construction = %s)
+    """, (args.m, args.ef_construction))
+    elapsed = time.monotonic() - started
+
+    cursor.execute(f"DROP INDEX {concurrently}IF EXISTS {INDEX_NAME}")
+    cursor.execute(f"ALTER INDEX {new_index_name} RENAME TO {INDEX_NAME}")
+    cursor.execute("SELECT pg_size_pretty(pg_relation_size(%s::regclass))", (INDEX_NAME,))
+    logging.info(f"Built in {elapsed:.1f}s, size {cursor.fetchone()[0]}.")
+    cursor.execute("ANALYZE learning_paths")
+
+
+def _nearest_ids(cursor, embedding, k):
+    cursor.execute(f"""
+        SELECT id FROM learning_paths
+        WHERE title_embedding IS NOT NULL
+        ORDER BY {INDEXED_EXPRESSION} <=> %s::halfvec(768)
+        LIMIT %s
+    """, (embedding, k))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def tune(cursor, args):
+    """Measures recall@k and latency per ef_search against exact results and recommends a setting."""
+    cursor.execute("""
+        SELECT title_embedding::text FROM learning_paths
+        WHERE title_embedding IS NOT NULL
+        ORDER BY random()
+        LIMIT %s
+    """, (args.queries,))
+    queries = [row[0] for row in cursor.fetchall()]
+    if not queries:
+        logging.error("No embedded paths to sample queries from.")
+        return
+
+    logging.info(f"Computing exact top-{args.k} for {len(queries)} sampled paths...")
+    cursor.execute("BEGIN")
+    cursor.execute("SET LOCAL enable_indexscan = off")
+    exact = [set(_nearest_ids(cursor, query, args.k)) for query in queries]
+    cursor.execute("COMMIT")
+
+    logging.info(f"\n{'ef_search':>10}{'recall':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    recommended = None
+    for ef_search in EF_SEARCH_CANDIDATES:
+        if ef_search < args.k:
+            continue
+        cursor.execute("SET hnsw.ef_search = %s", (ef_search,))
+        recalls, timings = [], []
+        for query, truth in zip(queries, exact):
+            started = time.perf_counter()
+            found = _nearest_ids(cursor, query, args.k)
+            timings.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(truth.intersection(found)) / len(truth) if truth else 1.0)
+        timings.sort()
+        recall = statistics.mean(recalls)
+        logging.info(f"{ef_search:>10}{recall:>10.3f}{timings[len(timings) // 2]:>10.2f}"
+                     f"{timings[max(0, int(len(timings) * 0.95) - 1)]:>10.2f}")
+        if recommended is None and recall >= args.target_recall:
+            recommended = ef_search
+
+    if recommended is None:
+        logging.info(f"\nNo ef_search reached recall {args.target_recall}. Rebuild with a larger --m or "
+                     f"--ef-construction.")
+    else:
+        logging.info(f"\nSet VECTOR_EF_SEARCH={recommended} for recall >= {args.target_recall} at k={args.k}.")
+
+
+def compact_storage(cursor, args):
+    """Converts title_embedding to halfvec(768), halving its storage. Rewrites the table under an exclusive lock."""
+    if not args.yes:
+        logging.error("This rewrites learning_paths and blocks reads and writes while it runs. "
+                      "Re-run with --yes to proceed.")
+        return
+    cursor.execute("SELECT pg_size_pretty(pg_total_relation_size('learning_paths'))")
+    logging.info(f"learning_paths size before: {cursor.fetchone()[0]}")
+    started = time.monotonic()
+    cursor.execute("ALTER TABLE learning_paths ALTER COLUMN title_embedding TYPE halfvec(768)")
+    cursor.execute("SELECT pg_size_pretty(pg_total_relation_size('learning_paths'))")
+    logging.info(f"Converted in {time.monotonic() - started:.1f}s. learning_paths size after: {cursor.fetchone()[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('status', help='Show pgvector version, embedding storage and vector indexes')
+
+    build_parser = commands.add_parser('build', help='(Re)build the HNSW index')
+    build_parser.add_argument('--m', type=int, default=16, help='Graph connections per node (default 16)')
+    build_parser.add_argument('--ef-construction', type=int, default=64, help='Build-time candidate list (default 64)')
+    build_parser.add_argument('--maintenance-work-mem', default='512MB',
+                              help='Memory for the build; builds that fit are much faster (default 512MB)')
+    build_parser.add_argument('--concurrently', action='store_true', help='Build without blocking writes')
+
+    tune_parser = commands.add_parser('tune', help='Measure recall and latency per ef_search')
+    tune_parser.add_argument('--k', type=int, default=10, help='Neighbors per query (default 10)')
+    tune_parser.add_argument('--queries', type=int, default=100, help='Sampled query paths (default 100)')
+    tune_parser.add_argument('--target-recall', type=float, default=0.95, help='Recall to recommend for (default 0.95)')
+
+    compact_parser = commands.add_parser('compact-storage', help='Store title_embedding as halfvec(768)')
+    compact_parser.add_argument('--yes', action='store_true', help='Confirm the table rewrite')
+
+    args = parser.parse_args()
+    handlers = {'status': status, 'build': build, 'tune': tune, 'compact-storage': compact_storage}
+
+    connection = connect()
+    try:
+        handlers[args.command](connection.cursor(), args)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
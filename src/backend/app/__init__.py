@@ -1,5 +1,7 @@
+import importlib.util
 import logging
 from flask import Flask
+from flask_socketio import SocketIO
 from supabase import create_client, Client
 from web3 import Web3
 from web3.middleware import ExtraDataToPOAMiddleware
@@ -12,6 +14,19 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config.from_object(config)
 
+# The client package each message queue URL scheme needs. Flask-SocketIO only imports the Redis
+# client once it first publishes, so a missing package is reported here, at startup.
+_MESSAGE_QUEUE_PACKAGES = (('redis', 'redis', 'redis'), ('kafka', 'kafka', 'kafka-python'), ('zmq', 'zmq', 'pyzmq'))
+if config.SOCKETIO_MESSAGE_QUEUE:
+    _module, _package = next(((module, package) for prefix, module, package in _MESSAGE_QUEUE_PACKAGES
+                              if config.SOCKETIO_MESSAGE_QUEUE.startswith(prefix)), ('kombu', 'kombu'))
+    if importlib.util.find_spec(_module) is None:
+        raise RuntimeError(f"SOCKETIO_MESSAGE_QUEUE is set, but its '{_package}' package is not installed. "
+                           f"Install it with: pip install {_package}")
+
+socketio = SocketIO(app, async_mode='threading', message_queue=config.SOCKETIO_MESSAGE_QUEUE,
+                    cors_allowed_origins=config.SOCKETIO_CORS_ALLOWED_ORIGINS)
+
 supabase_client: Client = create_client(config.SUPABASE_URL, config.SUPABASE_SERVICE_KEY)
 logger.info("Supabase client initialized.")
 
@@ -36,10 +51,12 @@ else:
     logger.error("CRITICAL: Failed to connect to Ethereum node.")
     account = None
 
-from app.routes import user_routes, path_routes, progress_routes, nft_routes, search_routes
+from app.routes import user_routes, path_routes, progress_routes, nft_routes, search_routes, websocket_routes
 
 app.register_blueprint(user_routes.bp)
 app.register_blueprint(path_routes.bp)
 app.register_blueprint(progress_routes.bp)
 app.register_blueprint(nft_routes.bp)
 app.register_blueprint(search_routes.bp)
+
+websocket_routes.register_events(socketio)
@@ -23,6 +23,13 @@ class Config:
     PINATA_API_KEY = os.getenv("PINATA_API_KEY")
     PINATA_API_SECRET = os.getenv("PINATA_API_SECRET")
     PINATA_GATEWAY_URL = os.getenv("PINATA_GATEWAY_URL")
+    IPFS_MAX_CONCURRENT_UPLOADS = int(os.getenv("IPFS_MAX_CONCURRENT_UPLOADS", 4))
+    IPFS_UPLOAD_RETRIES = int(os.getenv("IPFS_UPLOAD_RETRIES", 3))
+    IPFS_CID_VERSION = int(os.getenv("IPFS_CID_VERSION", 1))
+    IPFS_PIN_INDEX_PATH = os.getenv("IPFS_PIN_INDEX_PATH", "ipfs_pin_index.json")
+    IPFS_PIN_TIMEOUT_SECONDS = int(os.getenv("IPFS_PIN_TIMEOUT_SECONDS", 120))
+    IPFS_PIN_INDEX_SAVE_INTERVAL_SECONDS = int(os.getenv("IPFS_PIN_INDEX_SAVE_INTERVAL_SECONDS", 30))
+    IPFS_PIN_INDEX_RETENTION_SECONDS = int(os.getenv("IPFS_PIN_INDEX_RETENTION_SECONDS", 30 * 24 * 3600))
 
     LIVE_DEMO_PORT = int(os.getenv("LIVE_DEMO_PORT", 9999))
 
@@ -34,11 +41,70 @@ class Config:
 
     BACKEND_WALLET_PRIVATE_KEY = os.getenv("BACKEND_WALLET_PRIVATE_KEY")
     BACKEND_WALLET_ADDRESS = os.getenv("BACKEND_WALLET_ADDRESS")
+    # Optional pool of extra signer keys (comma-separated). Each must be authorized on both contracts via setSigner.
+    BACKEND_SIGNER_PRIVATE_KEYS = [key.strip() for key in os.getenv("BACKEND_SIGNER_PRIVATE_KEYS", "").split(",")
+                                   if key.strip()]
+    SIGNER_SELECTION_STRATEGY = os.getenv("SIGNER_SELECTION_STRATEGY", "least_pending").lower()
+    SIGNER_MIN_BALANCE_ETH = float(os.getenv("SIGNER_MIN_BALANCE_ETH", 0.005))
+    SIGNER_BALANCE_CHECK_INTERVAL_SECONDS = int(os.getenv("SIGNER_BALANCE_CHECK_INTERVAL_SECONDS", 60))
+
+    # Stuck transactions are re-sent with the same nonce and bumped fees instead of failing outright.
+    TX_CONFIRMATION_TIMEOUT_SECONDS = int(os.getenv("TX_CONFIRMATION_TIMEOUT_SECONDS", 180))
+    TX_REPLACEMENT_INTERVAL_SECONDS = int(os.getenv("TX_REPLACEMENT_INTERVAL_SECONDS", 45))
+    TX_FEE_BUMP_PERCENT = float(os.getenv("TX_FEE_BUMP_PERCENT", 20))
+    TX_MAX_FEE_CAP_GWEI = float(os.getenv("TX_MAX_FEE_CAP_GWEI", 100))
 
     PATH_REGISTRY_CONTRACT_ADDRESS = os.getenv("PATH_REGISTRY_CONTRACT_ADDRESS")
     NFT_CONTRACT_ADDRESS = os.getenv("NFT_CONTRACT_ADDRESS")
 
+    USER_ID_CACHE_TTL_SECONDS = int(os.getenv("USER_ID_CACHE_TTL_SECONDS", 3600))
+    USER_ID_CACHE_MAX_SIZE = int(os.getenv("USER_ID_CACHE_MAX_SIZE", 10000))
+    PATH_CACHE_MAX_SIZE = int(os.getenv("PATH_CACHE_MAX_SIZE", 256))
+
+    PROGRESS_BATCH_MAX_ITEMS = int(os.getenv("PROGRESS_BATCH_MAX_ITEMS", 500))
+    PROGRESS_WRITE_BEHIND = os.getenv("PROGRESS_WRITE_BEHIND", "false").lower() == "true"
+    PROGRESS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROGRESS_FLUSH_INTERVAL_SECONDS", 1.0))
+    PROGRESS_FLUSH_MAX_PENDING = int(os.getenv("PROGRESS_FLUSH_MAX_PENDING", 200))
+
+    TASK_EVENT_HISTORY_LIMIT = int(os.getenv("TASK_EVENT_HISTORY_LIMIT", 500))
+    TASK_EVENT_RETAIN_SECONDS = int(os.getenv("TASK_EVENT_RETAIN_SECONDS", 300))
+    TASK_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("TASK_LOG_FLUSH_INTERVAL_SECONDS", 0.5))
+    TASK_LOG_RETENTION_SECONDS = int(os.getenv("TASK_LOG_RETENTION_SECONDS", 7 * 24 * 3600))
+    TASK_LOG_STALE_SECONDS = int(os.getenv("TASK_LOG_STALE_SECONDS", 24 * 3600))
+    # Set to 0 to disable the retention janitor in this process.
+    TASK_LOG_JANITOR_INTERVAL_SECONDS = int(os.getenv("TASK_LOG_JANITOR_INTERVAL_SECONDS", 3600))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+    # Leave empty for a single process; set to e.g. redis://localhost:6379/0 when API servers and
+    # generation workers run in separate processes. memory:// (kombu) is an in-process stand-in for tests.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+    SOCKETIO_CORS_ALLOWED_ORIGINS = os.getenv("SOCKETIO_CORS_ALLOWED_ORIGINS", "*")
+
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.85))
+    # What a generation request for a topic that is already being generated gets: "attach" answers 202
+    # with the running task_id, "reject" answers 409 pointing to it.
+    GENERATION_COALESCE_MODE = os.getenv("GENERATION_COALESCE_MODE", "attach").lower()
+    GENERATION_COALESCE_THRESHOLD = float(os.getenv("GENERATION_COALESCE_THRESHOLD", SIMILARITY_THRESHOLD))
+    GENERATION_COALESCE_MAX_AGE_SECONDS = int(os.getenv("GENERATION_COALESCE_MAX_AGE_SECONDS", 1800))
+    SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", 8))
+    SEARCH_SEMANTIC_TIMEOUT_SECONDS = float(os.getenv("SEARCH_SEMANTIC_TIMEOUT_SECONDS", 1.5))
+    SEARCH_KEYWORD_TIMEOUT_SECONDS = float(os.getenv("SEARCH_KEYWORD_TIMEOUT_SECONDS", 2.0))
+    SEARCH_CACHE_MAX_SIZE = int(os.getenv("SEARCH_CACHE_MAX_SIZE", 1000))
+    # Entries are invalidated by catalog changes made through this process. Set a TTL only when other
+    # processes also create or delete paths, as a bound on how stale their changes can appear here.
+    SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 0))
+
+    # HNSW candidate list size for the similarity RPCs; tune with Maintenance/vector_index.py tune.
+    VECTOR_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", 40))
+    VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+    VECTOR_INDEX_HNSW_THRESHOLD = int(os.getenv("VECTOR_INDEX_HNSW_THRESHOLD", 20000))
+    VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS = int(os.getenv("VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS", 600))
+    VECTOR_INDEX_COMPACT_RATIO = float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", "0.25"))
+    SUGGEST_MAX_RESULTS = int(os.getenv("SUGGEST_MAX_RESULTS", 8))
+    SUGGEST_REFRESH_INTERVAL_SECONDS = int(os.getenv("SUGGEST_REFRESH_INTERVAL_SECONDS", 300))
+    RELATED_PATHS_COUNT = int(os.getenv("RELATED_PATHS_COUNT", 10))
+    RELATED_PATHS_REFILL_BATCH_SIZE = int(os.getenv("RELATED_PATHS_REFILL_BATCH_SIZE", 100))
+    # Backfills paths without related-path lists at startup. Enable it on one API process only.
+    RELATED_PATHS_BACKFILL_ON_START = os.getenv("RELATED_PATHS_BACKFILL_ON_START", "false").lower() == "true"
     MAX_CONCURRENT_LEVEL_GENERATORS = int(os.getenv("MAX_CONCURRENT_LEVEL_GENERATORS", 3))
 
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "b7359d34c833f6dd3f302e28b8ec2d237dd3fd5543717fd7ce9f2ecaf66ae6be")
@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from web3.exceptions import TransactionNotFound
 from app import logger
 from app.services import supabase_service, blockchain_service, ai_service, ipfs_service
 from app.config import config
@@ -7,6 +8,112 @@ import os
 bp = Blueprint('nft_routes', __name__)
 
 
+def _check_mint_eligibility(user_wallet, path_id):
+    """
+    Returns an error response if the user may not receive a certificate for this path
+    (already minted in the DB or on-chain, or the path is not complete), otherwise None.
+    """
+    existing_nft_db = supabase_service.get_nft_by_user_and_path(user_wallet, path_id)
+    if existing_nft_db:
+        logger.warning(f"NFT: DB check blocked re-mint for user {user_wallet}, path {path_id}.")
+        return jsonify({
+            "error": "Certificate has already been minted.",
+            "detail": "Our database shows that an NFT certificate has already been awarded for this path.",
+            "nft_data": existing_nft_db
+        }), 409
+
+    is_already_minted_on_chain = blockchain_service.check_if_nft_already_minted(user_wallet, path_id)
+    if is_already_minted_on_chain:
+        logger.warning(f"NFT: Blockchain check blocked re-mint for user {user_wallet}, path {path_id}.")
+        return jsonify({
+            "error": "Certificate has already been minted.",
+            "detail": "The blockchain confirms that an NFT certificate has already been awarded for this path.",
+        }), 409
+
+    is_complete = supabase_service.get_path_completion_status(user_wallet, path_id)
+    if not is_complete:
+        return jsonify({"error": "Path is not yet complete. Cannot mint NFT."}), 400
+
+    return None
+
+
+def _prepare_certificate_metadata(user_wallet, path_id):
+    """
+    Generates (or reuses) the certificate image and uploads it and its metadata JSON to IPFS.
+    Returns a (certificate, error_response) tuple; exactly one of the two is set.
+    """
+    nft_details = supabase_service.get_user_and_path_for_nft(user_wallet, path_id)
+    if not nft_details:
+        return None, (jsonify({"error": "Could not find user or path details."}), 404)
+
+    user_name = nft_details.get('user_name', user_wallet)
+    path_title = nft_details.get('path_title', 'Unknown Path')
+
+    cert_dir = os.path.abspath("certificates")
+    safe_wallet = user_wallet.replace('0x', '')[:10]
+    image_file_name = f"cert_{path_id}_{safe_wallet}.png"
+    image_file_path = os.path.join(cert_dir, image_file_name)
+    logger.info(f"IMAGE: Target certificate image path: {image_file_path}")
+
+    if not os.path.exists(image_file_path):
+        logger.info(f"IMAGE: Certificate file '{image_file_path}' not found. Generating new image...")
+        generated_path = ai_service.generate_certificate_image(path_title, user_name, image_file_path)
+        if not generated_path:
+            logger.error(
+                f"IMAGE: ai_service.generate_certificate_image failed to produce an image at {image_file_path}")
+            return None, (jsonify({"error": "Failed to generate NFT image."}), 500)
+        logger.info(f"IMAGE: New certificate image generated and saved to '{generated_path}'")
+    else:
+        logger.info(f"IMAGE: Certificate file '{image_file_path}' already exists. Using existing image.")
+
+    if not os.path.exists(image_file_path):
+        logger.error(
+            f"IMAGE: CRITICAL! Image file '{image_file_path}' still does not exist after generation/check. Cannot proceed with IPFS upload.")
+        return None, (jsonify({"error": "Failed to obtain certificate image for IPFS upload."}), 500)
+
+    image_cid, image_pin = ipfs_service.pin_file_async(image_file_path)
+    logger.info(f"IPFS: Image '{image_file_path}' has CID {image_cid}. Pinning in the background.")
+
+    image_gateway_url = f"{config.PINATA_GATEWAY_URL}/{image_cid}"
+
+    metadata = {
+        "name": f"KODO Certificate: {path_title}",
+        "description": f"This certificate proves that {user_name} successfully completed the '{path_title}' learning path on KODO.",
+        "image": image_gateway_url,
+        "attributes": [
+            {"trait_type": "Platform", "value": "KODO"},
+            {"trait_type": "Recipient", "value": user_name}
+        ]
+    }
+    metadata_name = f"metadata_{path_id}_{safe_wallet}.json"
+    metadata_cid, metadata_pin = ipfs_service.pin_json_async(metadata, metadata_name)
+    logger.info(f"IPFS: Metadata JSON '{metadata_name}' has CID {metadata_cid}. Pinning in the background.")
+
+    return {
+        "image_gateway_url": image_gateway_url,
+        "metadata_cid": metadata_cid,
+        "metadata_url": f"ipfs://{metadata_cid}",
+        "pins": [(image_cid, image_pin), (metadata_cid, metadata_pin)]
+    }, None
+
+
+def _await_certificate_pins(certificate):
+    """
+    Waits for the background IPFS pins started by _prepare_certificate_metadata.
+    Returns an error response if any pin failed or did not produce the locally computed CID, otherwise None.
+    """
+    for expected_cid, pin in certificate['pins']:
+        try:
+            pinned_cid = pin.result(timeout=config.IPFS_PIN_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error(f"IPFS: Pin for CID {expected_cid} did not finish: {e}", exc_info=True)
+            pinned_cid = None
+        if pinned_cid != expected_cid:
+            logger.error(f"IPFS: Failed to pin CID {expected_cid} (Pinata returned {pinned_cid}).")
+            return jsonify({"error": "Failed to upload certificate to IPFS."}), 500
+    return None
+
+
 @bp.route('/paths/<int:path_id>/complete', methods=['POST'])
 def complete_path_and_mint_nft_route(path_id):
     if not config.FEATURE_FLAG_ENABLE_NFT_MINTING:
@@ -17,83 +124,23 @@ def complete_path_and_mint_nft_route(path_id):
         return jsonify({"error": "user_wallet is required"}), 400
 
     try:
-        existing_nft_db = supabase_service.get_nft_by_user_and_path(user_wallet, path_id)
-        if existing_nft_db:
-            logger.warning(f"NFT: DB check blocked re-mint for user {user_wallet}, path {path_id}.")
-            return jsonify({
-                "error": "Certificate has already been minted.",
-                "detail": "Our database shows that an NFT certificate has already been awarded for this path.",
-                "nft_data": existing_nft_db
-            }), 409
-
-        is_already_minted_on_chain = blockchain_service.check_if_nft_already_minted(user_wallet, path_id)
-        if is_already_minted_on_chain:
-            logger.warning(f"NFT: Blockchain check blocked re-mint for user {user_wallet}, path {path_id}.")
-            return jsonify({
-                "error": "Certificate has already been minted.",
-                "detail": "The blockchain confirms that an NFT certificate has already been awarded for this path.",
-            }), 409
-
-        is_complete = supabase_service.get_path_completion_status(user_wallet, path_id)
-        if not is_complete:
-            return jsonify({"error": "Path is not yet complete. Cannot mint NFT."}), 400
-
-        nft_details = supabase_service.get_user_and_path_for_nft(user_wallet, path_id)
-        if not nft_details:
-            return jsonify({"error": "Could not find user or path details."}), 404
-
-        user_name = nft_details.get('user_name', user_wallet)
-        path_title = nft_details.get('path_title', 'Unknown Path')
-
-        cert_dir = os.path.abspath("certificates")
-        safe_wallet = user_wallet.replace('0x', '')[:10]
-        image_file_name = f"cert_{path_id}_{safe_wallet}.png"
-        image_file_path = os.path.join(cert_dir, image_file_name)
-        logger.info(f"IMAGE: Target certificate image path: {image_file_path}")
-
-        if not os.path.exists(image_file_path):
-            logger.info(f"IMAGE: Certificate file '{image_file_path}' not found. Generating new image...")
-            generated_path = ai_service.generate_certificate_image(path_title, user_name, image_file_path)
-            if not generated_path:
-                logger.error(
-                    f"IMAGE: ai_service.generate_certificate_image failed to produce an image at {image_file_path}")
-                return jsonify({"error": "Failed to generate NFT image."}), 500
-            logger.info(f"IMAGE: New certificate image generated and saved to '{generated_path}'")
-        else:
-            logger.info(f"IMAGE: Certificate file '{image_file_path}' already exists. Using existing image.")
+        ineligible_response = _check_mint_eligibility(user_wallet, path_id)
+        if ineligible_response:
+            return ineligible_response
 
-        if not os.path.exists(image_file_path):
-            logger.error(
-                f"IMAGE: CRITICAL! Image file '{image_file_path}' still does not exist after generation/check. Cannot proceed with IPFS upload.")
-            return jsonify({"error": "Failed to obtain certificate image for IPFS upload."}), 500
-
-        logger.info(f"IMAGE: Attempting to upload '{image_file_path}' to IPFS.")
-        image_cid = ipfs_service.upload_to_ipfs(file_path=image_file_path)
-        if not image_cid:
-            logger.error(f"IPFS: Failed to upload certificate image '{image_file_path}' to IPFS.")
-            return jsonify({"error": "Failed to upload certificate image to IPFS."}), 500
-        logger.info(f"IPFS: Image '{image_file_path}' uploaded. CID: {image_cid}")
-
-        image_gateway_url = f"{config.PINATA_GATEWAY_URL}/{image_cid}"
-
-        metadata = {
-            "name": f"KODO Certificate: {path_title}",
-            "description": f"This certificate proves that {user_name} successfully completed the '{path_title}' learning path on KODO.",
-            "image": image_gateway_url,
-            "attributes": [
-                {"trait_type": "Platform", "value": "KODO"},
-                {"trait_type": "Recipient", "value": user_name}
-            ]
-        }
-        metadata_name = f"metadata_{path_id}_{safe_wallet}.json"
-        logger.info(f"IPFS: Attempting to upload metadata JSON object '{metadata_name}'.")
-        metadata_cid = ipfs_service.upload_to_ipfs(json_data=metadata, name=metadata_name)
-        if not metadata_cid:
-            logger.error(f"IPFS: Failed to upload metadata JSON '{metadata_name}' to IPFS.")
-            return jsonify({"error": "Failed to upload metadata to IPFS."}), 500
-        logger.info(f"IPFS: Metadata JSON '{metadata_name}' uploaded. CID: {metadata_cid}")
-
-        metadata_ipfs_url = f"ipfs://{metadata_cid}"
+        certificate, error_response = _prepare_certificate_metadata(user_wallet, path_id)
+        if error_response:
+            return error_response
+
+        metadata_cid = certificate['metadata_cid']
+        metadata_ipfs_url = certificate['metadata_url']
+        image_gateway_url = certificate['image_gateway_url']
+
+        # Nothing may be minted before its metadata is pinned: once the token exists, a retry is
+        # refused by the eligibility check and could never set the URI.
+        pin_error_response = _await_certificate_pins(certificate)
+        if pin_error_response:
+            return pin_error_response
 
         minted_token_id = blockchain_service.mint_nft_on_chain(user_wallet, path_id)
         if minted_token_id is None:
@@ -150,6 +197,108 @@ def complete_path_and_mint_nft_route(path_id):
         return jsonify({"error": "NFT minting failed.", "detail": detail}), 500
 
 
+@bp.route('/paths/<int:path_id>/voucher', methods=['POST'])
+def issue_mint_voucher_route(path_id):
+    """
+    Issues a signed EIP-712 mint voucher for a completed path. The user submits it to the
+    certificate contract's `redeem` function themselves, so the backend sends no transaction.
+    """
+    if not config.FEATURE_FLAG_ENABLE_NFT_MINTING:
+        return jsonify({"message": "NFT minting is currently disabled."})
+
+    user_wallet = request.get_json().get('user_wallet')
+    if not user_wallet:
+        return jsonify({"error": "user_wallet is required"}), 400
+
+    try:
+        ineligible_response = _check_mint_eligibility(user_wallet, path_id)
+        if ineligible_response:
+            return ineligible_response
+
+        certificate, error_response = _prepare_certificate_metadata(user_wallet, path_id)
+        if error_response:
+            return error_response
+
+        pin_error_response = _await_certificate_pins(certificate)
+        if pin_error_response:
+            return pin_error_response
+
+        signed_voucher = blockchain_service.sign_mint_voucher(user_wallet, path_id, certificate['metadata_url'])
+        nonce = signed_voucher['voucher']['nonce']
+        supabase_service.save_nft_voucher(user_wallet, path_id, nonce, certificate['metadata_url'],
+                                          certificate['image_gateway_url'])
+
+        voucher = dict(signed_voucher['voucher'], nonce=str(nonce))
+        return jsonify({
+            "message": "Mint voucher issued. Submit it to the certificate contract's redeem function.",
+            "voucher": voucher,
+            "signature": signed_voucher['signature'],
+            "domain": signed_voucher['domain'],
+            "nft_contract_address": config.NFT_CONTRACT_ADDRESS,
+            "metadata_url": certificate['metadata_url'],
+            "image_gateway_url": certificate['image_gateway_url']
+        })
+
+    except Exception as e:
+        logger.error(f"NFT: Voucher issuance failed for user {user_wallet}, path {path_id}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to issue mint voucher."}), 500
+
+
+@bp.route('/paths/<int:path_id>/voucher/confirm', methods=['POST'])
+def confirm_voucher_redemption_route(path_id):
+    """
+    Records a certificate the user minted by redeeming a voucher, after verifying the
+    redeem transaction on-chain.
+    """
+    if not config.FEATURE_FLAG_ENABLE_NFT_MINTING:
+        return jsonify({"message": "NFT minting is currently disabled."})
+
+    data = request.get_json() or {}
+    user_wallet = data.get('user_wallet')
+    tx_hash = data.get('tx_hash')
+    if not user_wallet or not tx_hash:
+        return jsonify({"error": "user_wallet and tx_hash are required"}), 400
+
+    try:
+        try:
+            redeemed = blockchain_service.get_redeemed_voucher(tx_hash)
+        except TransactionNotFound:
+            return jsonify({"message": "The redeem transaction has not been mined yet. Confirm again once it is.",
+                            "tx_hash": tx_hash}), 202
+        if not redeemed:
+            return jsonify({"error": "Transaction did not redeem a certificate voucher."}), 400
+
+        if redeemed['to'].lower() != user_wallet.lower() or redeemed['path_id'] != path_id:
+            return jsonify({"error": "Redeemed voucher does not match this user and path."}), 400
+
+        voucher_record = supabase_service.get_nft_voucher(redeemed['nonce'])
+        if not voucher_record:
+            return jsonify({"error": "Voucher was not issued by this server."}), 404
+
+        existing_nft_db = supabase_service.get_nft_by_user_and_path(user_wallet, path_id)
+        if not existing_nft_db:
+            supabase_service.save_user_nft(
+                user_wallet, path_id, redeemed['token_id'], config.NFT_CONTRACT_ADDRESS,
+                voucher_record['metadata_url'], voucher_record['image_gateway_url']
+            )
+            supabase_service.mark_nft_voucher_redeemed(redeemed['nonce'], redeemed['token_id'])
+            logger.info(f"DB: Saved redeemed NFT for wallet {user_wallet}, path {path_id}, token {redeemed['token_id']}")
+
+        explorer_url = f"{config.BLOCK_EXPLORER_URL.rstrip('/')}/tx/{tx_hash}" if config.BLOCK_EXPLORER_URL else None
+        return jsonify({
+            "message": "Certificate redemption recorded.",
+            "token_id": redeemed['token_id'],
+            "nft_contract_address": config.NFT_CONTRACT_ADDRESS,
+            "metadata_url": voucher_record['metadata_url'],
+            "image_gateway_url": voucher_record['image_gateway_url'],
+            "explorer_url": explorer_url
+        })
+
+    except Exception as e:
+        logger.error(f"NFT: Voucher confirmation failed for tx {tx_hash}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to confirm voucher redemption."}), 500
+
+
 @bp.route('/nfts/<wallet_address>', methods=['GET'])
 def get_user_nfts_route(wallet_address):
     try:
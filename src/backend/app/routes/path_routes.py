@@ -1,21 +1,81 @@
 import json
 import hashlib
 import uuid
+import queue
 import threading
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import logger
-from app.services import ai_service, supabase_service, blockchain_service
+from app.services import ai_service, supabase_service, blockchain_service, task_log_service
+from app.services.pubsub_service import progress_broker, END_OF_STREAM
+from app.services.generation_registry_service import in_flight_generations
 from app.config import config
 
 bp = Blueprint('path_routes', __name__, url_prefix='/paths')
 
 
+def _add_content_totals(path_data):
+    """Counts slides and quiz questions across all levels and stores the totals on the path."""
+    total_slides = 0
+    total_questions = 0
+    if 'levels' in path_data and path_data['levels']:
+        for level in path_data['levels']:
+            if 'content_items' in level and level['content_items']:
+                for item in level['content_items']:
+                    if item['item_type'] == 'slide':
+                        total_slides += 1
+                    elif item['item_type'] == 'quiz':
+                        total_questions += 1
+
+    path_data['total_slides'] = total_slides
+    path_data['total_questions'] = total_questions
+
+
+def _is_generation_finished(path_data):
+    """A path is immutable once every level it promises exists and has content."""
+    levels = path_data.get('levels') or []
+    return (path_data.get('total_levels') and len(levels) == path_data['total_levels']
+            and all(level.get('content_items') for level in levels))
+
+
+def _get_path_document(path_id):
+    """
+    Returns {'path', 'body', 'etag'} for a path, serving fully generated paths from the in-process cache.
+    The strong ETag is derived from the on-chain content hash when there is one, else from the body itself.
+    """
+    document = supabase_service.path_document_cache.get(path_id)
+    if document:
+        return document
+
+    path_details_res = supabase_service.get_full_path_details(path_id)
+    if not path_details_res or not path_details_res.data:
+        return None
+
+    path_data = path_details_res.data
+    _add_content_totals(path_data)
+    body = current_app.json.dumps(path_data)
+    content_hash = (path_data.get('content_hash') or '').removeprefix('0x')
+    etag = f"path-{path_id}-{content_hash or hashlib.sha256(body.encode()).hexdigest()}"
+    document = {"path": path_data, "body": body, "etag": etag}
+
+    if _is_generation_finished(path_data):
+        supabase_service.path_document_cache.set(path_id, document)
+    return document
+
+
+def _conditional_json_response(body, etag):
+    """Builds a JSON response carrying a strong ETag; answers 304 when If-None-Match already matches."""
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 def update_progress(task_id, status, data=None):
-    """Updates the progress log for a given task in the database."""
+    """Appends a progress event for a given task; it is written to the database in the background."""
     log_entry = {"status": status}
     if data:
         log_entry["data"] = data
-    supabase_service.update_task_log(task_id, log_entry)
+    task_log_service.append_event(task_id, log_entry)
     logger.info(f"TASK [{task_id}]: {status}")
 
 
@@ -165,6 +225,25 @@ def generation_worker(task_id, original_topic, new_title, creator_wallet, countr
         else:
             logger.info(
                 f"TASK [{task_id}]: Path generation failed before path ID was assigned. No DB cleanup needed for learning_paths table.")
+    finally:
+        in_flight_generations.release(task_id)
+        task_log_service.finish_task(task_id)
+
+
+def _running_generation_response(running):
+    """Answers a request for a topic that is already being generated, per GENERATION_COALESCE_MODE."""
+    if config.GENERATION_COALESCE_MODE == 'reject':
+        return jsonify({
+            "error": "A learning path on a very similar topic is already being generated.",
+            "task_id": running['task_id'],
+            "title": running['title']
+        }), 409
+    return jsonify({
+        "message": "A learning path on this topic is already being generated. Follow its progress with this task_id.",
+        "task_id": running['task_id'],
+        "title": running['title'],
+        "attached": True
+    }), 202
 
 
 @bp.route('/generate', methods=['POST'])
@@ -177,6 +256,12 @@ def generate_new_path_route():
         return jsonify({"error": "topic and creator_wallet are required"}), 400
 
     try:
+        # Cheap check on the topic as typed, before spending an AI call on rephrasing it.
+        running = in_flight_generations.find([topic])
+        if running:
+            logger.info(f"GENERATE ROUTE: Topic '{topic}' is already being generated by task {running['task_id']}.")
+            return _running_generation_response(running)
+
         user_res = supabase_service.get_user_by_wallet_full(creator_wallet)
         country = user_res.data.get('country') if user_res and user_res.data else None
 
@@ -184,16 +269,17 @@ def generate_new_path_route():
         new_title = ai_service.rephrase_topic_with_emoji(topic)
         logger.info(f"AI REPHRASE: New title is '{new_title}'")
 
+        topic_embedding = None
         if config.FEATURE_FLAG_ENABLE_DUPLICATE_CHECK:
             logger.info(f"DUPE CHECK: Checking for topics similar to '{new_title}'")
             topic_embedding = ai_service.get_embedding(new_title)
-            similar_paths_res = supabase_service.find_similar_paths(
+            similar_paths = supabase_service.find_similar_paths(
                 embedding=topic_embedding,
                 threshold=config.SIMILARITY_THRESHOLD,
                 count=1
             )
-            if similar_paths_res.data:
-                similar_path = similar_paths_res.data[0]
+            if similar_paths:
+                similar_path = similar_paths[0]
                 logger.warning(
                     f"DUPE CHECK: Found a similar path (ID: {similar_path['id']}, Title: '{similar_path['title']}') for new topic '{new_title}'. Halting generation.")
                 return jsonify({
@@ -202,10 +288,21 @@ def generate_new_path_route():
                 }), 409
 
         task_id = str(uuid.uuid4())
-        supabase_service.create_task_log(task_id)
-
-        thread = threading.Thread(target=generation_worker, args=(task_id, topic, new_title, creator_wallet, country))
-        thread.start()
+        # Neither path exists yet when two near-identical requests arrive together, so the check
+        # above passes for both; claiming the topic lets only one of them start a generation.
+        running = in_flight_generations.claim(task_id, new_title, [topic, new_title], topic_embedding)
+        if running:
+            logger.info(f"GENERATE ROUTE: '{new_title}' matches task {running['task_id']} already in progress.")
+            return _running_generation_response(running)
+
+        try:
+            task_log_service.start_task(task_id)
+            thread = threading.Thread(target=generation_worker,
+                                      args=(task_id, topic, new_title, creator_wallet, country))
+            thread.start()
+        except Exception:
+            in_flight_generations.release(task_id)
+            raise
 
         return jsonify({"message": "Path generation started.", "task_id": task_id}), 202
 
@@ -226,16 +323,85 @@ def get_random_topic_route():
 
 @bp.route('/generate/status/<task_id>', methods=['GET'])
 def get_generation_status(task_id):
+    """Returns a task's progress events; with ?after=<seq>, only the events that came after that seq."""
+    after_seq = request.args.get('after', 0, type=int)
     try:
-        log_res = supabase_service.get_task_log(task_id)
-        if not log_res or not log_res.data:
+        events, found = task_log_service.get_events(task_id, after_seq)
+        if not found:
             return jsonify({"error": "Task not found."}), 404
-        return jsonify({"progress": log_res.data.get('logs', [])})
+        last_seq = events[-1]['seq'] if events else after_seq
+        return jsonify({"progress": events, "last_seq": last_seq})
     except Exception as e:
         logger.error(f"STATUS ROUTE: Failed for task {task_id}: {e}", exc_info=True)
         return jsonify({"error": "Failed to retrieve task status."}), 500
 
 
+@bp.route('/generate/stats', methods=['GET'])
+def get_generation_stats():
+    """Totals of the task log janitor in this process: runs, abandoned and compacted tasks, purged event rows."""
+    return jsonify({"task_log_janitor": task_log_service.get_janitor_stats()})
+
+
+def _format_sse(event):
+    return f"id: {event['seq']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+
+
+@bp.route('/generate/stream/<task_id>', methods=['GET'])
+def stream_generation_progress(task_id):
+    """
+    Streams a task's progress as Server-Sent Events. Events after the Last-Event-ID header
+    (or ?after=<seq>) are replayed first, then new events are pushed as they are emitted,
+    with comment heartbeats in between. An 'end' event is sent once the task has finished.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after') or 0
+    try:
+        after_seq = int(last_event_id)
+    except (ValueError, TypeError):
+        after_seq = 0
+
+    # Subscribe before reading the backlog so nothing emitted in between is lost.
+    subscription = progress_broker.subscribe(task_id)
+    try:
+        backlog, found = task_log_service.get_backlog(task_id, after_seq)
+    except Exception as e:
+        if subscription is not None:
+            progress_broker.unsubscribe(task_id, subscription)
+        logger.error(f"STREAM ROUTE: Failed to load events for task {task_id}: {e}", exc_info=True)
+        return jsonify({"error": "Failed to retrieve task status."}), 500
+    if not found and subscription is None:
+        return jsonify({"error": "Task not found."}), 404
+
+    def generate():
+        last_seq = after_seq
+        try:
+            for event in backlog:
+                yield _format_sse(event)
+                last_seq = event['seq']
+            if subscription is None:
+                yield "event: end\ndata: {}\n\n"
+                return
+            while True:
+                try:
+                    event = subscription.get(timeout=config.SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is END_OF_STREAM:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                if event['seq'] > last_seq:
+                    yield _format_sse(event)
+                    last_seq = event['seq']
+        finally:
+            if subscription is not None:
+                progress_broker.unsubscribe(task_id, subscription)
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @bp.route('', methods=['GET'])
 def get_all_paths_route():
     logger.info("ROUTE: /paths GET")
@@ -251,32 +417,29 @@ def get_all_paths_route():
 def get_path_details_route(path_id):
     logger.info(f"ROUTE: /paths/<id> GET for path {path_id}")
     try:
-        path_details_res = supabase_service.get_full_path_details(path_id)
-        if not path_details_res or not path_details_res.data:
+        document = _get_path_document(path_id)
+        if not document:
             return jsonify({"error": "Path not found"}), 404
 
-        path_data = path_details_res.data
-
-        total_slides = 0
-        total_questions = 0
-        if 'levels' in path_data and path_data['levels']:
-            for level in path_data['levels']:
-                if 'content_items' in level and level['content_items']:
-                    for item in level['content_items']:
-                        if item['item_type'] == 'slide':
-                            total_slides += 1
-                        elif item['item_type'] == 'quiz':
-                            total_questions += 1
-
-        path_data['total_slides'] = total_slides
-        path_data['total_questions'] = total_questions
-
-        return jsonify(path_data)
+        return _conditional_json_response(document['body'], document['etag'])
     except Exception as e:
         logger.error(f"ROUTE: /paths/<id> GET failed: {e}", exc_info=True)
         return jsonify({"error": "Failed to fetch path details."}), 500
 
 
+@bp.route('/<int:path_id>/related', methods=['GET'])
+def get_related_paths_route(path_id):
+    """Returns the paths most similar to this one, from the precomputed path_neighbors lists."""
+    limit = min(request.args.get('limit', config.RELATED_PATHS_COUNT, type=int), config.RELATED_PATHS_COUNT)
+    logger.info(f"ROUTE: /paths/<id>/related GET for path {path_id}")
+    try:
+        related_res = supabase_service.get_related_paths(path_id, max(limit, 1))
+        return jsonify(related_res.data or [])
+    except Exception as e:
+        logger.error(f"ROUTE: /paths/<id>/related GET failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to fetch related paths."}), 500
+
+
 @bp.route('/<int:path_id>/<wallet_address>', methods=['GET'])
 def get_path_details_for_user_route(path_id, wallet_address):
     """
@@ -289,19 +452,7 @@ def get_path_details_for_user_route(path_id, wallet_address):
         if not path_data:
             return jsonify({"error": "Path not found"}), 404
 
-        total_slides = 0
-        total_questions = 0
-        if 'levels' in path_data and path_data['levels']:
-            for level in path_data['levels']:
-                if 'content_items' in level and level['content_items']:
-                    for item in level['content_items']:
-                        if item['item_type'] == 'slide':
-                            total_slides += 1
-                        elif item['item_type'] == 'quiz':
-                            total_questions += 1
-
-        path_data['total_slides'] = total_slides
-        path_data['total_questions'] = total_questions
+        _add_content_totals(path_data)
 
         return jsonify(path_data)
     except Exception as e:
@@ -335,12 +486,16 @@ def delete_path_route(path_id):
 def get_level_content_route(path_id, level_num):
     logger.info(f"ROUTE: /paths/.../levels GET for path {path_id}, level {level_num}")
     try:
-        level_res = supabase_service.get_level(path_id, level_num)
-        if not level_res.data:
+        document = _get_path_document(path_id)
+        level = None
+        if document:
+            level = next((level for level in document['path'].get('levels') or []
+                          if level.get('level_number') == level_num), None)
+        if not level:
             return jsonify({"error": "Level not found"}), 404
 
-        items_res = supabase_service.get_content_items_for_level(level_res.data['id'])
-        items = items_res.data
+        items = [{key: item.get(key) for key in ('id', 'item_index', 'item_type', 'content')}
+                 for item in level.get('content_items') or []]
 
         level_slides = 0
         level_questions = 0
@@ -350,12 +505,13 @@ def get_level_content_route(path_id, level_num):
             elif item.get('item_type') == 'quiz':
                 level_questions += 1
 
-        return jsonify({
-            "level_title": level_res.data['level_title'],
+        body = current_app.json.dumps({
+            "level_title": level['level_title'],
             "total_slides_in_level": level_slides,
             "total_questions_in_level": level_questions,
             "items": items
         })
+        return _conditional_json_response(body, f"{document['etag']}-level-{level_num}")
     except Exception as e:
         logger.error(f"ROUTE: /paths/.../levels GET failed: {e}", exc_info=True)
-        return jsonify({"error": "Failed to fetch level content."}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to fetch level content."}), 500
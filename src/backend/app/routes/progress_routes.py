@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
 from app import logger
+from app.config import config
 from app.services import supabase_service
 
 bp = Blueprint('progress_routes', __name__, url_prefix='/progress')
@@ -30,14 +32,110 @@ def upsert_level_progress_route():
         correct_answers_int = int(correct_answers)
         total_questions_int = int(total_questions)
 
-        supabase_service.upsert_level_progress(user_wallet, path_id_int, level_index_int, correct_answers_int, total_questions_int)
-        return jsonify({"message": "Progress updated successfully"}), 200
+        completion = supabase_service.upsert_level_progress(user_wallet, path_id_int, level_index_int,
+                                                            correct_answers_int, total_questions_int)
+        return jsonify({
+            "message": "Progress updated successfully",
+            "level_complete": completion['level_complete'],
+            "path_complete": completion['path_complete']
+        }), 200
     except (ValueError, TypeError):
         return jsonify({"error": "path_id, level_index, correct_answers, and total_questions must be valid integers"}), 400
     except Exception as e:
         logger.error(f"ROUTE: /progress/level failed: {e}", exc_info=True)
         return jsonify({"error": "Failed to update level progress."}), 500
 
+def _parse_batch_item(item):
+    """
+    Validates one entry of a batch submission.
+    Returns (result, completed_at) or raises ValueError describing the problem.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("each result must be an object")
+    fields = ('path_id', 'level_index', 'correct_answers', 'total_questions')
+    if any(item.get(field) is None for field in fields):
+        raise ValueError("path_id, level_index, correct_answers, and total_questions are required")
+    try:
+        result = {field: int(item[field]) for field in fields}
+    except (ValueError, TypeError):
+        raise ValueError("path_id, level_index, correct_answers, and total_questions must be valid integers")
+
+    completed_at = None
+    if item.get('completed_at'):
+        try:
+            completed_at = datetime.fromisoformat(str(item['completed_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError("completed_at must be an ISO 8601 timestamp")
+        if completed_at.tzinfo is None:
+            completed_at = completed_at.replace(tzinfo=timezone.utc)
+    return result, completed_at
+
+@bp.route('/batch', methods=['POST'])
+def batch_level_progress_route():
+    """
+    Receives many level results at once, e.g. from a client syncing after being offline.
+    Results are deduplicated to the latest one per (path_id, level_index), written in a single
+    set-based upsert, and each affected path gets one completion check.
+    Returns an outcome for every submitted item, in submission order.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    user_wallet = data.get('user_wallet')
+    items = data.get('results')
+    if not user_wallet or not isinstance(items, list):
+        return jsonify({"error": "user_wallet and a results list are required"}), 400
+    if len(items) > config.PROGRESS_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch may contain at most {config.PROGRESS_BATCH_MAX_ITEMS} results"}), 400
+
+    outcomes = [None] * len(items)
+    # (path_id, level_index) -> (ordering key, item index, parsed result)
+    latest = {}
+    for index, item in enumerate(items):
+        try:
+            result, completed_at = _parse_batch_item(item)
+        except ValueError as ve:
+            outcomes[index] = {"status": "invalid", "error": str(ve)}
+            continue
+
+        # Items carrying completed_at are ordered by it; otherwise submission order decides.
+        order = (completed_at or datetime.min.replace(tzinfo=timezone.utc), index)
+        key = (result['path_id'], result['level_index'])
+        current = latest.get(key)
+        if current is None or order > current[0]:
+            if current is not None:
+                outcomes[current[1]] = {"status": "superseded"}
+            latest[key] = (order, index, result)
+        else:
+            outcomes[index] = {"status": "superseded"}
+
+    try:
+        completion = supabase_service.record_level_progress_batch(
+            user_wallet, [result for _, _, result in latest.values()])
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
+    except Exception as e:
+        logger.error(f"ROUTE: /progress/batch failed: {e}", exc_info=True)
+        return jsonify({"error": "Failed to record progress batch."}), 500
+
+    for (path_id, level_index), (_, index, _) in latest.items():
+        if path_id in completion:
+            outcomes[index] = {"status": "recorded", "path_complete": completion[path_id]}
+        else:
+            outcomes[index] = {"status": "path_not_found"}
+
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            outcomes[index] = {"path_id": item.get('path_id'), "level_index": item.get('level_index'), **outcomes[index]}
+
+    recorded = sum(1 for outcome in outcomes if outcome['status'] == 'recorded')
+    return jsonify({
+        "recorded": recorded,
+        "paths": [{"path_id": path_id, "path_complete": is_complete} for path_id, is_complete in completion.items()],
+        "results": outcomes
+    }), 200
+
 @bp.route('/path/<int:path_id>/<wallet_address>/completed', methods=['GET'])
 def get_path_completion_route(path_id, wallet_address):
     """Checks if a user has completed a specific learning path."""
@@ -89,11 +187,12 @@ def get_user_scores_route(wallet_address):
     Gets the aggregated scores for all paths a user has started.
     """
     try:
-        user_res = supabase_service.get_user_by_wallet(wallet_address)
-        if not user_res or not user_res.data:
+        user_id = supabase_service.get_user_id_by_wallet(wallet_address)
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
 
-        scores = supabase_service.get_user_scores(user_res.data['id'])
+        supabase_service.flush_pending_progress(wallet_address)
+        scores = supabase_service.get_user_scores(user_id)
         return jsonify(scores)
     except Exception as e:
         logger.error(f"ROUTE: /scores/<wallet> failed: {e}", exc_info=True)
@@ -15,8 +15,34 @@ def search_paths_route():
 
     logger.info(f"ROUTE: /search GET for query: '{query}'")
     try:
-        results = supabase_service.hybrid_search_paths(query)
-        return jsonify(results)
+        results, degraded_legs, cache_hit = supabase_service.cached_hybrid_search_paths(query)
+        response = jsonify(results)
+        response.headers['X-Search-Cache'] = 'hit' if cache_hit else 'miss'
+        if degraded_legs:
+            response.headers['X-Search-Degraded'] = ','.join(degraded_legs)
+        return response
     except Exception as e:
         logger.error(f"ROUTE: /search GET failed: {e}", exc_info=True)
         return jsonify({"error": "Failed to perform search."}), 500
+
+@bp.route('/suggest', methods=['GET'])
+def suggest_paths_route():
+    """Typeahead title suggestions from the in-memory prefix index; never calls the embedding API."""
+    query = request.args.get('q')
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required."}), 400
+    limit = request.args.get('limit', type=int)
+
+    suggestions = supabase_service.suggest_paths(query, limit)
+    if suggestions is None:
+        return jsonify({"error": "Suggestions are not available yet. Please try again shortly."}), 503
+    return jsonify(suggestions)
+
+@bp.route('/stats', methods=['GET'])
+def search_stats_route():
+    """Hit rate and size of the search result cache and the state of the suggestion index."""
+    return jsonify({
+        "catalog_version": supabase_service.get_catalog_version(),
+        "result_cache": supabase_service.search_result_cache.stats(),
+        "suggest_index": supabase_service.path_suggest_index.stats()
+    })
@@ -1,11 +1,73 @@
 from flask import request
+from flask_socketio import emit, join_room, leave_room
 from app import logger
+from app.config import config
+from app.services import task_log_service
+from app.services.pubsub_service import progress_broker
+
+NAMESPACE = '/pathProgress'
 
 def register_events(socketio):
-    @socketio.on('connect', namespace='/pathProgress')
+    @socketio.on('connect', namespace=NAMESPACE)
     def handle_connect():
         logger.info(f"SOCKET.IO: Client connected with sid: {request.sid}")
 
-    @socketio.on('disconnect', namespace='/pathProgress')
+    @socketio.on('disconnect', namespace=NAMESPACE)
     def handle_disconnect():
         logger.info(f"SOCKET.IO: Client disconnected with sid: {request.sid}")
+
+    @socketio.on('join', namespace=NAMESPACE)
+    def handle_join(data):
+        """
+        Joins the room of a generation task and replays its events after `after` (default 0)
+        to this client only. Live events may overlap the replay, so clients should drop any
+        event whose seq they have already seen.
+        """
+        data = data or {}
+        task_id = data.get('task_id')
+        if not task_id:
+            emit('error', {'error': 'task_id is required'})
+            return
+        try:
+            after_seq = int(data.get('after') or 0)
+        except (ValueError, TypeError):
+            after_seq = 0
+
+        join_room(task_id)
+        logger.info(f"SOCKET.IO: {request.sid} joined task {task_id} after seq {after_seq}")
+        try:
+            backlog, found = task_log_service.get_backlog(task_id, after_seq)
+        except Exception as e:
+            logger.error(f"SOCKET.IO: Failed to load backlog for task {task_id}: {e}", exc_info=True)
+            emit('error', {'task_id': task_id, 'error': 'Failed to retrieve task status.'})
+            return
+        if not found and not progress_broker.is_open(task_id):
+            leave_room(task_id)
+            emit('error', {'task_id': task_id, 'error': 'Task not found.'})
+            return
+
+        for event in backlog:
+            emit('progress', {'task_id': task_id, **event})
+
+        # With a message queue the task may be running in another process, in which case its
+        # 'end' arrives through the room; only a terminal event proves it has already finished.
+        if not progress_broker.is_open(task_id) and (
+                config.SOCKETIO_MESSAGE_QUEUE is None or any(task_log_service.is_terminal_event(e) for e in backlog)):
+            emit('end', {'task_id': task_id})
+
+    @socketio.on('leave', namespace=NAMESPACE)
+    def handle_leave(data):
+        task_id = (data or {}).get('task_id')
+        if task_id:
+            leave_room(task_id)
+            logger.info(f"SOCKET.IO: {request.sid} left task {task_id}")
+
+    def forward_progress(task_id, event):
+        # Emitting through socketio goes via the message queue when one is configured, so
+        # clients connected to any API process receive events from whichever process runs the task.
+        if event is None:
+            socketio.emit('end', {'task_id': task_id}, to=task_id, namespace=NAMESPACE)
+        else:
+            socketio.emit('progress', {'task_id': task_id, **event}, to=task_id, namespace=NAMESPACE)
+
+    progress_broker.add_listener(forward_progress)
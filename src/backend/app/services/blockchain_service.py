@@ -1,5 +1,11 @@
 import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
 from web3 import Web3
+from web3.exceptions import TransactionNotFound, TimeExhausted
+from eth_account.messages import encode_typed_data
 from app import w3, account, logger
 from app.config import config
 
@@ -14,42 +20,297 @@ path_registry_contract = w3.eth.contract(address=Web3.to_checksum_address(config
 nft_contract = w3.eth.contract(address=Web3.to_checksum_address(config.NFT_CONTRACT_ADDRESS), abi=NFT_ABI)
 logger.info("Blockchain service and contracts initialized.")
 
+VOUCHER_DOMAIN_NAME = "NoodlCertificate"
+VOUCHER_DOMAIN_VERSION = "1"
+VOUCHER_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "MintVoucher": [
+        {"name": "to", "type": "address"},
+        {"name": "pathId", "type": "uint256"},
+        {"name": "uri", "type": "string"},
+        {"name": "nonce", "type": "uint256"},
+    ],
+}
+
+_chain_id = None
+
+def _get_chain_id():
+    """The chain ID never changes for a running node, so it is only fetched once."""
+    global _chain_id
+    if _chain_id is None:
+        _chain_id = w3.eth.chain_id
+    return _chain_id
+
+class _Signer:
+    """A backend account in the signer pool, with its own locally tracked nonce sequence."""
+
+    def __init__(self, signer_account):
+        self.account = signer_account
+        self.address = signer_account.address
+        self.nonce_lock = threading.Lock()
+        self.next_nonce = None
+        # Nonces handed out but not yet broadcast, and allocated nonces that were never broadcast.
+        self.unsent_nonces = 0
+        self.free_nonces = []
+        self.needs_resync = False
+        self.pending = 0
+        self.is_active = True
+        self.balance_checked_at = 0.0
+
+
+class SignerPool:
+    """
+    Spreads backend transactions across several authorized accounts so that each has an
+    independent nonce sequence and one stuck transaction does not block the others.
+    Accounts whose balance drops below the configured minimum are taken out of rotation.
+    """
+
+    def __init__(self, signer_accounts, strategy, min_balance_wei, balance_check_interval):
+        self.signers = [_Signer(signer_account) for signer_account in signer_accounts]
+        self.strategy = strategy
+        self.min_balance_wei = min_balance_wei
+        self.balance_check_interval = balance_check_interval
+        self._lock = threading.Lock()
+        self._round_robin_index = 0
+
+    def _refresh_balances(self):
+        now = time.monotonic()
+        for signer in self.signers:
+            if now - signer.balance_checked_at < self.balance_check_interval:
+                continue
+            signer.balance_checked_at = now
+            try:
+                balance = w3.eth.get_balance(signer.address)
+            except Exception as e:
+                logger.warning(f"SIGNER POOL: Could not check balance for {signer.address}: {e}")
+                continue
+            was_active = signer.is_active
+            signer.is_active = balance >= self.min_balance_wei
+            if was_active and not signer.is_active:
+                logger.warning(f"SIGNER POOL: {signer.address} is low on funds ({w3.from_wei(balance, 'ether')} ETH). "
+                               f"Removing it from rotation.")
+            elif signer.is_active and not was_active:
+                logger.info(f"SIGNER POOL: {signer.address} has been funded. Returning it to rotation.")
+
+    def _select(self):
+        with self._lock:
+            self._refresh_balances()
+            candidates = [signer for signer in self.signers if signer.is_active]
+            if not candidates:
+                logger.error("SIGNER POOL: All signers are below the minimum balance. Using the full pool anyway.")
+                candidates = self.signers
+
+            if self.strategy == 'round_robin':
+                signer = candidates[self._round_robin_index % len(candidates)]
+                self._round_robin_index += 1
+            else:
+                signer = min(candidates, key=lambda candidate: candidate.pending)
+            signer.pending += 1
+            return signer
+
+    @contextmanager
+    def acquire(self):
+        """Picks a signer for one transaction and tracks it as pending until the block exits."""
+        if not self.signers:
+            raise RuntimeError("No backend signer accounts are available. Is the Ethereum node connected?")
+        signer = self._select()
+        try:
+            yield signer
+        finally:
+            with self._lock:
+                signer.pending -= 1
+
+    @staticmethod
+    def _take_nonce(signer):
+        if signer.free_nonces:
+            nonce = min(signer.free_nonces)
+            signer.free_nonces.remove(nonce)
+        elif signer.next_nonce is None:
+            return None
+        else:
+            nonce = signer.next_nonce
+            signer.next_nonce += 1
+        signer.unsent_nonces += 1
+        return nonce
+
+    def allocate_nonce(self, signer):
+        """
+        Hands out the signer's next nonce, reusing any that were allocated but never broadcast
+        first so no gap holds back later transactions. Every allocation must be followed by
+        release_nonce once the transaction was broadcast or abandoned.
+        """
+        with signer.nonce_lock:
+            nonce = self._take_nonce(signer)
+        if nonce is not None:
+            return nonce
+
+        # The node is only asked outside the lock, so other transactions of this signer never wait on it.
+        node_nonce = w3.eth.get_transaction_count(signer.address, 'pending')
+        with signer.nonce_lock:
+            if signer.next_nonce is None:
+                signer.next_nonce = node_nonce
+            return self._take_nonce(signer)
+
+    def release_nonce(self, signer, nonce, broadcast):
+        """
+        Marks an allocated nonce as broadcast, or returns it for reuse if it never was. The
+        sequence is resynced from the node's pending count once nothing allocated is still
+        unsent, because only then does that count cover every nonce handed out.
+        """
+        with signer.nonce_lock:
+            signer.unsent_nonces -= 1
+            if not broadcast:
+                signer.free_nonces.append(nonce)
+                # The send may have failed because our sequence is stale (e.g. 'nonce too low').
+                signer.needs_resync = True
+            if signer.unsent_nonces == 0 and signer.needs_resync:
+                signer.next_nonce = None
+                signer.free_nonces = []
+                signer.needs_resync = False
+
+
+def _load_signer_accounts():
+    signer_accounts = [account] if account else []
+    known_addresses = {signer_account.address for signer_account in signer_accounts}
+    for private_key in config.BACKEND_SIGNER_PRIVATE_KEYS:
+        signer_account = w3.eth.account.from_key(private_key)
+        if signer_account.address not in known_addresses:
+            signer_accounts.append(signer_account)
+            known_addresses.add(signer_account.address)
+    return signer_accounts
+
+
+signer_pool = SignerPool(
+    _load_signer_accounts(),
+    strategy=config.SIGNER_SELECTION_STRATEGY,
+    min_balance_wei=w3.to_wei(config.SIGNER_MIN_BALANCE_ETH, 'ether'),
+    balance_check_interval=config.SIGNER_BALANCE_CHECK_INTERVAL_SECONDS
+)
+logger.info(f"Signer pool initialized with {len(signer_pool.signers)} account(s) "
+            f"using '{config.SIGNER_SELECTION_STRATEGY}' selection.")
+
+INITIAL_MAX_FEE_PER_GAS = w3.to_wei('20', 'gwei')
+INITIAL_MAX_PRIORITY_FEE_PER_GAS = w3.to_wei('1.5', 'gwei')
+RECEIPT_POLL_INTERVAL_SECONDS = 2
+
+def _wait_for_any_receipt(tx_hashes, timeout):
+    """Polls every tracked hash for the same nonce and returns the receipt of whichever one lands first."""
+    deadline = time.monotonic() + timeout
+    while True:
+        for tx_hash in tx_hashes:
+            try:
+                return w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(RECEIPT_POLL_INTERVAL_SECONDS)
+
+def _bump_fees(transaction):
+    """
+    Returns (max_fee, priority_fee) raised by TX_FEE_BUMP_PERCENT and capped at TX_MAX_FEE_CAP_GWEI,
+    or None if the fees are already at the cap.
+    """
+    fee_cap = w3.to_wei(config.TX_MAX_FEE_CAP_GWEI, 'gwei')
+    if transaction['maxFeePerGas'] >= fee_cap:
+        return None
+    multiplier = 1 + config.TX_FEE_BUMP_PERCENT / 100
+    max_fee = min(int(transaction['maxFeePerGas'] * multiplier) + 1, fee_cap)
+    priority_fee = min(int(transaction['maxPriorityFeePerGas'] * multiplier) + 1, max_fee)
+    return max_fee, priority_fee
+
+def _wait_with_replacement(transaction, signer, tx_hash, update_status):
+    """
+    Waits for a sent transaction. Each time TX_REPLACEMENT_INTERVAL_SECONDS passes without inclusion,
+    the same nonce is re-signed with bumped fees. Every replacement hash is tracked, and whichever
+    one lands is returned along with the full list.
+    """
+    tx_hashes = [tx_hash]
+    deadline = time.monotonic() + config.TX_CONFIRMATION_TIMEOUT_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        receipt = _wait_for_any_receipt(tx_hashes, max(0, min(config.TX_REPLACEMENT_INTERVAL_SECONDS, remaining)))
+        if receipt:
+            return receipt, tx_hashes
+        if time.monotonic() >= deadline:
+            raise TimeExhausted(
+                f"Transaction with nonce {transaction['nonce']} from {signer.address} was not mined within "
+                f"{config.TX_CONFIRMATION_TIMEOUT_SECONDS} seconds. Tracked hashes: "
+                f"{', '.join(Web3.to_hex(h) for h in tx_hashes)}")
+
+        bumped_fees = _bump_fees(transaction)
+        if not bumped_fees:
+            update_status("Transaction is still pending and fees are at the configured cap. Continuing to wait...")
+            continue
+
+        transaction['maxFeePerGas'], transaction['maxPriorityFeePerGas'] = bumped_fees
+        max_fee_gwei = w3.from_wei(transaction['maxFeePerGas'], 'gwei')
+        update_status(f"Transaction still pending. Re-sending nonce {transaction['nonce']} with max fee {max_fee_gwei} gwei...")
+        signed_tx = w3.eth.account.sign_transaction(transaction, private_key=signer.account.key)
+        try:
+            replacement_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception as e:
+            # Usually 'nonce too low' (an earlier hash just landed) or 'underpriced'; keep waiting on what we have.
+            logger.warning(f"TX REPLACEMENT: Could not replace nonce {transaction['nonce']}: {e}")
+            continue
+        tx_hashes.append(replacement_hash)
+        update_status(f"Replacement transaction sent. Hash: {replacement_hash.hex()}",
+                      {'txHash': replacement_hash.hex()})
+
 def send_tx_and_get_receipt(contract_function, task_id=None, progress_callback=None):
-    """Sends a transaction and uses a callback for progress updates."""
+    """Sends a transaction from the signer pool and uses a callback for progress updates."""
 
     def update_status(status, data=None):
         if task_id and progress_callback:
             progress_callback(task_id, status, data)
 
-    try:
-        update_status(f"Building transaction for '{contract_function.fn_name}'...")
-        tx_params = {
-            'from': account.address,
-            'nonce': w3.eth.get_transaction_count(account.address),
-            'maxFeePerGas': w3.to_wei('20', 'gwei'),
-            'maxPriorityFeePerGas': w3.to_wei('1.5', 'gwei'),
-        }
-        gas_estimate = contract_function.estimate_gas({'from': account.address})
-        tx_params['gas'] = int(gas_estimate * 1.2)
-        update_status(f"Gas estimated. Preparing to send.")
-
-        transaction = contract_function.build_transaction(tx_params)
-        update_status("Signing transaction with backend wallet...")
-        signed_tx = w3.eth.account.sign_transaction(transaction, private_key=account.key)
-
-        update_status("Sending transaction to the network...")
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        update_status(f"Transaction sent. Hash: {tx_hash.hex()}", {'txHash': tx_hash.hex()})
-
-        update_status("Waiting for confirmation from the network (this can take a moment)...")
-        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-        status_msg = 'Success' if tx_receipt.status == 1 else 'Failed'
-        update_status(f"Transaction confirmed on the blockchain. Status: {status_msg}")
-        return tx_receipt
-    except Exception as e:
-        logger.error(f"TX FAILED: {e}")
-        update_status(f"Blockchain transaction failed: {str(e)}")
-        raise e
+    with signer_pool.acquire() as signer:
+        tx_hash = None
+        try:
+            update_status(f"Building transaction for '{contract_function.fn_name}'...")
+            gas_estimate = contract_function.estimate_gas({'from': signer.address})
+            nonce = signer_pool.allocate_nonce(signer)
+            try:
+                tx_params = {
+                    'from': signer.address,
+                    'nonce': nonce,
+                    'maxFeePerGas': INITIAL_MAX_FEE_PER_GAS,
+                    'maxPriorityFeePerGas': INITIAL_MAX_PRIORITY_FEE_PER_GAS,
+                    'gas': int(gas_estimate * 1.2),
+                }
+                update_status(f"Gas estimated. Preparing to send.")
+
+                transaction = contract_function.build_transaction(tx_params)
+                update_status(f"Signing transaction with backend wallet {signer.address}...")
+                signed_tx = w3.eth.account.sign_transaction(transaction, private_key=signer.account.key)
+
+                update_status("Sending transaction to the network...")
+                tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            finally:
+                signer_pool.release_nonce(signer, nonce, broadcast=tx_hash is not None)
+            update_status(f"Transaction sent. Hash: {tx_hash.hex()}", {'txHash': tx_hash.hex()})
+
+            update_status("Waiting for confirmation from the network (this can take a moment)...")
+            tx_receipt, tx_hashes = _wait_with_replacement(transaction, signer, tx_hash, update_status)
+            status_msg = 'Success' if tx_receipt.status == 1 else 'Failed'
+            if len(tx_hashes) > 1:
+                landed_hash = tx_receipt.transactionHash.hex()
+                logger.info(f"TX REPLACEMENT: Nonce {transaction['nonce']} landed as {landed_hash} "
+                            f"after {len(tx_hashes) - 1} replacement(s).")
+                update_status(f"Transaction confirmed on the blockchain. Status: {status_msg}",
+                              {'txHash': landed_hash, 'trackedHashes': [h.hex() for h in tx_hashes]})
+            else:
+                update_status(f"Transaction confirmed on the blockchain. Status: {status_msg}")
+            return tx_receipt
+        except Exception as e:
+            logger.error(f"TX FAILED: {e}")
+            update_status(f"Blockchain transaction failed: {str(e)}")
+            raise e
 
 def register_path_on_chain(path_id, content_hash, task_id=None, progress_callback=None):
     return send_tx_and_get_receipt(
@@ -112,4 +373,66 @@ def set_token_uri_on_chain(token_id, metadata_url):
         return receipt
     else:
         logger.error(f"NFT Mint (2/2): Failed to set token URI for token {token_id}.")
-        return None
\ No newline at end of file
+        return None
+
+def sign_mint_voucher(user_wallet, path_id, metadata_url, nonce=None):
+    """
+    Signs an EIP-712 MintVoucher that lets the user mint their own certificate via `redeem`.
+    This is a purely local operation; no transaction is sent and no gas is spent by the backend.
+    """
+    if nonce is None:
+        nonce = secrets.randbits(256)
+    voucher = {
+        "to": Web3.to_checksum_address(user_wallet),
+        "pathId": int(path_id),
+        "uri": metadata_url,
+        "nonce": nonce,
+    }
+    typed_data = {
+        "types": VOUCHER_TYPES,
+        "primaryType": "MintVoucher",
+        "domain": {
+            "name": VOUCHER_DOMAIN_NAME,
+            "version": VOUCHER_DOMAIN_VERSION,
+            "chainId": _get_chain_id(),
+            "verifyingContract": nft_contract.address,
+        },
+        "message": voucher,
+    }
+    signed_message = w3.eth.account.sign_message(encode_typed_data(full_message=typed_data), private_key=account.key)
+    logger.info(f"NFT Voucher: Signed voucher for user {user_wallet}, path {path_id}, nonce {nonce}")
+    return {
+        "voucher": voucher,
+        "signature": Web3.to_hex(signed_message.signature),
+        "domain": typed_data["domain"],
+    }
+
+def get_redeemed_voucher(tx_hash):
+    """
+    Reads a `redeem` transaction receipt and returns the VoucherRedeemed event arguments,
+    or None if the transaction did not redeem a voucher on our contract.
+    """
+    receipt = w3.eth.get_transaction_receipt(tx_hash)
+    if receipt.status != 1:
+        logger.warning(f"NFT Voucher: Redeem transaction {tx_hash} did not succeed.")
+        return None
+
+    if not receipt['to'] or Web3.to_checksum_address(receipt['to']) != nft_contract.address:
+        logger.warning(f"NFT Voucher: Transaction {tx_hash} was not sent to the certificate contract.")
+        return None
+
+    # process_receipt decodes any log matching the event ABI, whichever contract emitted it.
+    redeemed_events = [event for event in nft_contract.events.VoucherRedeemed().process_receipt(receipt)
+                       if Web3.to_checksum_address(event['address']) == nft_contract.address]
+    if not redeemed_events:
+        logger.warning(f"NFT Voucher: No VoucherRedeemed event found in transaction {tx_hash}.")
+        return None
+
+    args = redeemed_events[0]['args']
+    logger.info(f"NFT Voucher: Transaction {tx_hash} redeemed token {args['tokenId']} for path {args['pathId']}.")
+    return {
+        "to": args['to'],
+        "path_id": args['pathId'],
+        "token_id": args['tokenId'],
+        "nonce": args['nonce'],
+    }
\ No newline at end of file
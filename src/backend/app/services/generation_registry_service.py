@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+from app import logger
+from app.config import config
+from .suggest_service import normalize
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class InFlightGenerations:
+    """
+    Registry of the path generations running in this process, so a second request for the same
+    topic can be pointed at the running task instead of starting a duplicate one. A generation is
+    found by any of its normalized keys (the topic as typed and the rephrased title), or by the
+    cosine similarity of its title embedding to the new one reaching `similarity_threshold`.
+    Entries are released when their task finishes, and expire after `max_age_seconds` in case a
+    worker never got to release its own.
+    """
+
+    def __init__(self, similarity_threshold, max_age_seconds):
+        self.similarity_threshold = similarity_threshold
+        self.max_age_seconds = max_age_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.max_age_seconds
+        for task_id in [task_id for task_id, entry in self._entries.items() if entry['started_at'] < cutoff]:
+            logger.warning(f"GENERATION_REGISTRY: Task {task_id} was never released; expiring it.")
+            del self._entries[task_id]
+
+    def _match(self, keys, unit_embedding):
+        for task_id, entry in self._entries.items():
+            if keys & entry['keys']:
+                return task_id, entry, None
+        if unit_embedding is None:
+            return None
+        best = None
+        for task_id, entry in self._entries.items():
+            if entry['embedding'] is None:
+                continue
+            similarity = sum(a * b for a, b in zip(unit_embedding, entry['embedding']))
+            if similarity >= self.similarity_threshold and (best is None or similarity > best[2]):
+                best = (task_id, entry, similarity)
+        return best
+
+    def find(self, texts, embedding=None):
+        """Returns the running generation matching any of the texts or the embedding, or None."""
+        keys = {normalize(text) for text in texts if normalize(text)}
+        with self._lock:
+            self._expire()
+            match = self._match(keys, _unit(embedding) if embedding else None)
+        return self._describe(match)
+
+    def claim(self, task_id, title, texts, embedding=None):
+        """
+        Registers a generation unless a matching one is already running, in which case that one
+        is returned and nothing is registered. Checking and registering happen under one lock,
+        so of two concurrent claims for the same topic exactly one wins.
+        """
+        keys = {normalize(text) for text in texts if normalize(text)}
+        unit_embedding = _unit(embedding) if embedding else None
+        with self._lock:
+            self._expire()
+            match = self._match(keys, unit_embedding)
+            if match is None:
+                self._entries[task_id] = {'title': title, 'keys': keys, 'embedding': unit_embedding,
+                                          'started_at': time.monotonic()}
+        return self._describe(match)
+
+    def release(self, task_id):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    @staticmethod
+    def _describe(match):
+        if match is None:
+            return None
+        task_id, entry, similarity = match
+        return {'task_id': task_id, 'title': entry['title'],
+                'similarity': round(similarity, 4) if similarity is not None else None}
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._entries)}
+
+
+in_flight_generations = InFlightGenerations(similarity_threshold=config.GENERATION_COALESCE_THRESHOLD,
+                                            max_age_seconds=config.GENERATION_COALESCE_MAX_AGE_SECONDS)
@@ -1,6 +1,14 @@
 import requests
+import base64
+import atexit
+import hashlib
 import json
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from app import logger
 from app.config import config
 
@@ -8,11 +16,211 @@ PINATA_BASE_URL = "https://api.pinata.cloud/"
 PINATA_PIN_FILE_URL = f"{PINATA_BASE_URL}pinning/pinFileToIPFS"
 PINATA_PIN_JSON_URL = f"{PINATA_BASE_URL}pinning/pinJSONToIPFS"
 
-def upload_to_ipfs(file_path=None, json_data=None, name=None):
+# UnixFS import parameters used by Pinata (and kubo's defaults): fixed 256 KiB chunks arranged in a
+# balanced DAG of up to 174 links per node. CIDv1 imports use raw leaves; CIDv0 wraps leaves in dag-pb.
+CHUNK_SIZE = 262144
+MAX_LINKS_PER_NODE = 174
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+UNIXFS_TYPE_FILE = 2
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+def _create_pinata_session():
+    """
+    Builds a keep-alive session shared by all uploads. Pins are content-addressed, so re-sending
+    a POST after a connection error or 429/5xx cannot create a different result and is safe to retry.
+    """
+    retry = Retry(
+        total=config.IPFS_UPLOAD_RETRIES,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.IPFS_MAX_CONCURRENT_UPLOADS, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+def _varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+def _pb_varint_field(field_number, value):
+    return _varint(field_number << 3) + _varint(value)
+
+def _pb_bytes_field(field_number, value):
+    return _varint((field_number << 3) | 2) + _varint(len(value)) + value
+
+def _multihash_sha256(block):
+    return b"\x12\x20" + hashlib.sha256(block).digest()
+
+def _encode_cid(codec, block, cid_version):
+    multihash = _multihash_sha256(block)
+    if cid_version == 0:
+        number = int.from_bytes(multihash, 'big')
+        encoded = ""
+        while number:
+            number, remainder = divmod(number, 58)
+            encoded = BASE58_ALPHABET[remainder] + encoded
+        return encoded
+    cid_bytes = _varint(1) + _varint(codec) + multihash
+    return "b" + base64.b32encode(cid_bytes).decode().lower().rstrip("=")
+
+def _unixfs_file_data(data=None, filesize=0, blocksizes=()):
+    encoded = _pb_varint_field(1, UNIXFS_TYPE_FILE)
+    if data:
+        encoded += _pb_bytes_field(2, data)
+    encoded += _pb_varint_field(3, filesize)
+    for blocksize in blocksizes:
+        encoded += _pb_varint_field(4, blocksize)
+    return encoded
+
+def _dag_pb_node(unixfs_data, links=()):
+    """Encodes a dag-pb node; links are (cid_bytes, tsize) pairs and are written before Data, as the spec requires."""
+    encoded = b""
+    for cid_bytes, tsize in links:
+        link = _pb_bytes_field(1, cid_bytes) + _pb_bytes_field(2, b"") + _pb_varint_field(3, tsize)
+        encoded += _pb_bytes_field(2, link)
+    return encoded + _pb_bytes_field(1, unixfs_data)
+
+def _cid_bytes(codec, block, cid_version):
+    multihash = _multihash_sha256(block)
+    return multihash if cid_version == 0 else _varint(1) + _varint(codec) + multihash
+
+def _build_leaf(chunk, cid_version):
+    """Returns (codec, block, file_size, tree_size) for one chunk."""
+    if cid_version == 1:
+        return CODEC_RAW, chunk, len(chunk), len(chunk)
+    block = _dag_pb_node(_unixfs_file_data(chunk, len(chunk)))
+    return CODEC_DAG_PB, block, len(chunk), len(block)
+
+def _build_balanced(leaves, depth, cid_version):
+    if depth == 0:
+        return leaves[0]
+    subtree_capacity = MAX_LINKS_PER_NODE ** (depth - 1)
+    children = [_build_balanced(leaves[i:i + subtree_capacity], depth - 1, cid_version)
+                for i in range(0, len(leaves), subtree_capacity)]
+    links = [(_cid_bytes(codec, block, cid_version), tree_size) for codec, block, _, tree_size in children]
+    file_size = sum(child[2] for child in children)
+    block = _dag_pb_node(_unixfs_file_data(filesize=file_size, blocksizes=[child[2] for child in children]), links)
+    return CODEC_DAG_PB, block, file_size, len(block) + sum(tree_size for *_, tree_size in children)
+
+def compute_cid(data, cid_version=None):
+    """
+    Computes the CID IPFS would assign to 'data' when imported as a single file, without uploading it.
+    Uses the same chunking and DAG layout as Pinata so the result matches the pinned CID.
+    """
+    if cid_version is None:
+        cid_version = config.IPFS_CID_VERSION
+    chunks = [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)] or [b""]
+    leaves = [_build_leaf(chunk, cid_version) for chunk in chunks]
+    depth = 0
+    while MAX_LINKS_PER_NODE ** depth < len(leaves):
+        depth += 1
+    codec, block, _, _ = _build_balanced(leaves, depth, cid_version)
+    return _encode_cid(codec, block, cid_version)
+
+def serialize_json(json_data):
+    """Serializes JSON deterministically so identical metadata always produces the same bytes and CID."""
+    return json.dumps(json_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+_pinata_session = _create_pinata_session()
+_upload_executor = ThreadPoolExecutor(max_workers=config.IPFS_MAX_CONCURRENT_UPLOADS, thread_name_prefix='ipfs-upload')
+
+def _load_pin_index():
+    if not os.path.exists(config.IPFS_PIN_INDEX_PATH):
+        return {}
+    try:
+        with open(config.IPFS_PIN_INDEX_PATH, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"IPFS: Could not read pin index '{config.IPFS_PIN_INDEX_PATH}', starting empty: {e}")
+        return {}
+    # Uploads that were in flight when the process stopped must be retried.
+    return {cid: entry for cid, entry in index.items() if entry.get('status') == 'pinned'}
+
+_pin_index_lock = threading.RLock()
+_pin_index = _load_pin_index()
+_pin_index_dirty = False
+_pending_pins = {}
+
+def _set_pin_status(cid, status, name=None):
+    global _pin_index_dirty
+    with _pin_index_lock:
+        entry = _pin_index.setdefault(cid, {})
+        # Only pinned entries are persisted; pending and failed ones do not survive a restart anyway.
+        _pin_index_dirty = _pin_index_dirty or 'pinned' in (status, entry.get('status'))
+        entry['status'] = status
+        entry['updated_at'] = time.time()
+        if name:
+            entry['name'] = name
+
+def _prune_pin_index():
+    """Forgets pinned and failed entries not used for IPFS_PIN_INDEX_RETENTION_SECONDS. Returns how many."""
+    global _pin_index_dirty
+    cutoff = time.time() - config.IPFS_PIN_INDEX_RETENTION_SECONDS
+    with _pin_index_lock:
+        expired = [cid for cid, entry in _pin_index.items()
+                   if entry['status'] != 'pending' and entry.get('updated_at', 0) < cutoff]
+        for cid in expired:
+            del _pin_index[cid]
+        _pin_index_dirty = _pin_index_dirty or bool(expired)
+    return len(expired)
+
+def save_pin_index():
+    """Writes the pinned entries to IPFS_PIN_INDEX_PATH if they changed since the last save."""
+    global _pin_index_dirty
+    with _pin_index_lock:
+        if not _pin_index_dirty:
+            return
+        snapshot = {cid: dict(entry) for cid, entry in _pin_index.items() if entry['status'] == 'pinned'}
+        _pin_index_dirty = False
+
+    temp_path = f"{config.IPFS_PIN_INDEX_PATH}.tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, config.IPFS_PIN_INDEX_PATH)
+    except OSError as e:
+        logger.warning(f"IPFS: Could not persist pin index: {e}")
+        with _pin_index_lock:
+            _pin_index_dirty = True
+
+def _maintain_pin_index():
+    while True:
+        time.sleep(config.IPFS_PIN_INDEX_SAVE_INTERVAL_SECONDS)
+        try:
+            pruned = _prune_pin_index()
+            if pruned:
+                logger.info(f"IPFS: Pruned {pruned} pin index entries unused for "
+                            f"{config.IPFS_PIN_INDEX_RETENTION_SECONDS} seconds.")
+            save_pin_index()
+        except Exception as e:
+            logger.error(f"IPFS: Pin index maintenance failed: {e}", exc_info=True)
+
+threading.Thread(target=_maintain_pin_index, name='ipfs-pin-index', daemon=True).start()
+atexit.register(save_pin_index)
+
+def get_pin_status(cid):
+    """Returns 'pinned', 'pending', 'failed' or None if this process has never pinned the CID."""
+    with _pin_index_lock:
+        entry = _pin_index.get(cid)
+        return entry['status'] if entry else None
+
+def upload_to_ipfs(file_path=None, json_data=None, name=None, file_bytes=None):
     """
     Uploads a file or a JSON object to IPFS via Pinata.
     Returns the IPFS hash (CID).
     'name' parameter is used to set a filename for the upload on Pinata.
+    'file_bytes' uploads in-memory content as a file named 'name'.
     """
     if not config.PINATA_API_KEY or not config.PINATA_API_SECRET:
         logger.error("IPFS Error: Pinata API Key or Secret is not configured.")
@@ -24,17 +232,24 @@ def upload_to_ipfs(file_path=None, json_data=None, name=None):
     }
 
     try:
-        if file_path:
+        pinata_options = json.dumps({"cidVersion": config.IPFS_CID_VERSION})
+        if file_bytes is not None:
+            logger.info(f"IPFS: Uploading {len(file_bytes)} bytes to Pinata as '{name}'.")
+            files = {'file': (name or 'file', file_bytes)}
+            response = _pinata_session.post(PINATA_PIN_FILE_URL, headers=headers, files=files,
+                                            data={'pinataOptions': pinata_options}, timeout=60)
+        elif file_path:
             logger.info(f"IPFS: Uploading file '{file_path}' to Pinata.")
             with open(file_path, 'rb') as f:
                 files = {'file': (os.path.basename(file_path), f)}
-                response = requests.post(PINATA_PIN_FILE_URL, headers=headers, files=files, timeout=60)
+                response = _pinata_session.post(PINATA_PIN_FILE_URL, headers=headers, files=files,
+                                                data={'pinataOptions': pinata_options}, timeout=60)
         elif json_data:
             logger.info(f"IPFS: Uploading JSON data to Pinata with name '{name}'.")
             payload = {"pinataContent": json_data}
             if name:
                 payload['pinataMetadata'] = {'name': name}
-            response = requests.post(PINATA_PIN_JSON_URL, headers=headers, json=payload, timeout=60)
+            response = _pinata_session.post(PINATA_PIN_JSON_URL, headers=headers, json=payload, timeout=60)
         else:
             raise ValueError("Either file_path or json_data must be provided.")
 
@@ -45,8 +260,76 @@ def upload_to_ipfs(file_path=None, json_data=None, name=None):
         return ipfs_hash
 
     except requests.exceptions.RequestException as e:
-        logger.error(f"IPFS: Request failed: {e.response.text if e.response else str(e)}", exc_info=True)
+        logger.error(f"IPFS: Request failed: {e.response.text if e.response is not None else str(e)}", exc_info=True)
         return None
     except Exception as e:
         logger.error(f"IPFS: An unexpected error occurred during upload: {e}", exc_info=True)
         return None
+
+def upload_to_ipfs_async(file_path=None, json_data=None, name=None, file_bytes=None):
+    """Starts an upload on the shared upload pool and returns a Future that resolves to the CID (or None)."""
+    return _upload_executor.submit(upload_to_ipfs, file_path=file_path, json_data=json_data, name=name,
+                                   file_bytes=file_bytes)
+
+def upload_many_to_ipfs(uploads):
+    """
+    Uploads several independent files or JSON objects concurrently.
+    Each entry in 'uploads' is a dict of upload_to_ipfs keyword arguments.
+    Returns the CIDs in the same order, with None for any upload that failed.
+    """
+    futures = [upload_to_ipfs_async(**upload) for upload in uploads]
+    return [future.result() for future in futures]
+
+
+def _pin_and_record(cid, data, name):
+    try:
+        pinned_cid = upload_to_ipfs(file_bytes=data, name=name)
+        if not pinned_cid:
+            _set_pin_status(cid, 'failed', name)
+        elif pinned_cid != cid:
+            logger.error(f"IPFS: Locally computed CID {cid} does not match pinned CID {pinned_cid} for '{name}'. "
+                         f"Check that IPFS_CID_VERSION matches the Pinata import settings.")
+            _set_pin_status(cid, 'failed', name)
+            _set_pin_status(pinned_cid, 'pinned', name)
+        else:
+            _set_pin_status(cid, 'pinned', name)
+        return pinned_cid
+    finally:
+        with _pin_index_lock:
+            _pending_pins.pop(cid, None)
+
+def pin_bytes_async(data, name):
+    """
+    Computes the content's CID locally and returns (cid, future) immediately. The future resolves to the
+    CID Pinata reports (or None on failure). Content already pinned, or already being pinned, is not uploaded again.
+    """
+    cid = compute_cid(data)
+    with _pin_index_lock:
+        pending_future = _pending_pins.get(cid)
+        if pending_future:
+            logger.info(f"IPFS: CID {cid} ('{name}') is already being pinned. Reusing the in-flight upload.")
+            return cid, pending_future
+
+        entry = _pin_index.get(cid)
+        if entry and entry.get('status') == 'pinned':
+            logger.info(f"IPFS: CID {cid} ('{name}') is already pinned. Skipping upload.")
+            # Reuse keeps the entry from being pruned; it is not worth a save on its own.
+            entry['updated_at'] = time.time()
+            future = Future()
+            future.set_result(cid)
+            return cid, future
+
+        _set_pin_status(cid, 'pending', name)
+        future = _upload_executor.submit(_pin_and_record, cid, data, name)
+        _pending_pins[cid] = future
+        return cid, future
+
+def pin_file_async(file_path):
+    """Reads a file and pins it via pin_bytes_async. Returns (cid, future)."""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return pin_bytes_async(data, os.path.basename(file_path))
+
+def pin_json_async(json_data, name):
+    """Pins JSON as a deterministic file so its CID is known before the upload finishes. Returns (cid, future)."""
+    return pin_bytes_async(serialize_json(json_data), name)
@@ -0,0 +1,152 @@
+import atexit
+import threading
+from app import logger
+
+
+class ProgressWriteBuffer:
+    """
+    An in-process write-behind buffer for level progress.
+    Writes are coalesced by (wallet, path_id, level_index), last writer wins, and handed to
+    `flush_fn` as one list every `flush_interval_seconds`, or sooner once `max_pending` entries
+    are waiting. `flush_fn` returns the entries it could not write (or raises if it wrote none),
+    and those are queued again. Entries stay readable until their flush has finished, so callers can overlay
+    them on database reads to see their own writes. The buffer is drained on interpreter exit.
+    """
+
+    def __init__(self, flush_fn, flush_interval_seconds, max_pending):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self._flush_fn = flush_fn
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Only one flush runs at a time, so an older batch can never land after a newer one.
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.written = 0
+        self.coalesced = 0
+        self.failed_flushes = 0
+        self._thread = threading.Thread(target=self._run, name='progress-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _key(wallet_address, path_id, level_index):
+        return wallet_address.lower(), int(path_id), int(level_index)
+
+    def add(self, wallet_address, path_id, level_index, correct_answers, total_questions):
+        key = self._key(wallet_address, path_id, level_index)
+        entry = {
+            'wallet_address': key[0],
+            'path_id': key[1],
+            'level_index': key[2],
+            'correct_answers': correct_answers,
+            'total_questions': total_questions
+        }
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = entry
+            is_full = len(self._pending) >= self.max_pending
+
+        if self._stopped.is_set():
+            self.flush()
+        elif is_full:
+            self._wake.set()
+
+    def get(self, wallet_address, path_id, level_index):
+        """Returns the buffered entry for a level, or None if nothing is waiting to be written."""
+        key = self._key(wallet_address, path_id, level_index)
+        with self._lock:
+            return self._pending.get(key) or self._in_flight.get(key)
+
+    def flush(self, wallet_address=None, path_id=None):
+        """
+        Writes buffered entries now, optionally only those of one wallet (and one path of it).
+        Returns the number of entries that left the buffer, i.e. were written or dropped by
+        `flush_fn` as unwritable. Failed entries are put back unless a newer write
+        for the same level arrived in the meantime.
+        """
+        with self._flush_lock:
+            return self._flush(wallet_address, path_id)
+
+    def _flush(self, wallet_address, path_id):
+        """flush() without taking the flush lock, for callers that already hold it."""
+        with self._lock:
+            if wallet_address is None:
+                batch, self._pending = self._pending, {}
+            else:
+                wallet_address = wallet_address.lower()
+                keys = [key for key in self._pending
+                        if key[0] == wallet_address and (path_id is None or key[1] == int(path_id))]
+                batch = {key: self._pending.pop(key) for key in keys}
+            if not batch:
+                return 0
+            self._in_flight = batch
+
+        try:
+            failed = {self._key(entry['wallet_address'], entry['path_id'], entry['level_index']): entry
+                      for entry in self._flush_fn(list(batch.values())) or []}
+        except Exception as e:
+            logger.error(f"PROGRESS_BUFFER: Failed to flush {len(batch)} buffered level results. Error: {e}",
+                         exc_info=True)
+            failed = batch
+
+        with self._lock:
+            for key, entry in failed.items():
+                self._pending.setdefault(key, entry)
+            self._in_flight = {}
+            self.written += len(batch) - len(failed)
+            if failed:
+                self.failed_flushes += 1
+        if failed:
+            logger.warning(f"PROGRESS_BUFFER: {len(failed)} of {len(batch)} buffered level results could not "
+                           f"be written and were queued again.")
+        else:
+            logger.info(f"PROGRESS_BUFFER: Flushed {len(batch)} buffered level results.")
+        return len(batch) - len(failed)
+
+    def write_through(self, wallet_address, levels, write_fn):
+        """
+        Runs `write_fn()`, a direct database write of one wallet's `levels` ((path_id, level_index)
+        pairs), in order with the buffer: the wallet's buffered entries are flushed first, and any of
+        them for the same levels that could not be written are dropped, since the direct write
+        supersedes them. No flush can run while `write_fn` does. Returns what `write_fn` returns.
+        """
+        with self._flush_lock:
+            self._flush(wallet_address, None)
+            keys = [self._key(wallet_address, path_id, level_index) for path_id, level_index in levels]
+            with self._lock:
+                superseded = {key: self._pending[key] for key in keys if key in self._pending}
+            result = write_fn()
+            with self._lock:
+                for key, entry in superseded.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+            return result
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stops the background flusher and drains everything still buffered."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval_seconds + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "written": self.written,
+                "coalesced": self.coalesced,
+                "failed_flushes": self.failed_flushes
+            }
@@ -0,0 +1,104 @@
+import queue
+import threading
+from app import logger
+from app.config import config
+from .cache_service import LRUCache
+
+# Put on a subscriber's queue once its task has finished emitting events.
+END_OF_STREAM = object()
+
+
+class _Topic:
+    def __init__(self):
+        self.history = []
+        self.subscribers = set()
+
+
+class ProgressBroker:
+    """
+    In-process pub/sub for generation progress events.
+    Each open task keeps a bounded history of its events, so a subscriber can be handed
+    everything it missed and every new event without a gap between the two. The history of
+    a finished task is retained for `retain_seconds`, covering the window in which its last
+    events may not have reached the database yet.
+    """
+
+    def __init__(self, history_limit, retain_seconds):
+        self.history_limit = history_limit
+        self._topics = {}
+        self._finished = LRUCache(max_size=1024, ttl_seconds=retain_seconds)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """
+        Registers a callable(task_id, event) invoked for every published event, and with
+        event=None once a task is closed.
+        """
+        self._listeners.append(listener)
+
+    def open(self, task_id):
+        with self._lock:
+            self._topics.setdefault(task_id, _Topic())
+
+    def publish(self, task_id, event):
+        with self._lock:
+            topic = self._topics.setdefault(task_id, _Topic())
+            topic.history.append(event)
+            if len(topic.history) > self.history_limit:
+                del topic.history[0]
+            for subscriber in topic.subscribers:
+                subscriber.put(event)
+        self._notify(task_id, event)
+
+    def close(self, task_id):
+        with self._lock:
+            topic = self._topics.pop(task_id, None)
+            if topic is None:
+                return
+            for subscriber in topic.subscribers:
+                subscriber.put(END_OF_STREAM)
+            self._finished.set(task_id, topic.history)
+        self._notify(task_id, None)
+
+    def is_open(self, task_id):
+        with self._lock:
+            return task_id in self._topics
+
+    def subscribe(self, task_id):
+        """
+        Returns a queue receiving every event published for the task from now on, then
+        END_OF_STREAM, or None if the task is not running in this process.
+        """
+        with self._lock:
+            topic = self._topics.get(task_id)
+            if topic is None:
+                return None
+            subscription = queue.Queue()
+            topic.subscribers.add(subscription)
+            return subscription
+
+    def get_history(self, task_id):
+        """Returns the retained events of an open or recently finished task, or None."""
+        with self._lock:
+            topic = self._topics.get(task_id)
+            if topic is not None:
+                return list(topic.history)
+        return self._finished.get(task_id)
+
+    def unsubscribe(self, task_id, subscription):
+        with self._lock:
+            topic = self._topics.get(task_id)
+            if topic is not None:
+                topic.subscribers.discard(subscription)
+
+    def _notify(self, task_id, event):
+        for listener in self._listeners:
+            try:
+                listener(task_id, event)
+            except Exception as e:
+                logger.error(f"PUBSUB: Listener failed for task {task_id}. Error: {e}", exc_info=True)
+
+
+progress_broker = ProgressBroker(history_limit=config.TASK_EVENT_HISTORY_LIMIT,
+                                 retain_seconds=config.TASK_EVENT_RETAIN_SECONDS)
@@ -0,0 +1,66 @@
+import queue
+import threading
+from app import logger
+
+# Queued when paths have lost neighbors (or never had any) and lists need to be refilled.
+_REFILL = object()
+
+
+class RelatedPathsJob:
+    """
+    Keeps the precomputed path_neighbors lists current in a background thread, so requests
+    never wait on a vector scan. A created path gets its own top-k and is slotted into the
+    lists of the paths it is now among the nearest of (`refresh_fn(path_id)`); a deletion
+    queues a refill of the lists that lost it (`refill_fn(limit)`, called until it returns 0).
+    The refill also backfills paths created before the lists existed, so one is queued at start
+    when `backfill_on_start` is set.
+    """
+
+    def __init__(self, refresh_fn, refill_fn, refill_batch_size, backfill_on_start):
+        self.refill_batch_size = refill_batch_size
+        self._refresh_fn = refresh_fn
+        self._refill_fn = refill_fn
+        self._queue = queue.Queue()
+        self.paths_refreshed = 0
+        self.lists_refilled = 0
+        self._thread = threading.Thread(target=self._run, name='related-paths-job', daemon=True)
+        self._thread.start()
+        if backfill_on_start:
+            self._queue.put(_REFILL)
+
+    def path_created(self, path_id):
+        self._queue.put(path_id)
+
+    def path_deleted(self, path_id):
+        self._queue.put(_REFILL)
+
+    def _refill(self):
+        while True:
+            refilled = self._refill_fn(self.refill_batch_size)
+            self.lists_refilled += refilled
+            if not refilled:
+                return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _REFILL:
+                    # Collapse a burst of deletions into one refill.
+                    while not self._queue.empty() and self._queue.queue[0] is _REFILL:
+                        self._queue.get_nowait()
+                    self._refill()
+                else:
+                    affected = self._refresh_fn(item)
+                    self.paths_refreshed += 1
+                    logger.info(f"RELATED_PATHS: Computed neighbors of path {item}; updated {affected} other lists.")
+            except Exception as e:
+                logger.error(f"RELATED_PATHS: Failed to update neighbor lists for {'refill' if item is _REFILL else item}. "
+                             f"Error: {e}", exc_info=True)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "paths_refreshed": self.paths_refreshed,
+            "lists_refilled": self.lists_refilled
+        }
@@ -0,0 +1,203 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from app import logger
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    """Lowercases text and reduces it to its words, dropping punctuation and emoji."""
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def _title_keys(title):
+    """The normalized title and every word-aligned suffix of it, so prefixes match mid-title too."""
+    words = normalize(title).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def _rank(path_ids, limit, titles, popularity):
+    """Most learners first, then shorter titles, which tend to be the more general paths."""
+    return heapq.nsmallest(limit, path_ids, key=lambda path_id: (-popularity.get(path_id, 0),
+                                                               len(titles[path_id]), path_id))
+
+
+def _precompute_top(keys, titles, popularity, max_results, scan_limit):
+    """
+    Ranks the top `max_results` paths of every prefix matching more than `scan_limit` keys.
+    Walks the sorted keys as an implicit trie: the ranking of a prefix is merged from the
+    rankings of its heavy extensions and the raw ids of its light ones.
+    """
+    top = {}
+
+    def visit(prefix, lo, hi):
+        candidates = set()
+        i = lo
+        while i < hi and keys[i][0] == prefix:
+            candidates.add(keys[i][1])
+            i += 1
+        while i < hi:
+            last_char = keys[i][0][len(prefix)]
+            end = bisect_left(keys, (prefix + chr(ord(last_char) + 1),), i, hi)
+            if end - i > scan_limit:
+                candidates.update(visit(prefix + last_char, i, end))
+            else:
+                candidates.update(keys[j][1] for j in range(i, end))
+            i = end
+        top[prefix] = _rank(candidates, max_results, titles, popularity)
+        return top[prefix]
+
+    if len(keys) > scan_limit:
+        visit('', 0, len(keys))
+    return top
+
+
+class PathSuggestIndex:
+    """
+    An in-memory prefix index over learning path titles for typeahead suggestions.
+    Every word-aligned suffix of a normalized title is kept in one sorted list, so the keys
+    matching a prefix are one bisect away. Matches are ranked by popularity (learners who
+    started the path). Prefixes matching more than `scan_limit` keys have their top
+    `max_results` precomputed; any other prefix scans and ranks at most `scan_limit` keys.
+    A background thread builds the index from `load_fn()` (path rows) and `popularity_fn()`
+    ({path_id: learners}) and rebuilds it every `refresh_interval_seconds` to pick up popularity
+    changes; between rebuilds, callers keep it current with add() and remove().
+    """
+
+    def __init__(self, load_fn, popularity_fn, refresh_interval_seconds, max_results, scan_limit=256):
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.max_results = max_results
+        self.scan_limit = scan_limit
+        self._load_fn = load_fn
+        self._popularity_fn = popularity_fn
+        self._keys = None
+        self._titles = {}
+        self._popularity = {}
+        self._top = {}
+        # Catalog changes seen while a rebuild is loading, replayed once it is swapped in.
+        self._missed = None
+        self._lock = threading.RLock()
+        self._thread = threading.Thread(target=self._run, name='path-suggest-index', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        return self._keys is not None
+
+    def _ranked(self, path_ids, limit):
+        return _rank(path_ids, limit, self._titles, self._popularity)
+
+    def _matching_ids(self, prefix):
+        matches = set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            matches.add(self._keys[i][1])
+            i += 1
+        return matches
+
+    def build(self, rows, popularity):
+        """Replaces the index with the given path rows ({id, title}) and learner counts."""
+        titles = {row['id']: row['title'] for row in rows if normalize(row.get('title'))}
+        keys = sorted((key, path_id) for path_id, title in titles.items() for key in _title_keys(title))
+        top = _precompute_top(keys, titles, popularity, self.max_results, self.scan_limit)
+
+        with self._lock:
+            self._titles = titles
+            self._popularity = popularity
+            self._top = top
+            self._keys = keys
+        logger.info(f"SUGGEST: Indexed {len(titles)} path titles under {len(keys)} keys "
+                    f"({len(top)} precomputed prefixes).")
+
+    def add(self, path):
+        title = path.get('title')
+        if not normalize(title):
+            return
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('created', path))
+            if self._keys is None:
+                return
+            if path['id'] in self._titles:
+                self._remove_keys(path['id'])
+            self._titles[path['id']] = title
+            for key in _title_keys(title):
+                insort(self._keys, (key, path['id']))
+                for prefix in (key[:length] for length in range(len(key) + 1)):
+                    ranked = self._top.get(prefix)
+                    if ranked is not None and path['id'] not in ranked:
+                        self._top[prefix] = self._ranked(ranked + [path['id']], self.max_results)
+
+    def remove(self, path_id):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(('deleted', {'id': path_id}))
+            if self._keys is None or path_id not in self._titles:
+                return
+            self._remove_keys(path_id)
+            self._popularity.pop(path_id, None)
+
+    def _remove_keys(self, path_id):
+        title = self._titles.pop(path_id)
+        for key in _title_keys(title):
+            i = bisect_left(self._keys, (key, path_id))
+            if i < len(self._keys) and self._keys[i] == (key, path_id):
+                del self._keys[i]
+            # Refill the precomputed rankings the path was part of.
+            for prefix in (key[:length] for length in range(len(key) + 1)):
+                ranked = self._top.get(prefix)
+                if ranked is not None and path_id in ranked:
+                    self._top[prefix] = self._ranked(self._matching_ids(prefix), self.max_results)
+
+    def suggest(self, query, limit=None):
+        """
+        Returns up to `limit` paths whose title, or a word in it onwards, starts with the query,
+        most popular first, as {id, title, learners} dicts, or None if the index is not built yet.
+        """
+        limit = min(limit or self.max_results, self.max_results)
+        prefix = normalize(query)
+        with self._lock:
+            if self._keys is None:
+                return None
+            if not prefix:
+                return []
+            ranked = self._top.get(prefix)
+            if ranked is not None:
+                path_ids = ranked[:limit]
+            else:
+                path_ids = self._ranked(self._matching_ids(prefix), limit)
+            return [{'id': path_id, 'title': self._titles[path_id], 'learners': self._popularity.get(path_id, 0)}
+                    for path_id in path_ids]
+
+    def _rebuild(self):
+        with self._lock:
+            self._missed = []
+        try:
+            self.build(self._load_fn(), self._popularity_fn())
+        finally:
+            with self._lock:
+                missed, self._missed = self._missed, None
+                for event, path in missed:
+                    if event == 'created':
+                        self.add(path)
+                    else:
+                        self.remove(path['id'])
+
+    def _run(self):
+        while True:
+            try:
+                self._rebuild()
+            except Exception as e:
+                logger.error(f"SUGGEST: Building the suggestion index failed. Error: {e}", exc_info=True)
+            time.sleep(self.refresh_interval_seconds if self.ready else 30)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self._keys is not None,
+                "paths": len(self._titles),
+                "keys": len(self._keys or [])
+            }
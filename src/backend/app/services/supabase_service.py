@@ -1,17 +1,108 @@
+from flask import g, has_request_context
 from app import supabase_client, logger
+from app.config import config
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 from . import ai_service
+from .cache_service import LRUCache, SingleFlight
+from .progress_buffer_service import ProgressWriteBuffer
+from . import vector_index_service
+from .suggest_service import PathSuggestIndex
+from .related_paths_service import RelatedPathsJob
+
+# A wallet's user id never changes once the user exists, so resolved ids are cached process-wide.
+# Misses are not cached here, since the user may be created at any moment.
+user_id_cache = LRUCache(max_size=config.USER_ID_CACHE_MAX_SIZE, ttl_seconds=config.USER_ID_CACHE_TTL_SECONDS)
+
+# Serialized documents of fully generated paths. Their content never changes unless the path is
+# deleted or regenerated, so entries are only invalidated explicitly, never by time.
+path_document_cache = LRUCache(max_size=config.PATH_CACHE_MAX_SIZE)
+
+# Hybrid search results keyed on (catalog version, normalized query). The version changes whenever a path
+# is created or deleted, so entries computed against an older catalog are simply never looked up again.
+search_result_cache = LRUCache(max_size=config.SEARCH_CACHE_MAX_SIZE,
+                               ttl_seconds=config.SEARCH_CACHE_TTL_SECONDS or None)
+# Concurrent misses for the same cache key share one hybrid search.
+_search_flights = SingleFlight()
+_catalog_version = 0
+_catalog_version_lock = threading.Lock()
+
+# Runs the keyword and semantic legs of hybrid searches side by side. Legs that miss their
+# budget keep their worker until they return, so the pool size also bounds runaway legs.
+_search_executor = ThreadPoolExecutor(max_workers=config.SEARCH_MAX_WORKERS, thread_name_prefix='search-leg')
+
+# Callables notified with ('created', path_row) or ('deleted', {'id': path_id}) on catalog changes.
+_catalog_listeners = []
+
+def register_catalog_listener(listener):
+    _catalog_listeners.append(listener)
+
+def _notify_catalog(event, path):
+    for listener in _catalog_listeners:
+        try:
+            listener(event, path)
+        except Exception as e:
+            logger.error(f"DB: Catalog listener failed on {event} of path {path.get('id')}. Error: {e}", exc_info=True)
+
+def _bump_catalog_version():
+    global _catalog_version
+    with _catalog_version_lock:
+        _catalog_version += 1
+
+def get_catalog_version():
+    return _catalog_version
+
+def _request_user_id_memo():
+    """Returns the per-request wallet -> user id memo, or None outside of a request."""
+    if not has_request_context():
+        return None
+    if not hasattr(g, 'user_id_memo'):
+        g.user_id_memo = {}
+    return g.user_id_memo
+
+def _forget_user_id(wallet_address):
+    user_id_cache.delete(wallet_address)
+    memo = _request_user_id_memo()
+    if memo is not None:
+        memo.pop(wallet_address, None)
 
 def get_user_by_wallet(wallet_address):
     return supabase_client.table('users').select('id').eq('wallet_address',
                                                           wallet_address.lower()).maybe_single().execute()
 
+def get_user_id_by_wallet(wallet_address):
+    """
+    Resolves a wallet to its user id, or None if no such user exists.
+    Checks the request-scoped memo on flask.g, then the process-wide cache, before querying the database.
+    """
+    wallet_address = wallet_address.lower()
+    memo = _request_user_id_memo()
+    if memo is not None and wallet_address in memo:
+        return memo[wallet_address]
+
+    user_id = user_id_cache.get(wallet_address)
+    if user_id is None:
+        user_res = get_user_by_wallet(wallet_address)
+        user_id = user_res.data['id'] if user_res and user_res.data else None
+        if user_id is not None:
+            user_id_cache.set(wallet_address, user_id)
+
+    if memo is not None:
+        memo[wallet_address] = user_id
+    return user_id
+
 def get_user_by_wallet_full(wallet_address):
     """Fetches the full user object, not just the ID."""
-    return supabase_client.table('users').select('*').eq('wallet_address',
-                                                         wallet_address.lower()).maybe_single().execute()
+    user_res = supabase_client.table('users').select('*').eq('wallet_address',
+                                                             wallet_address.lower()).maybe_single().execute()
+    if user_res and user_res.data:
+        user_id_cache.set(wallet_address.lower(), user_res.data['id'])
+    return user_res
 
 def upsert_user(wallet_address, name, country):
+    _forget_user_id(wallet_address.lower())
     return supabase_client.table('users').upsert({
         'wallet_address': wallet_address.lower(), 'name': name, 'country': country
     }, on_conflict='wallet_address').execute()
@@ -27,6 +118,7 @@ def get_associated_paths_by_wallet(wallet_address):
     Includes progress details for enrolled paths.
     """
     logger.info(f"DB: Fetching all associated (enrolled or created) paths for wallet: {wallet_address.lower()}")
+    flush_pending_progress(wallet_address)
     return supabase_client.rpc('get_user_associated_paths', {
         'p_wallet_address': wallet_address.lower()
     }).execute()
@@ -37,8 +129,25 @@ def get_path_count_by_creator(wallet_address):
                                                                                       wallet_address.lower()).execute()
     return response.count
 
+def _execute_canonical_only(build_query):
+    """
+    Executes the learning_paths query made by `build_query`, leaving out near-duplicates of another path
+    (see cluster_duplicates.py). Falls back to the unfiltered query if
+    database/migrations/004_canonical_paths.sql has not been applied yet.
+    """
+    try:
+        return build_query().is_('canonical_path_id', 'null').execute()
+    except Exception as e:
+        if 'canonical_path_id' not in str(e):
+            raise
+        logger.warning(f"DB: learning_paths has no canonical_path_id column. Querying without the near-duplicate "
+                       f"filter, apply database/migrations/004_canonical_paths.sql if this persists. Error: {e}")
+        return build_query().execute()
+
 def get_all_paths():
-    return supabase_client.table('learning_paths').select("id, title, short_description, total_levels").execute()
+    """Lists the catalog, leaving out near-duplicates of another path."""
+    return _execute_canonical_only(
+        lambda: supabase_client.table('learning_paths').select("id, title, short_description, total_levels"))
 
 def get_path_by_id(path_id):
     return supabase_client.table('learning_paths').select(
@@ -58,6 +167,23 @@ def get_full_path_details(path_id):
     ).maybe_single().execute()
 
 def get_full_path_details_for_user(path_id, user_wallet):
+    """
+    Fetches full path details enriched with user-specific completion and minting status in a single
+    round-trip via the get_path_for_user RPC. Falls back to the multi-query version if the RPC fails.
+    """
+    flush_pending_progress(user_wallet, path_id)
+    try:
+        res = supabase_client.rpc('get_path_for_user', {
+            'p_path_id': path_id,
+            'p_wallet_address': user_wallet.lower()
+        }).execute()
+        return res.data if res else None
+    except Exception as e:
+        logger.warning(f"DB: get_path_for_user RPC failed for path {path_id}. Falling back to separate queries. "
+                       f"Error: {e}")
+        return _get_full_path_details_for_user_legacy(path_id, user_wallet)
+
+def _get_full_path_details_for_user_legacy(path_id, user_wallet):
     """
     Fetches full path details and enriches it with user-specific completion and minting status.
     """
@@ -67,8 +193,7 @@ def get_full_path_details_for_user(path_id, user_wallet):
         return None
     path_data = path_res.data
 
-    user_res = get_user_by_wallet(user_wallet)
-    user_id = user_res.data['id'] if user_res and user_res.data else None
+    user_id = get_user_id_by_wallet(user_wallet)
 
     if user_id:
         progress_res = supabase_client.rpc('get_level_completion_for_path', {
@@ -96,19 +221,40 @@ def get_full_path_details_for_user(path_id, user_wallet):
 
 def create_learning_path(title, short_description, long_description, creator_wallet, total_levels, intent_type,
                          embedding):
-    return supabase_client.table('learning_paths').insert({
+    path_row = {
         "title": title, "short_description": short_description, "long_description": long_description,
         "creator_wallet": creator_wallet.lower(), "total_levels": total_levels, "intent_type": intent_type,
-        "title_embedding": embedding
-    }).execute()
+        "title_embedding": embedding,
+        "embedding_model": config.GEMINI_MODEL_EMBEDDING if embedding is not None else None
+    }
+    try:
+        insert_res = supabase_client.table('learning_paths').insert(path_row).execute()
+    except Exception as e:
+        if 'embedding_model' not in str(e):
+            raise
+        logger.warning(f"DB: learning_paths has no embedding_model column. Inserting without it, apply "
+                       f"database/migrations/003_embedding_model.sql if this persists. Error: {e}")
+        path_row.pop("embedding_model")
+        insert_res = supabase_client.table('learning_paths').insert(path_row).execute()
+    if insert_res and insert_res.data:
+        _bump_catalog_version()
+        _notify_catalog('created', insert_res.data[0])
+    return insert_res
 
 def delete_path_by_id(path_id):
     """Deletes a path and its cascaded content. Use with care."""
     logger.warning(f"DB: Deleting path with ID: {path_id} and all its content.")
-    return supabase_client.table('learning_paths').delete().eq('id', path_id).execute()
+    delete_res = supabase_client.table('learning_paths').delete().eq('id', path_id).execute()
+    path_document_cache.delete(path_id)
+    _bump_catalog_version()
+    _notify_catalog('deleted', {'id': path_id})
+    return delete_res
 
 def update_path_hash(path_id, content_hash):
-    return supabase_client.table('learning_paths').update({'content_hash': content_hash}).eq('id', path_id).execute()
+    update_res = supabase_client.table('learning_paths').update({'content_hash': content_hash}).eq('id',
+                                                                                                   path_id).execute()
+    path_document_cache.delete(path_id)
+    return update_res
 
 def create_level(path_id, level_number, level_title):
     return supabase_client.table('levels').insert({
@@ -122,61 +268,244 @@ def get_level(path_id, level_num):
 def create_content_items(items_to_insert):
     return supabase_client.table('content_items').insert(items_to_insert).execute()
 
-def get_content_items_for_level(level_id):
-    return supabase_client.table('content_items').select('id, item_index, item_type, content').eq('level_id',
-                                                                                                  level_id).order(
-        'item_index').execute()
+_EMBEDDING_PAGE_SIZE = 1000
+
+def _select_with_embedding_model(run_query, columns):
+    """
+    Runs `run_query(columns)` with embedding_model added to the selected learning_paths columns, so the
+    vector index can tell when a path was re-embedded. Falls back to `columns` alone if
+    database/migrations/003_embedding_model.sql has not been applied yet.
+    """
+    try:
+        return run_query(f"{columns}, embedding_model")
+    except Exception as e:
+        if 'embedding_model' not in str(e):
+            raise
+        logger.warning(f"DB: learning_paths has no embedding_model column. Re-embedded paths will not be picked up "
+                       f"by the vector index, apply database/migrations/003_embedding_model.sql. Error: {e}")
+        return run_query(columns)
+
+def iter_path_embeddings():
+    """
+    Yields {id, title, short_description, title_embedding, embedding_model} for every embedded canonical path,
+    paging by id.
+    """
+    last_id = 0
+    while True:
+        page = _select_with_embedding_model(lambda columns: _execute_canonical_only(
+            lambda: supabase_client.table('learning_paths').select(columns).not_.is_(
+                'title_embedding', 'null').gt('id', last_id).order('id').limit(_EMBEDDING_PAGE_SIZE)),
+            'id, title, short_description, title_embedding')
+        rows = page.data or []
+        yield from rows
+        if len(rows) < _EMBEDDING_PAGE_SIZE:
+            return
+        last_id = rows[-1]['id']
+
+def get_embedded_path_versions():
+    """Maps the id of every canonical path that has a title embedding to the model that produced it."""
+    versions = {}
+    last_id = 0
+    while True:
+        page = _select_with_embedding_model(lambda columns: _execute_canonical_only(
+            lambda: supabase_client.table('learning_paths').select(columns).not_.is_(
+                'title_embedding', 'null').gt('id', last_id).order('id').limit(_EMBEDDING_PAGE_SIZE)),
+            'id')
+        rows = page.data or []
+        versions.update((row['id'], row.get('embedding_model')) for row in rows)
+        if len(rows) < _EMBEDDING_PAGE_SIZE:
+            return versions
+        last_id = rows[-1]['id']
+
+def get_path_embeddings_by_ids(path_ids):
+    rows = []
+    for start in range(0, len(path_ids), _EMBEDDING_PAGE_SIZE):
+        ids = path_ids[start:start + _EMBEDDING_PAGE_SIZE]
+        page = _select_with_embedding_model(
+            lambda columns: supabase_client.table('learning_paths').select(columns).in_('id', ids).execute(),
+            'id, title, short_description, title_embedding')
+        rows.extend(page.data or [])
+    return rows
+
+def _create_path_vector_index():
+    if not config.VECTOR_INDEX_ENABLED:
+        return None
+    if not vector_index_service.is_available():
+        logger.warning("DB: VECTOR_INDEX_ENABLED is set but NumPy is not installed. Using pgvector RPCs only.")
+        return None
+
+    index = vector_index_service.PathVectorIndex(
+        dim=768,
+        hnsw_threshold=config.VECTOR_INDEX_HNSW_THRESHOLD,
+        load_fn=iter_path_embeddings,
+        versions_fn=get_embedded_path_versions,
+        fetch_fn=get_path_embeddings_by_ids,
+        reconcile_interval_seconds=config.VECTOR_INDEX_RECONCILE_INTERVAL_SECONDS,
+        compact_ratio=config.VECTOR_INDEX_COMPACT_RATIO
+    )
+
+    def on_catalog_change(event, path):
+        if event == 'created':
+            index.upsert(path)
+        elif event == 'deleted':
+            index.remove(path['id'])
+
+    register_catalog_listener(on_catalog_change)
+    return index
+
+# Optional in-process nearest-neighbour index over title embeddings; None when disabled.
+path_vector_index = _create_path_vector_index()
+
+def _search_vector_index(embedding, threshold, count):
+    """Searches the in-process index, or returns None if it is disabled or still loading."""
+    if path_vector_index is None or embedding is None:
+        return None
+    return path_vector_index.search(embedding, threshold, count)
+
+def get_path_popularity():
+    """Returns {path_id: learners}, where learners is the number of users who have started the path."""
+    res = supabase_client.rpc('get_path_popularity', {}).execute()
+    return {row['path_id']: row['learners'] for row in (res.data or [])}
+
+def _create_path_suggest_index():
+    index = PathSuggestIndex(
+        load_fn=lambda: get_all_paths().data or [],
+        popularity_fn=get_path_popularity,
+        refresh_interval_seconds=config.SUGGEST_REFRESH_INTERVAL_SECONDS,
+        max_results=config.SUGGEST_MAX_RESULTS
+    )
+
+    def on_catalog_change(event, path):
+        if event == 'created':
+            index.add(path)
+        elif event == 'deleted':
+            index.remove(path['id'])
+
+    register_catalog_listener(on_catalog_change)
+    return index
+
+# In-memory prefix index over path titles backing /search/suggest.
+path_suggest_index = _create_path_suggest_index()
+
+def suggest_paths(query, limit=None):
+    """Returns typeahead suggestions for a title prefix, or None while the index is still building."""
+    return path_suggest_index.suggest(query, limit)
+
+def refresh_path_neighbors(path_id):
+    """Computes a new path's related paths and slots it into the lists of its own nearest paths."""
+    res = supabase_client.rpc('refresh_path_neighbors', {
+        'p_path_id': path_id,
+        'p_k': config.RELATED_PATHS_COUNT
+    }).execute()
+    return res.data or 0
+
+def refill_path_neighbors(limit):
+    """Recomputes up to `limit` related-path lists that are short of neighbors. Returns how many it did."""
+    res = supabase_client.rpc('refill_path_neighbors', {
+        'p_k': config.RELATED_PATHS_COUNT,
+        'p_limit': limit
+    }).execute()
+    return res.data or 0
+
+def get_related_paths(path_id, limit):
+    return supabase_client.rpc('get_related_paths', {'p_path_id': path_id, 'p_limit': limit}).execute()
+
+def _create_related_paths_job():
+    job = RelatedPathsJob(
+        refresh_fn=refresh_path_neighbors,
+        refill_fn=refill_path_neighbors,
+        refill_batch_size=config.RELATED_PATHS_REFILL_BATCH_SIZE,
+        backfill_on_start=config.RELATED_PATHS_BACKFILL_ON_START
+    )
+
+    def on_catalog_change(event, path):
+        if event == 'created':
+            job.path_created(path['id'])
+        elif event == 'deleted':
+            job.path_deleted(path['id'])
+
+    register_catalog_listener(on_catalog_change)
+    return job
+
+# Keeps the precomputed related-path lists (path_neighbors) current in the background.
+related_paths_job = _create_related_paths_job()
+
+def _vector_search_rpc(function_name, params):
+    """Calls a similarity RPC with the configured HNSW ef_search, falling back to the pre-HNSW signature."""
+    try:
+        return supabase_client.rpc(function_name, {**params, 'ef_search': config.VECTOR_EF_SEARCH}).execute().data
+    except Exception as e:
+        logger.warning(f"DB: {function_name} RPC failed with ef_search. Retrying without it, apply "
+                       f"database/migrations/002_vector_index.sql if this persists. Error: {e}")
+        return supabase_client.rpc(function_name, params).execute().data
 
 def find_similar_paths(embedding, threshold, count):
-    """Calls the match_similar_paths RPC in Supabase."""
+    """
+    Returns up to `count` paths whose title embedding is more similar than `threshold`, as
+    {id, title, short_description, similarity} dicts. Uses the in-process vector index when it
+    is ready, otherwise the match_similar_paths RPC.
+    """
     logger.info(f"DB: Finding similar paths with threshold {threshold}")
-    return supabase_client.rpc('match_similar_paths', {
+    matches = _search_vector_index(embedding, threshold, count)
+    if matches is not None:
+        return matches
+    return _vector_search_rpc('match_similar_paths', {
         'query_embedding': embedding,
         'match_threshold': threshold,
         'match_count': count
-    }).execute()
-
-def hybrid_search_paths(query_text):
-    """
-    Performs a hybrid search using both semantic vector search and keyword text search.
-    """
-    logger.info(f"DB: Hybrid search for query: '{query_text}'")
+    }) or []
 
+def _semantic_search_leg(query_text):
     query_embedding = ai_service.get_embedding(query_text)
-    semantic_res = supabase_client.rpc('search_paths_semantic', {
-        'query_embedding': query_embedding,
-        'match_threshold': 0.6,
-        'match_count': 10
-    }).execute()
+    matches = _search_vector_index(query_embedding, 0.6, 10)
+    if matches is None:
+        matches = _vector_search_rpc('search_paths_semantic', {
+            'query_embedding': query_embedding,
+            'match_threshold': 0.6,
+            'match_count': 10
+        })
+
+    return [{
+        "id": item['id'],
+        "match_type": "semantic",
+        "result_in": "title",
+        "similarity": round(item['similarity'], 4),
+        "title": item['title']
+    } for item in (matches or [])]
+
+def _keyword_search_leg(query_text):
+    try:
+        keyword_res = supabase_client.rpc('search_paths_fulltext', {
+            'search_query': query_text,
+            'match_count': 10
+        }).execute()
+    except Exception as e:
+        logger.warning(f"DB: search_paths_fulltext RPC failed. Falling back to the ILIKE keyword search. Error: {e}")
+        search_term = f"%{query_text}%"
+        keyword_res = supabase_client.rpc('search_paths_keyword', {
+            'search_term': search_term,
+            'match_count': 10
+        }).execute()
 
-    search_term = f"%{query_text}%"
-    keyword_res = supabase_client.rpc('search_paths_keyword', {
-        'search_term': search_term,
-        'match_count': 10
-    }).execute()
+    return [{
+        "id": item['id'],
+        "match_type": "keyword",
+        "result_in": item['result_in'],
+        "similarity": None,
+        "title": item['title']
+    } for item in (keyword_res.data or [])]
 
-    semantic_results = []
-    if semantic_res.data:
-        for item in semantic_res.data:
-            semantic_results.append({
-                "id": item['id'],
-                "match_type": "semantic",
-                "result_in": "title",
-                "similarity": round(item['similarity'], 4),
-                "title": item['title']
-            })
-
-    keyword_results = []
-    if keyword_res.data:
-        for item in keyword_res.data:
-            keyword_results.append({
-                "id": item['id'],
-                "match_type": "keyword",
-                "result_in": item['result_in'],
-                "similarity": None,
-                "title": item['title']
-            })
+def _await_search_leg(name, future, deadline):
+    """Returns a leg's results, or None if it failed or missed its deadline."""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.warning(f"DB: Hybrid search {name} leg exceeded its latency budget.")
+    except Exception as e:
+        logger.error(f"DB: Hybrid search {name} leg failed. Error: {e}")
+    return None
 
+def _interleave_results(keyword_results, semantic_results):
     final_results = []
     seen_ids = set()
     len_k = len(keyword_results)
@@ -195,6 +524,58 @@ def hybrid_search_paths(query_text):
 
     return final_results
 
+def hybrid_search_paths(query_text):
+    """
+    Performs a hybrid search using both semantic vector search and keyword text search.
+    The two legs run concurrently, each within its own latency budget, so the search takes
+    about as long as the slower leg. Returns (results, degraded_legs), where degraded_legs
+    names the legs that failed or timed out and were left out of the results.
+    """
+    logger.info(f"DB: Hybrid search for query: '{query_text}'")
+
+    started = time.monotonic()
+    semantic_future = _search_executor.submit(_semantic_search_leg, query_text)
+    keyword_future = _search_executor.submit(_keyword_search_leg, query_text)
+
+    keyword_results = _await_search_leg('keyword', keyword_future,
+                                        started + config.SEARCH_KEYWORD_TIMEOUT_SECONDS)
+    semantic_results = _await_search_leg('semantic', semantic_future,
+                                         started + config.SEARCH_SEMANTIC_TIMEOUT_SECONDS)
+
+    if keyword_results is None and semantic_results is None:
+        raise Exception(f"Both hybrid search legs failed for query '{query_text}'")
+
+    degraded_legs = [name for name, results in (('semantic', semantic_results), ('keyword', keyword_results))
+                     if results is None]
+    return _interleave_results(keyword_results or [], semantic_results or []), degraded_legs
+
+def normalize_search_query(query_text):
+    """Case-folds a query and collapses its whitespace, so trivially different queries share a cache entry."""
+    return ' '.join(query_text.split()).casefold()
+
+def cached_hybrid_search_paths(query_text):
+    """
+    hybrid_search_paths behind search_result_cache. Returns (results, degraded_legs, cache_hit).
+    Concurrent misses for the same query wait for one search. Degraded results are not cached, so a
+    leg that timed out once is retried on the next request.
+    """
+    query_text = normalize_search_query(query_text)
+    catalog_version = get_catalog_version()
+    cache_key = (catalog_version, query_text)
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return cached, [], True
+
+    def search():
+        results, degraded_legs = hybrid_search_paths(query_text)
+        # A result computed while the catalog changed may be stale, so it is not stored.
+        if not degraded_legs and get_catalog_version() == catalog_version:
+            search_result_cache.set(cache_key, results)
+        return results, degraded_legs
+
+    results, degraded_legs = _search_flights.do(cache_key, search)
+    return results, degraded_legs, False
+
 def create_task_log(task_id):
     """Creates a new entry for a task in the logs table."""
     return supabase_client.table('task_progress_logs').insert({
@@ -210,8 +591,36 @@ def update_task_log(task_id, new_log_entry):
     }).execute()
 
 def get_task_log(task_id):
-    """Retrieves the logs for a specific task."""
-    return supabase_client.table('task_progress_logs').select('logs').eq('task_id', task_id).single().execute()
+    """Retrieves the header row of a task: its legacy logs, and its summary once compacted."""
+    return supabase_client.table('task_progress_logs').select('logs, status, summary').eq(
+        'task_id', task_id).maybe_single().execute()
+
+def mark_task_finished(task_id, status):
+    """Records the final status of a task so the retention janitor can compact it later."""
+    return supabase_client.table('task_progress_logs').update({
+        'status': status,
+        'finished_at': datetime.now(timezone.utc).isoformat()
+    }).eq('task_id', task_id).execute()
+
+def compact_task_logs(retention_seconds, stale_seconds):
+    """
+    Compacts finished tasks older than retention_seconds to a summary row and purges their events.
+    Returns {'tasks_abandoned', 'tasks_compacted', 'events_purged'}.
+    """
+    res = supabase_client.rpc('compact_task_logs', {
+        'p_retention_seconds': retention_seconds,
+        'p_stale_seconds': stale_seconds
+    }).execute()
+    return res.data or {}
+
+def insert_task_events(events):
+    """Appends task events ({task_id, seq, payload} rows) in a single multi-row insert."""
+    return supabase_client.table('task_events').insert(events).execute()
+
+def get_task_events(task_id, after_seq=0):
+    """Retrieves a task's events with a seq greater than after_seq, oldest first."""
+    return supabase_client.table('task_events').select('seq, payload').eq('task_id', task_id).gt(
+        'seq', after_seq).order('seq').execute()
 
 def _create_progress_record(user_id, path_id):
     """
@@ -230,15 +639,56 @@ def _create_progress_record(user_id, path_id):
     return insert_res.data[0]
 
 def upsert_level_progress(user_wallet, path_id, level_index, correct_answers, total_questions):
+    """
+    Handles starting a path if it doesn't exist, updating the score for a specific level,
+    and automatically marking the entire path as complete if all levels are done.
+    All of this happens in one transaction via the record_level_progress RPC.
+    Returns {'level_complete': bool, 'path_complete': bool}.
+    In write-behind mode the result is only buffered, and path_complete is None since the
+    completion check has not run yet.
+    """
+    if progress_buffer is not None:
+        if get_user_id_by_wallet(user_wallet) is None:
+            raise ValueError(f"User not found for wallet {user_wallet}")
+        progress_buffer.add(user_wallet, path_id, level_index, correct_answers, total_questions)
+        return {'level_complete': True, 'path_complete': None}
+
+    logger.info(f"DB: Recording level {level_index} of path {path_id} for wallet {user_wallet} "
+                f"with score {correct_answers}/{total_questions}.")
+    try:
+        res = supabase_client.rpc('record_level_progress', {
+            'p_wallet_address': user_wallet.lower(),
+            'p_path_id': path_id,
+            'p_level_number': level_index,
+            'p_correct_answers': correct_answers,
+            'p_total_questions': total_questions
+        }).execute()
+    except Exception as e:
+        if 'User not found' in str(e):
+            raise ValueError(f"User not found for wallet {user_wallet}")
+        logger.warning(f"DB: record_level_progress RPC failed. Falling back to separate queries. Error: {e}")
+        _write_in_order_with_buffer(user_wallet, [(path_id, level_index)], lambda: _upsert_level_progress_legacy(
+            user_wallet, path_id, level_index, correct_answers, total_questions))
+        return {
+            'level_complete': True,
+            'path_complete': get_path_completion_status(user_wallet, path_id)
+        }
+
+    state = res.data[0] if res and res.data else {}
+    return {
+        'level_complete': bool(state.get('level_complete', True)),
+        'path_complete': bool(state.get('path_complete', False))
+    }
+
+def _upsert_level_progress_legacy(user_wallet, path_id, level_index, correct_answers, total_questions):
     """
     Handles starting a path if it doesn't exist, updating the score for a specific level,
     and automatically marking the entire path as complete if all levels are done.
     """
 
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         raise ValueError(f"User not found for wallet {user_wallet}")
-    user_id = user_res.data['id']
 
     progress_res = supabase_client.table('user_progress').select('id').eq('user_id', user_id).eq('path_id',
                                                                                                  path_id).execute()
@@ -263,15 +713,136 @@ def upsert_level_progress(user_wallet, path_id, level_index, correct_answers, to
     logger.info(f"DB: Checking if path is now complete for progress_id {progress_id}")
     supabase_client.rpc('check_and_complete_path', {'p_progress_id': progress_id}).execute()
 
+def record_level_progress_batch(user_wallet, results):
+    """
+    Records many level results for one user with the set-based record_level_progress_batch RPC.
+    `results` is a list of {path_id, level_index, correct_answers, total_questions} dicts with at
+    most one entry per (path_id, level_index).
+    Returns a {path_id: path_complete} dict for every path that was recorded; paths that do not
+    exist are left out.
+    """
+    if not results:
+        return {}
+    return _write_in_order_with_buffer(user_wallet, [(result['path_id'], result['level_index']) for result in results],
+                                       lambda: _write_level_progress_batch(user_wallet, results))
+
+def _write_level_progress_batch(user_wallet, results, failed=None):
+    """
+    Writes a batch without flushing the progress buffer first. The buffer's own flush calls this
+    while holding its flush lock, so going through record_level_progress_batch would deadlock.
+    If the RPC fails, results of paths whose per-level writes also fail are appended to `failed`.
+    """
+    logger.info(f"DB: Recording {len(results)} level results in one batch for wallet {user_wallet}.")
+    try:
+        res = supabase_client.rpc('record_level_progress_batch', {
+            'p_wallet_address': user_wallet.lower(),
+            'p_items': results
+        }).execute()
+    except Exception as e:
+        if 'User not found' in str(e):
+            raise ValueError(f"User not found for wallet {user_wallet}")
+        logger.warning(f"DB: record_level_progress_batch RPC failed. Falling back to per-level writes. Error: {e}")
+        return _record_level_progress_batch_legacy(user_wallet, results, failed)
+
+    return {int(row['path_id']): bool(row['path_complete']) for row in (res.data or [])}
+
+def _record_level_progress_batch_legacy(user_wallet, results, failed=None):
+    """
+    Writes a batch one level at a time. Paths whose writes fail are left out of the result, and
+    their results are appended to `failed` if it is given.
+    """
+    by_path = {}
+    for result in results:
+        by_path.setdefault(result['path_id'], []).append(result)
+
+    completion = {}
+    for path_id, path_results in by_path.items():
+        try:
+            for result in path_results:
+                _upsert_level_progress_legacy(user_wallet, path_id, result['level_index'],
+                                              result['correct_answers'], result['total_questions'])
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"DB: Failed to record batched progress for path {path_id}. Error: {e}")
+            if failed is not None:
+                failed.extend(path_results)
+            continue
+        # Not get_path_completion_status: that flushes the progress buffer, which may be what called us.
+        completion[path_id] = _read_path_completion(user_wallet, path_id)
+    return completion
+
+def _write_buffered_progress(entries):
+    """
+    Writes entries from the progress buffer, which may span many wallets, in one RPC call.
+    If that fails, writes them per wallet and returns the entries that could not be written,
+    so the buffer can queue them again. Entries of wallets without a user are dropped.
+    """
+    try:
+        supabase_client.rpc('record_level_progress_bulk', {'p_items': entries}).execute()
+        return []
+    except Exception as e:
+        logger.warning(f"DB: record_level_progress_bulk RPC failed. Writing per wallet instead. Error: {e}")
+
+    by_wallet = {}
+    for entry in entries:
+        by_wallet.setdefault(entry['wallet_address'], []).append({
+            key: value for key, value in entry.items() if key != 'wallet_address'
+        })
+    failed_entries = []
+    for wallet_address, results in by_wallet.items():
+        failed = []
+        try:
+            _write_level_progress_batch(wallet_address, results, failed)
+        except ValueError as ve:
+            logger.warning(f"DB: Dropping {len(results)} buffered level results. {ve}")
+            continue
+        except Exception as e:
+            logger.error(f"DB: Failed to write buffered progress for wallet {wallet_address}. Error: {e}")
+            failed = results
+        failed_entries.extend(dict(result, wallet_address=wallet_address) for result in failed)
+    return failed_entries
+
+# Optional write-behind mode: level results are coalesced in memory and written in bulk.
+progress_buffer = ProgressWriteBuffer(
+    _write_buffered_progress,
+    flush_interval_seconds=config.PROGRESS_FLUSH_INTERVAL_SECONDS,
+    max_pending=config.PROGRESS_FLUSH_MAX_PENDING
+) if config.PROGRESS_WRITE_BEHIND else None
+
+def flush_pending_progress(user_wallet, path_id=None):
+    """
+    Writes a wallet's buffered level results (optionally for one path only) before a read that
+    depends on them, such as a path completion check. A no-op when write-behind is disabled.
+    """
+    if progress_buffer is not None:
+        progress_buffer.flush(user_wallet, path_id)
+
+def _write_in_order_with_buffer(user_wallet, levels, write_fn):
+    """
+    Runs a direct progress write for (path_id, level_index) `levels` of a wallet. In write-behind mode
+    the wallet's older buffered results are written first, and ones that still fail are superseded,
+    so they cannot land on top of this write later.
+    """
+    if progress_buffer is None:
+        return write_fn()
+    return progress_buffer.write_through(user_wallet, levels, write_fn)
+
+def _get_buffered_level(user_wallet, path_id, level_index):
+    return progress_buffer.get(user_wallet, path_id, level_index) if progress_buffer is not None else None
+
 def get_level_score(user_wallet, path_id, level_index):
     """
     Retrieves the score for a specific level of a path for a user.
     """
     logger.info(f"DB: Getting level score for wallet {user_wallet}, path {path_id}, level {level_index}.")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         raise ValueError(f"User not found for wallet {user_wallet}")
-    user_id = user_res.data['id']
+
+    buffered = _get_buffered_level(user_wallet, path_id, level_index)
+    if buffered:
+        return {'correct_answers': buffered['correct_answers'], 'total_questions': buffered['total_questions']}
 
     progress_res = supabase_client.table('user_progress').select('id').eq('user_id', user_id).eq('path_id',
                                                                                                  path_id).maybe_single().execute()
@@ -336,10 +907,9 @@ def get_user_scores(user_id):
 def set_path_completed(user_wallet, path_id):
     """Sets a user's progress for a path to complete."""
     logger.info(f"DB: Marking path {path_id} as complete for wallet {user_wallet}")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         raise ValueError(f"User not found for wallet {user_wallet}")
-    user_id = user_res.data['id']
 
     progress_res = supabase_client.table('user_progress').select('id').eq('user_id', user_id).eq('path_id',
                                                                                                  path_id).maybe_single().execute()
@@ -356,10 +926,10 @@ def set_path_completed(user_wallet, path_id):
 def get_user_progress_for_paths(user_wallet, path_ids: list):
     """Fetches completion status for a list of paths for a specific user."""
     logger.info(f"DB: Getting progress for {len(path_ids)} paths for wallet {user_wallet}")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         return {}
-    user_id = user_res.data['id']
+    flush_pending_progress(user_wallet)
 
     progress_res = supabase_client.table('user_progress').select('path_id, is_complete').eq('user_id', user_id).in_(
         'path_id', path_ids).execute()
@@ -372,10 +942,14 @@ def get_user_progress_for_paths(user_wallet, path_ids: list):
 def get_path_completion_status(user_wallet, path_id):
     """Fetches completion status for a single path for a specific user."""
     logger.info(f"DB: Getting completion status for path {path_id} for wallet {user_wallet}")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    flush_pending_progress(user_wallet, path_id)
+    return _read_path_completion(user_wallet, path_id)
+
+def _read_path_completion(user_wallet, path_id):
+    """Reads a path's completion status from the database, ignoring results still in the progress buffer."""
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         return False
-    user_id = user_res.data['id']
 
     try:
 
@@ -392,10 +966,12 @@ def get_path_completion_status(user_wallet, path_id):
 def get_level_completion_status(user_wallet, path_id, level_index):
     """Checks if a specific level is marked as complete for a user."""
     logger.info(f"DB: Getting level completion for wallet {user_wallet}, path {path_id}, level {level_index}.")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         return False
-    user_id = user_res.data['id']
+
+    if _get_buffered_level(user_wallet, path_id, level_index):
+        return True
 
     res = supabase_client.rpc('get_single_level_completion', {
         'p_user_id': user_id,
@@ -408,10 +984,9 @@ def get_level_completion_status(user_wallet, path_id, level_index):
 def save_user_nft(user_wallet, path_id, token_id, contract_address, metadata_url, image_gateway_url):
     """Saves a record of a minted NFT for a user."""
     logger.info(f"DB: Saving NFT record for wallet {user_wallet}, path {path_id}, token {token_id}")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         raise ValueError(f"User not found for wallet {user_wallet}")
-    user_id = user_res.data['id']
 
     return supabase_client.table('user_nfts').insert({
         'user_id': user_id,
@@ -425,10 +1000,9 @@ def save_user_nft(user_wallet, path_id, token_id, contract_address, metadata_url
 def get_nfts_by_user(wallet_address):
     """Retrieves all NFTs owned by a specific user."""
     logger.info(f"DB: Fetching all NFTs for wallet {wallet_address}")
-    user_res = get_user_by_wallet_full(wallet_address)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(wallet_address)
+    if user_id is None:
         return []
-    user_id = user_res.data['id']
 
     response = supabase_client.table('user_nfts').select(
         'path_id, token_id, nft_contract_address, metadata_url, image_gateway_url, minted_at, learning_paths(title)'
@@ -441,11 +1015,10 @@ def get_nft_by_user_and_path(user_wallet, path_id):
     Checks if a specific user has already minted an NFT for a specific path using a robust query.
     """
     logger.info(f"DB: Checking for existing NFT for wallet {user_wallet} and path {path_id}")
-    user_res = get_user_by_wallet(user_wallet)
-    if not user_res or not user_res.data:
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
         logger.warning(f"DB: User not found for wallet {user_wallet} during NFT check.")
         return None
-    user_id = user_res.data['id']
 
     try:
 
@@ -460,6 +1033,34 @@ def get_nft_by_user_and_path(user_wallet, path_id):
         logger.error(f"DB: Error checking for existing NFT. Assuming it doesn't exist. Error: {e}", exc_info=True)
         return None
 
+def save_nft_voucher(user_wallet, path_id, nonce, metadata_url, image_gateway_url):
+    """Records an issued mint voucher so its redemption can later be matched back to the certificate."""
+    logger.info(f"DB: Saving NFT voucher for wallet {user_wallet}, path {path_id}, nonce {nonce}")
+    user_id = get_user_id_by_wallet(user_wallet)
+    if user_id is None:
+        raise ValueError(f"User not found for wallet {user_wallet}")
+
+    return supabase_client.table('nft_vouchers').insert({
+        'nonce': str(nonce),
+        'user_id': user_id,
+        'path_id': path_id,
+        'metadata_url': metadata_url,
+        'image_gateway_url': image_gateway_url
+    }).execute()
+
+def get_nft_voucher(nonce):
+    """Retrieves an issued mint voucher by its nonce."""
+    res = supabase_client.table('nft_vouchers').select('*').eq('nonce', str(nonce)).maybe_single().execute()
+    return res.data if res else None
+
+def mark_nft_voucher_redeemed(nonce, token_id):
+    """Marks a mint voucher as redeemed on-chain."""
+    logger.info(f"DB: Marking NFT voucher {nonce} as redeemed with token {token_id}")
+    return supabase_client.table('nft_vouchers').update({
+        'redeemed_at': datetime.now(timezone.utc).isoformat(),
+        'token_id': token_id
+    }).eq('nonce', str(nonce)).execute()
+
 def get_user_and_path_for_nft(user_wallet, path_id):
     """A helper function to get user and path info needed for NFT generation."""
     user_res = get_user_by_wallet_full(user_wallet)
@@ -0,0 +1,215 @@
+import atexit
+import threading
+import time
+from app import logger
+from app.config import config
+from . import supabase_service
+from .pubsub_service import progress_broker
+
+
+def is_terminal_event(entry):
+    """True for the final SUCCESS or ERROR status line of a generation."""
+    status = entry.get('status', '')
+    return 'SUCCESS:' in status or status.startswith('❌ ERROR')
+
+
+class TaskEventWriter:
+    """
+    Buffers generation progress events per task and writes them to the task_events table in bulk.
+    Events of a task get consecutive seq numbers in the order they are emitted. Buffers are flushed
+    every `flush_interval_seconds` in one multi-row insert, and a task's buffer is flushed at once
+    when it emits its final SUCCESS or ERROR line, so the outcome never waits on the timer.
+    """
+
+    def __init__(self, flush_interval_seconds):
+        self.flush_interval_seconds = flush_interval_seconds
+        self._buffers = {}
+        self._seqs = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='task-event-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, task_id, entry):
+        """Buffers an event for a task and returns the seq it was assigned."""
+        with self._lock:
+            seq = self._seqs.get(task_id, 0) + 1
+            self._seqs[task_id] = seq
+            self._buffers.setdefault(task_id, []).append({'task_id': task_id, 'seq': seq, 'payload': entry})
+        if is_terminal_event(entry) or self._stopped.is_set():
+            self.flush(task_id)
+        return seq
+
+    def flush(self, task_id=None):
+        """Writes the buffered events of one task, or of all tasks."""
+        with self._lock:
+            if task_id is None:
+                events = [event for buffered in self._buffers.values() for event in buffered]
+                self._buffers = {}
+            else:
+                events = self._buffers.pop(task_id, [])
+        if events:
+            self._write(events)
+
+    def finish(self, task_id):
+        """Flushes a task's remaining events and forgets its seq counter."""
+        self.flush(task_id)
+        with self._lock:
+            self._seqs.pop(task_id, None)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval_seconds):
+            self.flush()
+
+    @staticmethod
+    def _write(events):
+        try:
+            supabase_service.insert_task_events(events)
+            return
+        except Exception as e:
+            logger.warning(f"TASK_LOG: Failed to insert {len(events)} task events. Falling back to append_to_log. "
+                           f"Error: {e}")
+        for event in events:
+            try:
+                supabase_service.update_task_log(event['task_id'], event['payload'])
+            except Exception as e:
+                logger.error(f"TASK_LOG: Dropping event {event['seq']} of task {event['task_id']}. Error: {e}")
+
+    def close(self):
+        """Stops the background flusher and writes everything still buffered."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join(timeout=self.flush_interval_seconds + 5)
+        self.flush()
+
+
+class TaskLogJanitor:
+    """
+    Periodically compacts finished tasks older than the retention window to a summary row and
+    purges their event rows, via the compact_task_logs RPC. Running tasks that never finished
+    are closed out as abandoned after `stale_seconds`. Keeps running totals of what it removed.
+    """
+
+    def __init__(self, interval_seconds, retention_seconds, stale_seconds):
+        self.interval_seconds = interval_seconds
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+        self.runs = 0
+        self.tasks_abandoned = 0
+        self.tasks_compacted = 0
+        self.events_purged = 0
+        self.last_run_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='task-log-janitor', daemon=True)
+        self._thread.start()
+        atexit.register(self._stopped.set)
+
+    def run_once(self):
+        result = supabase_service.compact_task_logs(self.retention_seconds, self.stale_seconds)
+        with self._lock:
+            self.runs += 1
+            self.tasks_abandoned += result.get('tasks_abandoned', 0)
+            self.tasks_compacted += result.get('tasks_compacted', 0)
+            self.events_purged += result.get('events_purged', 0)
+            self.last_run_at = time.time()
+        logger.info(f"TASK_LOG_JANITOR: Abandoned {result.get('tasks_abandoned', 0)} stale tasks, compacted "
+                    f"{result.get('tasks_compacted', 0)} tasks and purged {result.get('events_purged', 0)} event rows.")
+        return result
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"TASK_LOG_JANITOR: Compaction run failed. Error: {e}", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "tasks_abandoned": self.tasks_abandoned,
+                "tasks_compacted": self.tasks_compacted,
+                "events_purged": self.events_purged,
+                "last_run_at": self.last_run_at
+            }
+
+
+task_event_writer = TaskEventWriter(flush_interval_seconds=config.TASK_LOG_FLUSH_INTERVAL_SECONDS)
+
+task_log_janitor = TaskLogJanitor(
+    interval_seconds=config.TASK_LOG_JANITOR_INTERVAL_SECONDS,
+    retention_seconds=config.TASK_LOG_RETENTION_SECONDS,
+    stale_seconds=config.TASK_LOG_STALE_SECONDS
+) if config.TASK_LOG_JANITOR_INTERVAL_SECONDS > 0 else None
+
+def get_janitor_stats():
+    """Totals of what the janitor removed in this process, or None if it is disabled here."""
+    return task_log_janitor.stats() if task_log_janitor is not None else None
+
+# Final status of tasks that have emitted their SUCCESS or ERROR line but not yet finished.
+_task_outcomes = {}
+
+
+def start_task(task_id):
+    """Creates the task's header row and opens its progress topic for subscribers."""
+    supabase_service.create_task_log(task_id)
+    progress_broker.open(task_id)
+
+
+def append_event(task_id, entry):
+    """Buffers an event for persistence and publishes it to live subscribers right away."""
+    if is_terminal_event(entry):
+        _task_outcomes[task_id] = 'succeeded' if 'SUCCESS:' in entry.get('status', '') else 'failed'
+    seq = task_event_writer.append(task_id, entry)
+    progress_broker.publish(task_id, {**entry, 'seq': seq})
+    return seq
+
+
+def finish_task(task_id):
+    """Flushes a task's remaining events, records its final status and closes its progress topic."""
+    task_event_writer.finish(task_id)
+    status = _task_outcomes.pop(task_id, 'failed')
+    try:
+        supabase_service.mark_task_finished(task_id, status)
+    except Exception as e:
+        logger.error(f"TASK_LOG: Failed to mark task {task_id} as {status}. Error: {e}")
+    progress_broker.close(task_id)
+
+
+def get_events(task_id, after_seq=0):
+    """
+    Returns (events, found) for a task, where events are the entries with a seq greater than
+    after_seq, each carrying its 'seq'. Tasks logged before task_events existed are served from
+    their legacy logs array, numbered by position, and compacted tasks from their final event.
+    """
+    events_res = supabase_service.get_task_events(task_id, after_seq)
+    if events_res and events_res.data:
+        return [{**row['payload'], 'seq': row['seq']} for row in events_res.data], True
+
+    log_res = supabase_service.get_task_log(task_id)
+    if not log_res or not log_res.data:
+        return [], False
+
+    summary = log_res.data.get('summary')
+    if summary:
+        final_event = summary.get('final_event')
+        last_seq = summary.get('last_seq', 0)
+        return ([{**final_event, 'seq': last_seq}] if final_event and last_seq > after_seq else []), True
+
+    legacy_logs = log_res.data.get('logs') or []
+    return [{**entry, 'seq': index} for index, entry in enumerate(legacy_logs, start=1) if index > after_seq], True
+
+
+def get_backlog(task_id, after_seq=0):
+    """
+    Returns (events, found) like get_events, merged with the events the progress broker still
+    holds in memory, since the newest ones may not have reached the database yet.
+    """
+    history = progress_broker.get_history(task_id)
+    persisted, found = get_events(task_id, after_seq)
+    backlog = {event['seq']: event for event in persisted}
+    backlog.update({event['seq']: event for event in (history or []) if event['seq'] > after_seq})
+    return [backlog[seq] for seq in sorted(backlog)], found or history is not None
@@ -0,0 +1,296 @@
+import json
+import threading
+import time
+from app import logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def is_available():
+    return np is not None
+
+
+def parse_embedding(value):
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class _NumpyBackend:
+    """Exact cosine search over a normalized float32 matrix. Removed rows are zeroed until compact()."""
+
+    name = 'numpy'
+
+    def __init__(self, dim, capacity):
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._row_ids = np.full(capacity, -1, dtype=np.int64)
+        self._rows = {}
+        self._size = 0
+
+    def add(self, path_id, vector):
+        row = self._rows.get(path_id)
+        if row is None:
+            if self._size == len(self._row_ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[path_id] = row
+            self._row_ids[row] = path_id
+        self._matrix[row] = vector / (np.linalg.norm(vector) or 1.0)
+
+    def _grow(self):
+        capacity = len(self._row_ids) * 2
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        row_ids = np.full(capacity, -1, dtype=np.int64)
+        row_ids[:self._size] = self._row_ids[:self._size]
+        self._matrix, self._row_ids = matrix, row_ids
+
+    def remove(self, path_id):
+        row = self._rows.pop(path_id, None)
+        if row is not None:
+            self._matrix[row] = 0
+            self._row_ids[row] = -1
+
+    @property
+    def dead_rows(self):
+        return self._size - len(self._rows)
+
+    def compact(self):
+        """Moves the live rows to the front of a right-sized matrix, dropping the zeroed ones."""
+        live = sorted(self._rows.items(), key=lambda item: item[1])
+        capacity = max(1024, len(live) * 2)
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        row_ids = np.full(capacity, -1, dtype=np.int64)
+        for new_row, (path_id, old_row) in enumerate(live):
+            matrix[new_row] = self._matrix[old_row]
+            row_ids[new_row] = path_id
+        self._matrix, self._row_ids = matrix, row_ids
+        self._rows = {path_id: row for row, (path_id, _) in enumerate(live)}
+        self._size = len(live)
+
+    def search(self, vector, k):
+        if not self._rows:
+            return []
+        similarities = self._matrix[:self._size] @ (vector / (np.linalg.norm(vector) or 1.0))
+        k = min(k, self._size)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(self._row_ids[row]), float(similarities[row])) for row in top if self._row_ids[row] >= 0]
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class _HnswBackend:
+    """Approximate cosine search with an hnswlib HNSW graph, for catalogs too large to scan."""
+
+    name = 'hnsw'
+
+    def __init__(self, dim, capacity):
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        self._index.set_ef(64)
+        self._ids = set()
+
+    def add(self, path_id, vector):
+        # Re-adding an existing label updates its vector (and revives it if it was marked deleted).
+        if self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(self._index.get_max_elements() * 2)
+        self._index.add_items(np.asarray([vector], dtype=np.float32), [path_id])
+        self._ids.add(path_id)
+
+    def remove(self, path_id):
+        if path_id in self._ids:
+            self._index.mark_deleted(path_id)
+            self._ids.discard(path_id)
+
+    @property
+    def dead_rows(self):
+        return self._index.get_current_count() - len(self._ids)
+
+    def compact(self):
+        """Rebuilds the graph from the live vectors, dropping the elements marked deleted."""
+        ids = sorted(self._ids)
+        vectors = self._index.get_items(ids) if ids else []
+        self._index = hnswlib.Index(space='cosine', dim=self._index.dim)
+        self._index.init_index(max_elements=max(1024, len(ids) * 2), ef_construction=200, M=16)
+        self._index.set_ef(64)
+        if ids:
+            self._index.add_items(np.asarray(vectors, dtype=np.float32), ids)
+
+    def search(self, vector, k):
+        k = min(k, len(self._ids))
+        if k == 0:
+            return []
+        labels, distances = self._index.knn_query(np.asarray([vector], dtype=np.float32), k=k)
+        return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class PathVectorIndex:
+    """
+    An in-process nearest-neighbour index over learning path title embeddings, so duplicate checks
+    and semantic search avoid a pgvector round trip. Catalogs below `hnsw_threshold` paths use an
+    exact NumPy scan; larger ones use HNSW when hnswlib is installed.
+    A background thread loads the catalog with `load_fn` (an iterable of path rows), then every
+    `reconcile_interval_seconds` compares the indexed paths with `versions_fn()` (path id -> embedding
+    model) and fetches missing or re-embedded paths with `fetch_fn(ids)`. Removed rows are reclaimed
+    once they make up `compact_ratio` of the index. Between reconciles, callers keep it current with
+    upsert() and remove().
+    Searches return None until the first load has finished, so callers can fall back to the database.
+    """
+
+    def __init__(self, dim, hnsw_threshold, load_fn, versions_fn, fetch_fn, reconcile_interval_seconds,
+                 compact_ratio=0.25):
+        self.dim = dim
+        self.hnsw_threshold = hnsw_threshold
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self.compact_ratio = compact_ratio
+        self._load_fn = load_fn
+        self._versions_fn = versions_fn
+        self._fetch_fn = fetch_fn
+        self._backend = None
+        self._paths = {}
+        self._versions = {}
+        self._added_at = {}
+        self._lock = threading.RLock()
+        self._thread = threading.Thread(target=self._run, name='path-vector-index', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        return self._backend is not None
+
+    def _new_backend(self, size):
+        capacity = max(1024, size * 2)
+        if size >= self.hnsw_threshold:
+            if hnswlib is not None:
+                return _HnswBackend(self.dim, capacity)
+            logger.warning(f"VECTOR_INDEX: {size} paths exceed the HNSW threshold but hnswlib is not installed. "
+                           f"Using an exact NumPy scan.")
+        return _NumpyBackend(self.dim, capacity)
+
+    def load(self, rows):
+        """Builds a fresh index from path rows ({id, title, short_description, title_embedding})."""
+        entries = []
+        for row in rows:
+            embedding = parse_embedding(row.get('title_embedding'))
+            if embedding:
+                entries.append((row, np.asarray(embedding, dtype=np.float32)))
+
+        backend = self._new_backend(len(entries))
+        paths = {}
+        versions = {}
+        for row, vector in entries:
+            backend.add(row['id'], vector)
+            paths[row['id']] = {'title': row.get('title'), 'short_description': row.get('short_description')}
+            versions[row['id']] = row.get('embedding_model')
+
+        with self._lock:
+            self._backend = backend
+            self._paths = paths
+            self._versions = versions
+            self._added_at = {}
+        logger.info(f"VECTOR_INDEX: Loaded {len(paths)} path embeddings into a {backend.name} index.")
+
+    def upsert(self, row):
+        embedding = parse_embedding(row.get('title_embedding'))
+        if not embedding:
+            return
+        with self._lock:
+            if self._backend is None:
+                return
+            self._backend.add(row['id'], np.asarray(embedding, dtype=np.float32))
+            self._paths[row['id']] = {'title': row.get('title'), 'short_description': row.get('short_description')}
+            self._versions[row['id']] = row.get('embedding_model')
+            self._added_at[row['id']] = time.monotonic()
+
+    def remove(self, path_id):
+        with self._lock:
+            if self._backend is None:
+                return
+            self._backend.remove(path_id)
+            self._paths.pop(path_id, None)
+            self._versions.pop(path_id, None)
+            self._added_at.pop(path_id, None)
+
+    def search(self, embedding, threshold, count):
+        """
+        Returns up to `count` paths with a cosine similarity above `threshold`, most similar first,
+        as {id, title, short_description, similarity} dicts, or None if the index is not loaded yet.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if self._backend is None:
+                return None
+            matches = self._backend.search(vector, count)
+            return [{'id': path_id, **self._paths[path_id], 'similarity': similarity}
+                    for path_id, similarity in matches if similarity > threshold and path_id in self._paths]
+
+    def reconcile(self):
+        """Brings the index in line with the database after missed or failed incremental updates."""
+        started = time.monotonic()
+        db_versions = self._versions_fn()
+        with self._lock:
+            indexed_ids = set(self._paths)
+            # Paths added after this reconcile began may not be in db_versions yet, or may be newer than it.
+            settled_ids = {path_id for path_id in indexed_ids if self._added_at.get(path_id, 0) < started}
+            stale_ids = settled_ids - set(db_versions)
+            changed_ids = {path_id for path_id in settled_ids & set(db_versions)
+                           if self._versions.get(path_id) != db_versions[path_id]}
+        missing_ids = set(db_versions) - indexed_ids
+
+        for path_id in stale_ids:
+            self.remove(path_id)
+        if missing_ids or changed_ids:
+            for row in self._fetch_fn(sorted(missing_ids | changed_ids)):
+                self.upsert(row)
+
+        with self._lock:
+            size = len(self._paths)
+            backend_name = self._backend.name
+            dead_rows = self._backend.dead_rows
+            if dead_rows and dead_rows >= self.compact_ratio * (size + dead_rows):
+                self._backend.compact()
+                logger.info(f"VECTOR_INDEX: Compacted {dead_rows} removed rows.")
+        if stale_ids or missing_ids or changed_ids:
+            logger.info(f"VECTOR_INDEX: Reconciled: removed {len(stale_ids)}, added {len(missing_ids)}, "
+                        f"re-embedded {len(changed_ids)}.")
+        # Rebuild once the catalog has grown past the HNSW threshold.
+        if backend_name == 'numpy' and size >= self.hnsw_threshold and hnswlib is not None:
+            self.load(self._load_fn())
+
+    def _run(self):
+        while True:
+            try:
+                self.load(self._load_fn())
+                break
+            except Exception as e:
+                logger.error(f"VECTOR_INDEX: Initial load failed, retrying in 30s. Error: {e}", exc_info=True)
+                time.sleep(30)
+        while True:
+            time.sleep(self.reconcile_interval_seconds)
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"VECTOR_INDEX: Reconcile failed. Error: {e}", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self._backend is not None,
+                "backend": self._backend.name if self._backend is not None else None,
+                "size": len(self._paths)
+            }
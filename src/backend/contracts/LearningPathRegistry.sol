@@ -4,8 +4,10 @@ pragma solidity ^0.8.18;
 contract LearningPathRegistry {
     address public owner;
     mapping(uint256 => bytes32) public pathContentHashes;
+    mapping(address => bool) public authorizedSigners;
 
     event PathRegistered(uint256 indexed pathId, bytes32 contentHash);
+    event SignerUpdated(address indexed signer, bool authorized);
 
     constructor() {
         owner = msg.sender;
@@ -16,7 +18,18 @@ contract LearningPathRegistry {
         _;
     }
 
-    function registerPath(uint256 _pathId, bytes32 _contentHash) public onlyOwner {
+    // The backend may send transactions from a pool of accounts; each one must be authorized here.
+    modifier onlyAuthorized() {
+        require(msg.sender == owner || authorizedSigners[msg.sender], "Not an authorized signer");
+        _;
+    }
+
+    function setSigner(address _signer, bool _authorized) public onlyOwner {
+        authorizedSigners[_signer] = _authorized;
+        emit SignerUpdated(_signer, _authorized);
+    }
+
+    function registerPath(uint256 _pathId, bytes32 _contentHash) public onlyAuthorized {
         // FIX: Remove the check that prevents updates.
         // This makes the function behave like an "upsert" for the owner,
         // which is more robust for development environments where the database might be reset.
@@ -5,19 +5,45 @@ import "@openzeppelin/contracts/token/ERC721/ERC721.sol";
 import "@openzeppelin/contracts/token/ERC721/extensions/ERC721URIStorage.sol";
 import "@openzeppelin/contracts/access/Ownable.sol";
 import "@openzeppelin/contracts/utils/Counters.sol";
+import "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
 import "hardhat/console.sol";
 
-contract NoodlCertificate is ERC721, ERC721URIStorage, Ownable {
+contract NoodlCertificate is ERC721, ERC721URIStorage, Ownable, EIP712 {
     using Counters for Counters.Counter;
     Counters.Counter private _tokenIdCounter;
 
     uint256 private constant TOKEN_ID_OFFSET = 74418500;
 
+    bytes32 private constant MINT_VOUCHER_TYPEHASH =
+        keccak256("MintVoucher(address to,uint256 pathId,string uri,uint256 nonce)");
+
+    // A voucher signed off-chain by the backend. Anyone may submit it, but the
+    // certificate is always minted to `to` with the signed `uri`.
+    struct MintVoucher {
+        address to;
+        uint256 pathId;
+        string uri;
+        uint256 nonce;
+    }
+
     mapping(address => mapping(uint256 => uint256)) public userPathToTokenId;
+    mapping(uint256 => bool) public usedVoucherNonces;
+    mapping(address => bool) public authorizedSigners;
+
+    event VoucherRedeemed(address indexed to, uint256 indexed pathId, uint256 indexed tokenId, uint256 nonce);
+    event SignerUpdated(address indexed signer, bool authorized);
+
+    // The backend may mint and sign vouchers from a pool of accounts; each one must be authorized here.
+    modifier onlyAuthorized() {
+        require(_isAuthorized(msg.sender), "Not an authorized signer");
+        _;
+    }
 
     constructor(address initialOwner)
         ERC721("Noodl Certificate", "NOODL")
         Ownable(initialOwner)
+        EIP712("NoodlCertificate", "1")
     {
         console.log("NoodlCertificate deployed! Owner:", initialOwner);
         console.log("Contract address:", address(this));
@@ -25,14 +51,55 @@ contract NoodlCertificate is ERC721, ERC721URIStorage, Ownable {
         console.log("First token will have ID:", TOKEN_ID_OFFSET);
     }
 
-    function setTokenURI(uint256 tokenId, string memory uri) public onlyOwner {
+    function setSigner(address signer, bool authorized) public onlyOwner {
+        authorizedSigners[signer] = authorized;
+        emit SignerUpdated(signer, authorized);
+    }
+
+    function _isAuthorized(address signer) internal view returns (bool) {
+        return signer == owner() || authorizedSigners[signer];
+    }
+
+    function setTokenURI(uint256 tokenId, string memory uri) public onlyAuthorized {
         console.log("Setting URI for token:", tokenId);
         _setTokenURI(tokenId, uri);
         console.log("URI set successfully");
     }
 
-    function safeMint(address to, uint256 pathId) public onlyOwner {
+    function safeMint(address to, uint256 pathId) public onlyAuthorized {
         console.log("=== MINT START ===");
+        _mintCertificate(to, pathId);
+        console.log("=== MINT COMPLETE (New Mint) ===");
+    }
+
+    function redeem(MintVoucher calldata voucher, bytes calldata signature) public returns (uint256) {
+        console.log("=== REDEEM START ===");
+        require(!usedVoucherNonces[voucher.nonce], "Voucher already redeemed.");
+
+        address signer = ECDSA.recover(_hashVoucher(voucher), signature);
+        console.log("Voucher signer:", signer);
+        require(_isAuthorized(signer), "Invalid voucher signature.");
+
+        usedVoucherNonces[voucher.nonce] = true;
+        uint256 tokenId = _mintCertificate(voucher.to, voucher.pathId);
+        _setTokenURI(tokenId, voucher.uri);
+
+        emit VoucherRedeemed(voucher.to, voucher.pathId, tokenId, voucher.nonce);
+        console.log("=== REDEEM COMPLETE ===");
+        return tokenId;
+    }
+
+    function _hashVoucher(MintVoucher calldata voucher) internal view returns (bytes32) {
+        return _hashTypedDataV4(keccak256(abi.encode(
+            MINT_VOUCHER_TYPEHASH,
+            voucher.to,
+            voucher.pathId,
+            keccak256(bytes(voucher.uri)),
+            voucher.nonce
+        )));
+    }
+
+    function _mintCertificate(address to, uint256 pathId) internal returns (uint256) {
         console.log("Recipient:", to);
         console.log("Path ID:", pathId);
 
@@ -51,7 +118,7 @@ contract NoodlCertificate is ERC721, ERC721URIStorage, Ownable {
 
         userPathToTokenId[to][pathId] = tokenId;
         console.log("Tracking updated: SUCCESS");
-        console.log("=== MINT COMPLETE (New Mint) ===");
+        return tokenId;
     }
 
     function burn(uint256 tokenId) public {
@@ -0,0 +1,67 @@
+-- Migration 001: ranked full-text search for learning paths.
+-- Adds the weighted search_vector generated column with its GIN index and the
+-- search_paths_fulltext RPC used by the keyword leg of /search. The previous
+-- search_paths_keyword RPC is left in place; the backend falls back to it if this
+-- migration has not been applied.
+--
+-- Adding a STORED generated column rewrites learning_paths, so run this outside of peak
+-- traffic on large catalogs. It is safe to run more than once.
+
+BEGIN;
+
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(short_description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(long_description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_learning_paths_search_vector ON learning_paths USING gin (search_vector);
+
+-- Ranked keyword search. Supports web-search syntax ("quoted phrases", -excluded, or) and matches
+-- a plain last word as a prefix, so a partially typed word still finds results.
+CREATE OR REPLACE FUNCTION search_paths_fulltext(
+  search_query text,
+  match_count int
+)
+RETURNS TABLE (id bigint, title text, result_in text, rank real)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  v_parts text[];
+  v_query tsquery;
+BEGIN
+  -- v_parts = {everything before the last word, the last word}, if the query ends in a plain word.
+  v_parts := regexp_match(search_query, '^(.*\s)?([[:alnum:]]+)$');
+
+  IF v_parts IS NOT NULL
+     AND lower(v_parts[2]) <> 'or'
+     AND coalesce(v_parts[1], '') !~* '(^|\s)or\s+$'
+     AND (length(search_query) - length(replace(search_query, '"', ''))) % 2 = 0 THEN
+    -- The last word may still be being typed, so it matches as a prefix, ANDed with the rest.
+    v_query := websearch_to_tsquery('english', coalesce(v_parts[1], ''))
+            && to_tsquery('english', quote_literal(lower(v_parts[2])) || ':*');
+  ELSE
+    -- A negated or quoted last word, or one right after "or", keeps plain web-search semantics.
+    v_query := websearch_to_tsquery('english', search_query);
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    lp.id,
+    lp.title,
+    CASE
+        WHEN ts_filter(lp.search_vector, '{a}') @@ v_query THEN 'title'
+        WHEN ts_filter(lp.search_vector, '{b}') @@ v_query THEN 'short_description'
+        ELSE 'long_description'
+    END AS result_in,
+    ts_rank_cd(lp.search_vector, v_query) AS rank
+  FROM learning_paths lp
+  WHERE lp.search_vector @@ v_query
+  ORDER BY 4 DESC, lp.id DESC
+  LIMIT match_count;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,74 @@
+-- Migration 002: HNSW vector index and index-friendly similarity RPCs.
+-- Builds an HNSW index over the title embeddings cast to halfvec (pgvector 0.7+) and rewrites
+-- match_similar_paths and search_paths_semantic to compute each distance once, order by it so the
+-- index is used, and take an ef_search argument applied with set_config for that call only.
+--
+-- The CREATE INDEX at the end blocks writes to learning_paths while it builds. On a large live
+-- catalog, skip it and run `python Maintenance/vector_index.py build --concurrently` instead.
+-- To also store the embeddings themselves as halfvec, run `python Maintenance/vector_index.py
+-- compact-storage` afterwards; the RPCs work with either column type.
+
+BEGIN;
+
+-- The new ef_search parameter changes the signatures, and PostgREST cannot choose between
+-- overloads that only differ by a defaulted argument, so the old versions are dropped first.
+DROP FUNCTION IF EXISTS match_similar_paths(vector, float, int);
+DROP FUNCTION IF EXISTS search_paths_semantic(int, float, vector);
+
+CREATE OR REPLACE FUNCTION match_similar_paths(
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (id bigint, title text, short_description text, similarity float)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
+  RETURN QUERY
+  SELECT nearest.id, nearest.title, nearest.short_description, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT lp.id, lp.title, lp.short_description,
+           lp.title_embedding::halfvec(768) <=> query_embedding::halfvec(768) AS distance
+    FROM learning_paths lp
+    WHERE lp.title_embedding IS NOT NULL
+    ORDER BY distance
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.distance < 1 - match_threshold
+  ORDER BY nearest.distance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_paths_semantic(
+  match_count int,
+  match_threshold float,
+  query_embedding vector(768),
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (id bigint, title text, similarity float)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
+  RETURN QUERY
+  SELECT nearest.id, nearest.title, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT lp.id, lp.title, lp.title_embedding::halfvec(768) <=> query_embedding::halfvec(768) AS distance
+    FROM learning_paths lp
+    WHERE lp.title_embedding IS NOT NULL
+    ORDER BY distance
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.distance < 1 - match_threshold
+  ORDER BY nearest.distance;
+END;
+$$;
+
+COMMIT;
+
+CREATE INDEX IF NOT EXISTS idx_learning_paths_title_embedding_hnsw ON learning_paths
+USING hnsw ((title_embedding::halfvec(768)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,61 @@
+-- Migration 003: embedding provenance and backfill RPCs.
+-- Adds learning_paths.embedding_model, which the backend fills in for every new embedding, and
+-- the RPCs used by Maintenance/backfill_embeddings.py. Apply it before deploying the backend
+-- version that writes embedding_model. Safe to run more than once.
+
+BEGIN;
+
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+-- Paths without an embedding, or with one from another model, after p_after_id in id order.
+CREATE OR REPLACE FUNCTION get_paths_needing_embedding(p_model text, p_after_id bigint, p_limit int)
+RETURNS TABLE (id bigint, title text)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT lp.id, lp.title
+  FROM learning_paths lp
+  WHERE lp.id > p_after_id
+    AND (lp.title_embedding IS NULL OR lp.embedding_model IS DISTINCT FROM p_model)
+  ORDER BY lp.id
+  LIMIT p_limit;
+$$;
+
+-- Writes a batch of embeddings in one statement. p_items: [{"id": 1, "embedding": [...]}, ...]
+CREATE OR REPLACE FUNCTION update_path_embeddings(p_model text, p_items jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths lp
+  SET title_embedding = (item->'embedding')::text::vector(768),
+      embedding_model = p_model
+  FROM jsonb_array_elements(p_items) AS item
+  WHERE lp.id = (item->>'id')::bigint;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+-- Labels embeddings that predate the embedding_model column as coming from p_model, for
+-- catalogs known to have been embedded with the current model all along.
+CREATE OR REPLACE FUNCTION adopt_unlabeled_embeddings(p_model text)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths
+  SET embedding_model = p_model
+  WHERE title_embedding IS NOT NULL AND embedding_model IS NULL;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+COMMIT;
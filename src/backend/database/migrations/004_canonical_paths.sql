@@ -0,0 +1,133 @@
+-- Migration 004: canonical paths for collapsing near-duplicates.
+-- Adds learning_paths.canonical_path_id, written by Maintenance/cluster_duplicates.py, and makes
+-- search and the in-process indexes skip paths that point at a canonical path.
+-- Apply it after migrations 001-003 and before deploying the backend version that filters on
+-- the column. Safe to run more than once.
+
+BEGIN;
+
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS canonical_path_id BIGINT REFERENCES learning_paths(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_learning_paths_canonical_path_id ON learning_paths (canonical_path_id)
+WHERE canonical_path_id IS NOT NULL;
+
+-- Replaces the whole mapping in one transaction. p_mapping: [{"id": 7, "canonical_path_id": 3}, ...]
+CREATE OR REPLACE FUNCTION set_canonical_paths(p_mapping jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths SET canonical_path_id = NULL WHERE canonical_path_id IS NOT NULL;
+
+  UPDATE learning_paths lp
+  SET canonical_path_id = (item->>'canonical_path_id')::bigint
+  FROM jsonb_array_elements(p_mapping) AS item
+  WHERE lp.id = (item->>'id')::bigint AND lp.id <> (item->>'canonical_path_id')::bigint;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_paths_semantic(
+  match_count int,
+  match_threshold float,
+  query_embedding vector(768),
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (id bigint, title text, similarity float)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
+  RETURN QUERY
+  SELECT nearest.id, nearest.title, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT lp.id, lp.title, lp.title_embedding::halfvec(768) <=> query_embedding::halfvec(768) AS distance
+    FROM learning_paths lp
+    WHERE lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+    ORDER BY distance
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.distance < 1 - match_threshold
+  ORDER BY nearest.distance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_paths_keyword(
+  search_term text,
+  match_count int
+)
+RETURNS TABLE (id bigint, title text, result_in text)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    lp.id,
+    lp.title,
+    CASE
+        WHEN lp.title ILIKE search_term THEN 'title'
+        WHEN lp.short_description ILIKE search_term THEN 'short_description'
+        WHEN lp.long_description ILIKE search_term THEN 'long_description'
+        ELSE 'unknown'
+    END AS result_in
+  FROM learning_paths lp
+  WHERE
+    lp.canonical_path_id IS NULL AND (
+      lp.title ILIKE search_term OR
+      lp.short_description ILIKE search_term OR
+      lp.long_description ILIKE search_term
+    )
+  LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_paths_fulltext(
+  search_query text,
+  match_count int
+)
+RETURNS TABLE (id bigint, title text, result_in text, rank real)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  v_parts text[];
+  v_query tsquery;
+BEGIN
+  -- v_parts = {everything before the last word, the last word}, if the query ends in a plain word.
+  v_parts := regexp_match(search_query, '^(.*\s)?([[:alnum:]]+)$');
+
+  IF v_parts IS NOT NULL
+     AND lower(v_parts[2]) <> 'or'
+     AND coalesce(v_parts[1], '') !~* '(^|\s)or\s+$'
+     AND (length(search_query) - length(replace(search_query, '"', ''))) % 2 = 0 THEN
+    -- The last word may still be being typed, so it matches as a prefix, ANDed with the rest.
+    v_query := websearch_to_tsquery('english', coalesce(v_parts[1], ''))
+            && to_tsquery('english', quote_literal(lower(v_parts[2])) || ':*');
+  ELSE
+    -- A negated or quoted last word, or one right after "or", keeps plain web-search semantics.
+    v_query := websearch_to_tsquery('english', search_query);
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    lp.id,
+    lp.title,
+    CASE
+        WHEN ts_filter(lp.search_vector, '{a}') @@ v_query THEN 'title'
+        WHEN ts_filter(lp.search_vector, '{b}') @@ v_query THEN 'short_description'
+        ELSE 'long_description'
+    END AS result_in,
+    ts_rank_cd(lp.search_vector, v_query) AS rank
+  FROM learning_paths lp
+  WHERE lp.search_vector @@ v_query AND lp.canonical_path_id IS NULL
+  ORDER BY 4 DESC, lp.id DESC
+  LIMIT match_count;
+END;
+$$;
+
+COMMIT;
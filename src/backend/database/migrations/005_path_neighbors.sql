@@ -0,0 +1,160 @@
+-- Migration 005: precomputed related paths.
+-- Adds the path_neighbors table, which holds the top-k most similar paths of each path by title
+-- embedding, the RPCs the backend uses to keep it current, and get_related_paths, which serves
+-- GET /paths/<path_id>/related. Apply it after migrations 002 and 004. Safe to run more than once.
+--
+-- Existing paths start without lists. Backfill them from one API process started with
+-- RELATED_PATHS_BACKFILL_ON_START=true, or by calling refill_path_neighbors(10, 1000) until it
+-- returns 0.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS path_neighbors (
+    path_id BIGINT NOT NULL REFERENCES learning_paths(id) ON DELETE CASCADE,
+    neighbor_id BIGINT NOT NULL REFERENCES learning_paths(id) ON DELETE CASCADE,
+    similarity REAL NOT NULL,
+    PRIMARY KEY (path_id, neighbor_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_path_neighbors_path_similarity ON path_neighbors (path_id, similarity DESC);
+-- Serves the ON DELETE CASCADE of neighbor_id.
+CREATE INDEX IF NOT EXISTS idx_path_neighbors_neighbor_id ON path_neighbors (neighbor_id);
+
+-- Replaces a path's neighbor list with its current top-k canonical paths.
+CREATE OR REPLACE FUNCTION compute_path_neighbors(p_path_id bigint, p_k int)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_embedding halfvec(768);
+BEGIN
+  SELECT title_embedding INTO v_embedding FROM learning_paths WHERE id = p_path_id;
+
+  DELETE FROM path_neighbors WHERE path_id = p_path_id;
+  IF v_embedding IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO path_neighbors (path_id, neighbor_id, similarity)
+  SELECT p_path_id, lp.id, 1 - (lp.title_embedding::halfvec(768) <=> v_embedding)
+  FROM learning_paths lp
+  WHERE lp.id <> p_path_id AND lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+  ORDER BY lp.title_embedding::halfvec(768) <=> v_embedding
+  LIMIT p_k;
+END;
+$$;
+
+-- Called for a newly created path: computes its own neighbors, then inserts it into the lists
+-- of the paths it is now closer to than their current k-th neighbor, trimming those lists back
+-- to k. Only the new path's nearest canonical paths (10k of them, at least 100) are considered,
+-- found with the HNSW index, and only their lists are read, so the cost does not grow with the
+-- catalog. Near-duplicates are left out on both sides. Returns the number of lists changed.
+CREATE OR REPLACE FUNCTION refresh_path_neighbors(p_path_id bigint, p_k int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_embedding halfvec(768);
+  v_candidates int := greatest(p_k * 10, 100);
+  v_affected bigint[];
+BEGIN
+  PERFORM compute_path_neighbors(p_path_id, p_k);
+
+  SELECT title_embedding INTO v_embedding FROM learning_paths WHERE id = p_path_id AND canonical_path_id IS NULL;
+  IF v_embedding IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  PERFORM set_config('hnsw.ef_search', v_candidates::text, true);
+
+  WITH candidates AS (
+    SELECT lp.id, 1 - (lp.title_embedding::halfvec(768) <=> v_embedding) AS similarity
+    FROM learning_paths lp
+    WHERE lp.id <> p_path_id AND lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+    ORDER BY lp.title_embedding::halfvec(768) <=> v_embedding
+    LIMIT v_candidates
+  ),
+  inserted AS (
+    INSERT INTO path_neighbors (path_id, neighbor_id, similarity)
+    SELECT c.id, p_path_id, c.similarity
+    FROM candidates c
+    CROSS JOIN LATERAL (
+      SELECT count(*) AS neighbor_count, min(pn.similarity) AS min_similarity
+      FROM path_neighbors pn
+      WHERE pn.path_id = c.id
+    ) cl
+    WHERE cl.neighbor_count < p_k OR c.similarity > cl.min_similarity
+    ON CONFLICT (path_id, neighbor_id) DO UPDATE SET similarity = EXCLUDED.similarity
+    RETURNING path_id
+  )
+  SELECT array_agg(path_id) INTO v_affected FROM inserted;
+
+  IF v_affected IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  DELETE FROM path_neighbors pn
+  USING (
+    SELECT path_id, neighbor_id,
+           row_number() OVER (PARTITION BY path_id ORDER BY similarity DESC, neighbor_id) AS position
+    FROM path_neighbors
+    WHERE path_id = ANY(v_affected)
+  ) ranked
+  WHERE pn.path_id = ranked.path_id AND pn.neighbor_id = ranked.neighbor_id AND ranked.position > p_k;
+
+  RETURN cardinality(v_affected);
+END;
+$$;
+
+-- Recomputes the lists of up to p_limit paths holding fewer neighbors than they could, i.e.
+-- paths that lost a neighbor to a deletion or were created before path_neighbors existed.
+-- Returns the number of paths recomputed; call it until it returns 0 to backfill everything.
+CREATE OR REPLACE FUNCTION refill_path_neighbors(p_k int, p_limit int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_target int;
+  v_path_id bigint;
+  v_count int := 0;
+BEGIN
+  SELECT least(p_k, count(*) - 1) INTO v_target
+  FROM learning_paths
+  WHERE title_embedding IS NOT NULL AND canonical_path_id IS NULL;
+  IF v_target <= 0 THEN
+    RETURN 0;
+  END IF;
+
+  FOR v_path_id IN
+    SELECT lp.id
+    FROM learning_paths lp
+    LEFT JOIN path_neighbors pn ON pn.path_id = lp.id
+    WHERE lp.title_embedding IS NOT NULL
+    GROUP BY lp.id
+    HAVING count(pn.neighbor_id) < v_target
+    ORDER BY lp.id
+    LIMIT p_limit
+  LOOP
+    PERFORM compute_path_neighbors(v_path_id, p_k);
+    v_count := v_count + 1;
+  END LOOP;
+
+  RETURN v_count;
+END;
+$$;
+
+-- Related paths of a path, most similar first, leaving out near-duplicates.
+CREATE OR REPLACE FUNCTION get_related_paths(p_path_id bigint, p_limit int)
+RETURNS TABLE (id bigint, title text, short_description text, similarity real)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT lp.id, lp.title, lp.short_description, pn.similarity
+  FROM path_neighbors pn
+  JOIN learning_paths lp ON lp.id = pn.neighbor_id
+  WHERE pn.path_id = p_path_id AND lp.canonical_path_id IS NULL
+  ORDER BY pn.similarity DESC, pn.neighbor_id
+  LIMIT p_limit;
+$$;
+
+COMMIT;
@@ -67,21 +67,32 @@ CREATE TABLE level_progress (
 );
 
 -- 7. FUNCTION FOR SIMILARITY SEARCH (for duplicate check)
+-- Distances are computed once, on the halfvec expression covered by the HNSW index in section 12,
+-- and rows are ordered by distance so the index is used. ef_search trades recall for speed.
 CREATE OR REPLACE FUNCTION match_similar_paths(
   query_embedding vector(768),
   match_threshold float,
-  match_count int
+  match_count int,
+  ef_search int DEFAULT 40
 )
 RETURNS TABLE (id bigint, title text, short_description text, similarity float)
 LANGUAGE plpgsql
 AS $$
 BEGIN
+  PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
   RETURN QUERY
-  SELECT lp.id, lp.title, lp.short_description, 1 - (lp.title_embedding <=> query_embedding) AS similarity
-  FROM learning_paths lp
-  WHERE 1 - (lp.title_embedding <=> query_embedding) > match_threshold
-  ORDER BY similarity DESC
-  LIMIT match_count;
+  SELECT nearest.id, nearest.title, nearest.short_description, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT lp.id, lp.title, lp.short_description,
+           lp.title_embedding::halfvec(768) <=> query_embedding::halfvec(768) AS distance
+    FROM learning_paths lp
+    WHERE lp.title_embedding IS NOT NULL
+    ORDER BY distance
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.distance < 1 - match_threshold
+  ORDER BY nearest.distance;
 END;
 $$;
 
@@ -131,21 +142,26 @@ $$;
 CREATE OR REPLACE FUNCTION search_paths_semantic(
   match_count int,
   match_threshold float,
-  query_embedding vector(768)
+  query_embedding vector(768),
+  ef_search int DEFAULT 40
 )
 RETURNS TABLE (id bigint, title text, similarity float)
 LANGUAGE plpgsql
 AS $$
 BEGIN
+  PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+
   RETURN QUERY
-  SELECT
-    lp.id,
-    lp.title,
-    1 - (lp.title_embedding <=> query_embedding) AS similarity
-  FROM learning_paths lp
-  WHERE 1 - (lp.title_embedding <=> query_embedding) > match_threshold
-  ORDER BY lp.title_embedding <=> query_embedding
-  LIMIT match_count;
+  SELECT nearest.id, nearest.title, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT lp.id, lp.title, lp.title_embedding::halfvec(768) <=> query_embedding::halfvec(768) AS distance
+    FROM learning_paths lp
+    WHERE lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+    ORDER BY distance
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.distance < 1 - match_threshold
+  ORDER BY nearest.distance;
 END;
 $$;
 
@@ -170,9 +186,11 @@ BEGIN
     END AS result_in
   FROM learning_paths lp
   WHERE
-    lp.title ILIKE search_term OR
-    lp.short_description ILIKE search_term OR
-    lp.long_description ILIKE search_term
+    lp.canonical_path_id IS NULL AND (
+      lp.title ILIKE search_term OR
+      lp.short_description ILIKE search_term OR
+      lp.long_description ILIKE search_term
+    )
   LIMIT match_count;
 END;
 $$;
@@ -189,10 +207,12 @@ CREATE INDEX IF NOT EXISTS trgm_idx_paths_title ON learning_paths USING gin (tit
 CREATE INDEX IF NOT EXISTS trgm_idx_paths_short_desc ON learning_paths USING gin (short_description gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS trgm_idx_paths_long_desc ON learning_paths USING gin (long_description gin_trgm_ops);
 
--- Ensure you have a vector index for fast semantic search.
--- This is an example using IVFFlat, which is good for performance/accuracy balance.
--- You can adjust `lists` based on the number of rows you expect.
--- CREATE INDEX ON learning_paths USING ivfflat (title_embedding vector_cosine_ops) WITH (lists = 100);
+-- HNSW index for semantic search and duplicate checks (pgvector 0.7+). It indexes the embeddings
+-- as halfvec, which halves the index size for a negligible loss of precision on text embeddings;
+-- the similarity RPCs order by this same expression so the planner can use it. Rebuild or tune it
+-- with Maintenance/vector_index.py.
+CREATE INDEX IF NOT EXISTS idx_learning_paths_title_embedding_hnsw ON learning_paths
+USING hnsw ((title_embedding::halfvec(768)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 
 -- 13. FUNCTION TO GET LEVEL COMPLETION STATUS FOR A USER AND PATH (UPDATED)
@@ -365,4 +385,609 @@ END;
 $$;
 
 -- Remove old RPC function if it exists and is no longer needed
-DROP FUNCTION IF EXISTS get_user_enrolled_paths_with_progress(bigint);
\ No newline at end of file
+DROP FUNCTION IF EXISTS get_user_enrolled_paths_with_progress(bigint);
+-- 18. NFT MINT VOUCHERS (LAZY MINTING)
+-- Vouchers are signed off-chain by the backend and redeemed on-chain by the user,
+-- so the backend no longer pays for certificate mints. The nonce is a uint256 stored as text.
+CREATE TABLE nft_vouchers (
+    nonce TEXT PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    path_id BIGINT NOT NULL REFERENCES learning_paths(id) ON DELETE CASCADE,
+    metadata_url TEXT NOT NULL,
+    image_gateway_url TEXT,
+    issued_at TIMESTAMPTZ DEFAULT now(),
+    redeemed_at TIMESTAMPTZ,
+    token_id BIGINT
+);
+
+CREATE INDEX IF NOT EXISTS idx_nft_vouchers_user_path ON nft_vouchers(user_id, path_id);
+
+-- 19. FUNCTION TO GET A FULL PATH WITH USER STATE IN ONE CALL
+-- Returns the nested path (levels and content items) with per-level completion, path completion
+-- and the minted flag for the given wallet. Returns NULL if the path does not exist.
+CREATE OR REPLACE FUNCTION get_path_for_user(p_path_id bigint, p_wallet_address text)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_user_id bigint;
+    v_progress_id bigint;
+    v_path_complete boolean := false;
+    v_is_minted boolean := false;
+    v_result jsonb;
+BEGIN
+    SELECT u.id INTO v_user_id FROM users u WHERE u.wallet_address = LOWER(p_wallet_address);
+
+    IF v_user_id IS NOT NULL THEN
+        SELECT up.id, up.is_complete INTO v_progress_id, v_path_complete
+        FROM user_progress up
+        WHERE up.user_id = v_user_id AND up.path_id = p_path_id;
+
+        v_is_minted := EXISTS (
+            SELECT 1 FROM user_nfts n WHERE n.user_id = v_user_id AND n.path_id = p_path_id
+        );
+    END IF;
+
+    SELECT (to_jsonb(lp) - 'title_embedding') || jsonb_build_object(
+        'levels', COALESCE((
+            SELECT jsonb_agg(
+                to_jsonb(l) || jsonb_build_object(
+                    'is_complete', COALESCE(lvp.is_complete, false),
+                    'content_items', COALESCE((
+                        SELECT jsonb_agg(to_jsonb(ci) ORDER BY ci.item_index)
+                        FROM content_items ci
+                        WHERE ci.level_id = l.id
+                    ), '[]'::jsonb)
+                )
+                ORDER BY l.level_number
+            )
+            FROM levels l
+            LEFT JOIN level_progress lvp
+                ON lvp.progress_id = v_progress_id AND lvp.level_number = l.level_number
+            WHERE l.path_id = lp.id
+        ), '[]'::jsonb),
+        'is_complete', COALESCE(v_path_complete, false),
+        'is_minted', v_is_minted
+    ) INTO v_result
+    FROM learning_paths lp
+    WHERE lp.id = p_path_id;
+
+    RETURN v_result;
+END;
+$$;
+
+-- 20. FUNCTION TO RECORD LEVEL PROGRESS IN ONE TRANSACTION
+-- Resolves the user, starts the path if needed, upserts the level score and runs the path
+-- completion check, returning the resulting level and path completion state.
+CREATE OR REPLACE FUNCTION record_level_progress(
+    p_wallet_address text,
+    p_path_id bigint,
+    p_level_number int,
+    p_correct_answers int,
+    p_total_questions int
+)
+RETURNS TABLE (level_complete boolean, path_complete boolean)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user_id bigint;
+    v_progress_id bigint;
+    v_path_complete boolean;
+BEGIN
+    SELECT u.id INTO v_user_id FROM users u WHERE u.wallet_address = LOWER(p_wallet_address);
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'User not found for wallet %', p_wallet_address USING ERRCODE = 'no_data_found';
+    END IF;
+
+    SELECT up.id INTO v_progress_id
+    FROM user_progress up
+    WHERE up.user_id = v_user_id AND up.path_id = p_path_id;
+
+    IF v_progress_id IS NULL THEN
+        INSERT INTO user_progress (user_id, path_id, started_at)
+        VALUES (v_user_id, p_path_id, now())
+        ON CONFLICT (user_id, path_id) DO NOTHING
+        RETURNING id INTO v_progress_id;
+
+        -- Another request may have started the path concurrently.
+        IF v_progress_id IS NULL THEN
+            SELECT up.id INTO v_progress_id
+            FROM user_progress up
+            WHERE up.user_id = v_user_id AND up.path_id = p_path_id;
+        END IF;
+    END IF;
+
+    INSERT INTO level_progress (progress_id, level_number, correct_answers, total_questions, is_complete)
+    VALUES (v_progress_id, p_level_number, p_correct_answers, p_total_questions, true)
+    ON CONFLICT (progress_id, level_number) DO UPDATE SET
+        correct_answers = EXCLUDED.correct_answers,
+        total_questions = EXCLUDED.total_questions,
+        is_complete = true;
+
+    PERFORM check_and_complete_path(v_progress_id);
+
+    SELECT up.is_complete INTO v_path_complete FROM user_progress up WHERE up.id = v_progress_id;
+
+    RETURN QUERY SELECT true, COALESCE(v_path_complete, false);
+END;
+$$;
+
+-- 21. FUNCTION TO RECORD A BATCH OF LEVEL RESULTS FOR ONE USER
+-- p_items is a JSON array of {path_id, level_index, correct_answers, total_questions}.
+-- Items for unknown paths are ignored; the completion check runs once per affected path.
+-- Returns a JSON array of {path_id, path_complete} for every path that was recorded.
+CREATE OR REPLACE FUNCTION record_level_progress_batch(p_wallet_address text, p_items jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user_id bigint;
+    v_path_ids bigint[];
+    v_progress_id bigint;
+    v_result jsonb;
+BEGIN
+    SELECT u.id INTO v_user_id FROM users u WHERE u.wallet_address = LOWER(p_wallet_address);
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'User not found for wallet %', p_wallet_address USING ERRCODE = 'no_data_found';
+    END IF;
+
+    SELECT COALESCE(array_agg(DISTINCT lp.id), '{}') INTO v_path_ids
+    FROM jsonb_array_elements(p_items) AS item
+    JOIN learning_paths lp ON lp.id = (item->>'path_id')::bigint;
+
+    INSERT INTO user_progress (user_id, path_id, started_at)
+    SELECT v_user_id, unnest(v_path_ids), now()
+    ON CONFLICT (user_id, path_id) DO NOTHING;
+
+    -- The latest item per level wins if the caller sent duplicates.
+    INSERT INTO level_progress (progress_id, level_number, correct_answers, total_questions, is_complete)
+    SELECT DISTINCT ON (up.id, (t.item->>'level_index')::int)
+        up.id,
+        (t.item->>'level_index')::int,
+        (t.item->>'correct_answers')::int,
+        (t.item->>'total_questions')::int,
+        true
+    FROM jsonb_array_elements(p_items) WITH ORDINALITY AS t(item, ord)
+    JOIN user_progress up ON up.user_id = v_user_id AND up.path_id = (t.item->>'path_id')::bigint
+    WHERE (t.item->>'path_id')::bigint = ANY(v_path_ids)
+    ORDER BY up.id, (t.item->>'level_index')::int, t.ord DESC
+    ON CONFLICT (progress_id, level_number) DO UPDATE SET
+        correct_answers = EXCLUDED.correct_answers,
+        total_questions = EXCLUDED.total_questions,
+        is_complete = true;
+
+    FOR v_progress_id IN
+        SELECT up.id FROM user_progress up WHERE up.user_id = v_user_id AND up.path_id = ANY(v_path_ids)
+    LOOP
+        PERFORM check_and_complete_path(v_progress_id);
+    END LOOP;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('path_id', up.path_id, 'path_complete', up.is_complete)), '[]'::jsonb)
+    INTO v_result
+    FROM user_progress up
+    WHERE up.user_id = v_user_id AND up.path_id = ANY(v_path_ids);
+
+    RETURN v_result;
+END;
+$$;
+
+-- 22. FUNCTION TO RECORD BUFFERED LEVEL RESULTS FOR MANY USERS
+-- p_items is a JSON array of {wallet_address, path_id, level_index, correct_answers, total_questions}.
+-- Used by the write-behind progress buffer; items for unknown wallets or paths are skipped.
+-- Returns a JSON array of {wallet_address, path_id, path_complete}.
+CREATE OR REPLACE FUNCTION record_level_progress_bulk(p_items jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_wallet text;
+    v_items jsonb;
+    v_result jsonb := '[]'::jsonb;
+BEGIN
+    FOR v_wallet, v_items IN
+        SELECT u.wallet_address, jsonb_agg(t.item ORDER BY t.ord)
+        FROM jsonb_array_elements(p_items) WITH ORDINALITY AS t(item, ord)
+        JOIN users u ON u.wallet_address = LOWER(t.item->>'wallet_address')
+        GROUP BY u.wallet_address
+    LOOP
+        SELECT v_result || COALESCE(jsonb_agg(r.elem || jsonb_build_object('wallet_address', v_wallet)), '[]'::jsonb)
+        INTO v_result
+        FROM jsonb_array_elements(record_level_progress_batch(v_wallet, v_items)) AS r(elem);
+    END LOOP;
+
+    RETURN v_result;
+END;
+$$;
+
+-- 23. TASK EVENTS TABLE (APPEND-ONLY GENERATION PROGRESS)
+-- One row per progress line, so appending never rewrites earlier entries and readers can
+-- fetch only what is new. task_progress_logs remains the per-task header row.
+CREATE TABLE task_events (
+    task_id UUID NOT NULL REFERENCES task_progress_logs(task_id) ON DELETE CASCADE,
+    seq INT NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (task_id, seq)
+);
+
+-- 24. TASK LOG LIFECYCLE AND RETENTION
+-- Finished tasks are compacted to a summary on their header row once they are older than the
+-- retention window, and their task_events detail rows are purged.
+ALTER TABLE task_progress_logs ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'running';
+ALTER TABLE task_progress_logs ADD COLUMN IF NOT EXISTS finished_at TIMESTAMPTZ;
+ALTER TABLE task_progress_logs ADD COLUMN IF NOT EXISTS summary JSONB;
+ALTER TABLE task_progress_logs ADD COLUMN IF NOT EXISTS compacted_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_task_progress_logs_uncompacted
+ON task_progress_logs(status, finished_at) WHERE compacted_at IS NULL;
+
+CREATE OR REPLACE FUNCTION compact_task_logs(p_retention_seconds int, p_stale_seconds int)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_abandoned int;
+    v_compacted int;
+    v_purged int;
+BEGIN
+    -- Tasks whose worker died before finishing are closed out as abandoned.
+    UPDATE task_progress_logs
+    SET status = 'abandoned', finished_at = now()
+    WHERE status = 'running' AND created_at < now() - make_interval(secs => p_stale_seconds);
+    GET DIAGNOSTICS v_abandoned = ROW_COUNT;
+
+    WITH expired AS (
+        SELECT t.task_id
+        FROM task_progress_logs t
+        WHERE t.status <> 'running'
+          AND t.compacted_at IS NULL
+          AND t.finished_at < now() - make_interval(secs => p_retention_seconds)
+        FOR UPDATE SKIP LOCKED
+    ),
+    event_stats AS (
+        SELECT e.task_id,
+               count(*) AS event_count,
+               max(e.seq) AS last_seq,
+               (array_agg(e.payload ORDER BY e.seq DESC))[1] AS final_event
+        FROM task_events e
+        JOIN expired x ON x.task_id = e.task_id
+        GROUP BY e.task_id
+    ),
+    compacted AS (
+        UPDATE task_progress_logs t
+        SET summary = jsonb_build_object(
+                'event_count', COALESCE(s.event_count, jsonb_array_length(t.logs), 0),
+                'last_seq', COALESCE(s.last_seq, jsonb_array_length(t.logs), 0),
+                'final_event', COALESCE(s.final_event, t.logs -> -1)
+            ),
+            logs = NULL,
+            compacted_at = now()
+        FROM expired x
+        LEFT JOIN event_stats s ON s.task_id = x.task_id
+        WHERE t.task_id = x.task_id
+        RETURNING t.task_id
+    ),
+    purged AS (
+        DELETE FROM task_events e
+        USING compacted c
+        WHERE e.task_id = c.task_id
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM compacted), (SELECT count(*) FROM purged) INTO v_compacted, v_purged;
+
+    RETURN jsonb_build_object(
+        'tasks_abandoned', v_abandoned,
+        'tasks_compacted', v_compacted,
+        'events_purged', v_purged
+    );
+END;
+$$;
+
+-- 25. FULL-TEXT SEARCH
+-- A weighted tsvector over title (A), short description (B) and long description (C), kept
+-- up to date by Postgres as a generated column. For an existing database, run
+-- database/migrations/001_fulltext_search.sql instead of re-running this section.
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(short_description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(long_description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_learning_paths_search_vector ON learning_paths USING gin (search_vector);
+
+-- Ranked keyword search. Supports web-search syntax ("quoted phrases", -excluded, or) and matches
+-- a plain last word as a prefix, so a partially typed word still finds results.
+CREATE OR REPLACE FUNCTION search_paths_fulltext(
+  search_query text,
+  match_count int
+)
+RETURNS TABLE (id bigint, title text, result_in text, rank real)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  v_parts text[];
+  v_query tsquery;
+BEGIN
+  -- v_parts = {everything before the last word, the last word}, if the query ends in a plain word.
+  v_parts := regexp_match(search_query, '^(.*\s)?([[:alnum:]]+)$');
+
+  IF v_parts IS NOT NULL
+     AND lower(v_parts[2]) <> 'or'
+     AND coalesce(v_parts[1], '') !~* '(^|\s)or\s+$'
+     AND (length(search_query) - length(replace(search_query, '"', ''))) % 2 = 0 THEN
+    -- The last word may still be being typed, so it matches as a prefix, ANDed with the rest.
+    v_query := websearch_to_tsquery('english', coalesce(v_parts[1], ''))
+            && to_tsquery('english', quote_literal(lower(v_parts[2])) || ':*');
+  ELSE
+    -- A negated or quoted last word, or one right after "or", keeps plain web-search semantics.
+    v_query := websearch_to_tsquery('english', search_query);
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    lp.id,
+    lp.title,
+    CASE
+        WHEN ts_filter(lp.search_vector, '{a}') @@ v_query THEN 'title'
+        WHEN ts_filter(lp.search_vector, '{b}') @@ v_query THEN 'short_description'
+        ELSE 'long_description'
+    END AS result_in,
+    ts_rank_cd(lp.search_vector, v_query) AS rank
+  FROM learning_paths lp
+  WHERE lp.search_vector @@ v_query AND lp.canonical_path_id IS NULL
+  ORDER BY 4 DESC, lp.id DESC
+  LIMIT match_count;
+END;
+$$;
+
+-- 26. PATH POPULARITY
+-- Learners per path (users who have started it), used to rank typeahead suggestions.
+CREATE OR REPLACE FUNCTION get_path_popularity()
+RETURNS TABLE (path_id bigint, learners bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT up.path_id, count(*) AS learners
+  FROM user_progress up
+  GROUP BY up.path_id;
+$$;
+
+-- 27. PRECOMPUTED RELATED PATHS
+-- The top-k most similar paths of each path by title embedding, so "related paths" is one
+-- indexed lookup instead of a vector scan per page view. They are served by get_related_paths
+-- in section 29, which needs the canonical_path_id column.
+CREATE TABLE IF NOT EXISTS path_neighbors (
+    path_id BIGINT NOT NULL REFERENCES learning_paths(id) ON DELETE CASCADE,
+    neighbor_id BIGINT NOT NULL REFERENCES learning_paths(id) ON DELETE CASCADE,
+    similarity REAL NOT NULL,
+    PRIMARY KEY (path_id, neighbor_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_path_neighbors_path_similarity ON path_neighbors (path_id, similarity DESC);
+-- Serves the ON DELETE CASCADE of neighbor_id.
+CREATE INDEX IF NOT EXISTS idx_path_neighbors_neighbor_id ON path_neighbors (neighbor_id);
+
+-- Replaces a path's neighbor list with its current top-k canonical paths.
+CREATE OR REPLACE FUNCTION compute_path_neighbors(p_path_id bigint, p_k int)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_embedding halfvec(768);
+BEGIN
+  SELECT title_embedding INTO v_embedding FROM learning_paths WHERE id = p_path_id;
+
+  DELETE FROM path_neighbors WHERE path_id = p_path_id;
+  IF v_embedding IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO path_neighbors (path_id, neighbor_id, similarity)
+  SELECT p_path_id, lp.id, 1 - (lp.title_embedding::halfvec(768) <=> v_embedding)
+  FROM learning_paths lp
+  WHERE lp.id <> p_path_id AND lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+  ORDER BY lp.title_embedding::halfvec(768) <=> v_embedding
+  LIMIT p_k;
+END;
+$$;
+
+-- Called for a newly created path: computes its own neighbors, then inserts it into the lists
+-- of the paths it is now closer to than their current k-th neighbor, trimming those lists back
+-- to k. Only the new path's nearest canonical paths (10k of them, at least 100) are considered,
+-- found with the HNSW index, and only their lists are read, so the cost does not grow with the
+-- catalog. Near-duplicates are left out on both sides. Returns the number of lists changed.
+CREATE OR REPLACE FUNCTION refresh_path_neighbors(p_path_id bigint, p_k int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_embedding halfvec(768);
+  v_candidates int := greatest(p_k * 10, 100);
+  v_affected bigint[];
+BEGIN
+  PERFORM compute_path_neighbors(p_path_id, p_k);
+
+  SELECT title_embedding INTO v_embedding FROM learning_paths WHERE id = p_path_id AND canonical_path_id IS NULL;
+  IF v_embedding IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  PERFORM set_config('hnsw.ef_search', v_candidates::text, true);
+
+  WITH candidates AS (
+    SELECT lp.id, 1 - (lp.title_embedding::halfvec(768) <=> v_embedding) AS similarity
+    FROM learning_paths lp
+    WHERE lp.id <> p_path_id AND lp.title_embedding IS NOT NULL AND lp.canonical_path_id IS NULL
+    ORDER BY lp.title_embedding::halfvec(768) <=> v_embedding
+    LIMIT v_candidates
+  ),
+  inserted AS (
+    INSERT INTO path_neighbors (path_id, neighbor_id, similarity)
+    SELECT c.id, p_path_id, c.similarity
+    FROM candidates c
+    CROSS JOIN LATERAL (
+      SELECT count(*) AS neighbor_count, min(pn.similarity) AS min_similarity
+      FROM path_neighbors pn
+      WHERE pn.path_id = c.id
+    ) cl
+    WHERE cl.neighbor_count < p_k OR c.similarity > cl.min_similarity
+    ON CONFLICT (path_id, neighbor_id) DO UPDATE SET similarity = EXCLUDED.similarity
+    RETURNING path_id
+  )
+  SELECT array_agg(path_id) INTO v_affected FROM inserted;
+
+  IF v_affected IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  DELETE FROM path_neighbors pn
+  USING (
+    SELECT path_id, neighbor_id,
+           row_number() OVER (PARTITION BY path_id ORDER BY similarity DESC, neighbor_id) AS position
+    FROM path_neighbors
+    WHERE path_id = ANY(v_affected)
+  ) ranked
+  WHERE pn.path_id = ranked.path_id AND pn.neighbor_id = ranked.neighbor_id AND ranked.position > p_k;
+
+  RETURN cardinality(v_affected);
+END;
+$$;
+
+-- Recomputes the lists of up to p_limit paths holding fewer neighbors than they could, i.e.
+-- paths that lost a neighbor to a deletion or were created before path_neighbors existed.
+-- Returns the number of paths recomputed; call it until it returns 0 to backfill everything.
+CREATE OR REPLACE FUNCTION refill_path_neighbors(p_k int, p_limit int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_target int;
+  v_path_id bigint;
+  v_count int := 0;
+BEGIN
+  SELECT least(p_k, count(*) - 1) INTO v_target
+  FROM learning_paths
+  WHERE title_embedding IS NOT NULL AND canonical_path_id IS NULL;
+  IF v_target <= 0 THEN
+    RETURN 0;
+  END IF;
+
+  FOR v_path_id IN
+    SELECT lp.id
+    FROM learning_paths lp
+    LEFT JOIN path_neighbors pn ON pn.path_id = lp.id
+    WHERE lp.title_embedding IS NOT NULL
+    GROUP BY lp.id
+    HAVING count(pn.neighbor_id) < v_target
+    ORDER BY lp.id
+    LIMIT p_limit
+  LOOP
+    PERFORM compute_path_neighbors(v_path_id, p_k);
+    v_count := v_count + 1;
+  END LOOP;
+
+  RETURN v_count;
+END;
+$$;
+
+-- 28. EMBEDDING PROVENANCE AND BACKFILL
+-- The model that produced each title embedding, so a change of GEMINI_MODEL_EMBEDDING can be
+-- detected and re-embedded with Maintenance/backfill_embeddings.py.
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+-- Paths without an embedding, or with one from another model, after p_after_id in id order.
+CREATE OR REPLACE FUNCTION get_paths_needing_embedding(p_model text, p_after_id bigint, p_limit int)
+RETURNS TABLE (id bigint, title text)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT lp.id, lp.title
+  FROM learning_paths lp
+  WHERE lp.id > p_after_id
+    AND (lp.title_embedding IS NULL OR lp.embedding_model IS DISTINCT FROM p_model)
+  ORDER BY lp.id
+  LIMIT p_limit;
+$$;
+
+-- Writes a batch of embeddings in one statement. p_items: [{"id": 1, "embedding": [...]}, ...]
+CREATE OR REPLACE FUNCTION update_path_embeddings(p_model text, p_items jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths lp
+  SET title_embedding = (item->'embedding')::text::vector(768),
+      embedding_model = p_model
+  FROM jsonb_array_elements(p_items) AS item
+  WHERE lp.id = (item->>'id')::bigint;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+-- Labels embeddings that predate the embedding_model column as coming from p_model, for
+-- catalogs known to have been embedded with the current model all along.
+CREATE OR REPLACE FUNCTION adopt_unlabeled_embeddings(p_model text)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths
+  SET embedding_model = p_model
+  WHERE title_embedding IS NOT NULL AND embedding_model IS NULL;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+-- 29. CANONICAL PATHS (NEAR-DUPLICATE COLLAPSING)
+-- Near-duplicate paths point at the path that represents their cluster; NULL means the path is
+-- canonical. Written by Maintenance/cluster_duplicates.py. Search, listing and related paths
+-- only show canonical paths. Deleting a canonical path makes its duplicates visible again.
+ALTER TABLE learning_paths ADD COLUMN IF NOT EXISTS canonical_path_id BIGINT REFERENCES learning_paths(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_learning_paths_canonical_path_id ON learning_paths (canonical_path_id)
+WHERE canonical_path_id IS NOT NULL;
+
+-- Replaces the whole mapping in one transaction. p_mapping: [{"id": 7, "canonical_path_id": 3}, ...]
+CREATE OR REPLACE FUNCTION set_canonical_paths(p_mapping jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated int;
+BEGIN
+  UPDATE learning_paths SET canonical_path_id = NULL WHERE canonical_path_id IS NOT NULL;
+
+  UPDATE learning_paths lp
+  SET canonical_path_id = (item->>'canonical_path_id')::bigint
+  FROM jsonb_array_elements(p_mapping) AS item
+  WHERE lp.id = (item->>'id')::bigint AND lp.id <> (item->>'canonical_path_id')::bigint;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+-- Related paths of a path, most similar first, leaving out near-duplicates.
+CREATE OR REPLACE FUNCTION get_related_paths(p_path_id bigint, p_limit int)
+RETURNS TABLE (id bigint, title text, short_description text, similarity real)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT lp.id, lp.title, lp.short_description, pn.similarity
+  FROM path_neighbors pn
+  JOIN learning_paths lp ON lp.id = pn.neighbor_id
+  WHERE pn.path_id = p_path_id AND lp.canonical_path_id IS NULL
+  ORDER BY pn.similarity DESC, pn.neighbor_id
+  LIMIT p_limit;
+$$;
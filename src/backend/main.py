@@ -1,4 +1,4 @@
-from app import app, config
+from app import app, config, socketio
 from ui.live_demo import create_and_launch_demo_ui
 import threading
 
@@ -17,7 +17,8 @@ if __name__ == '__main__':
         print("--- Mode: API in Background ---")
         print("Starting Flask API server in a background thread...")
         api_thread = threading.Thread(
-            target=lambda: app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+            target=lambda: socketio.run(app, host='0.0.0.0', port=5000, debug=True, use_reloader=False,
+                                        allow_unsafe_werkzeug=True)
         )
         api_thread.daemon = True
         api_thread.start()
@@ -32,7 +33,7 @@ if __name__ == '__main__':
     elif run_api:
         print("--- Mode: API Only ---")
         print("--- Starting Flask API Server on http://localhost:5000 ---")
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
     else:
         print("--- Mode: Disabled ---")
         print("All servers and UIs are disabled in the .env file. Exiting.")
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Benchmarks the ILIKE keyword search (search_paths_keyword) against the ranked full-text search
+(search_paths_fulltext) on a synthetic catalog.
+
+Both RPCs are created from database/schema.sql inside a throwaway `search_bench` schema, so the
+real learning_paths table is never touched. Point DATABASE_URL at a Postgres database you can
+write to (the direct connection string from Supabase > Project Settings > Database works):
+
+    pip install psycopg2-binary
+    DATABASE_URL=postgresql://... python testing/benchmarks/search_benchmark.py --rows 100000
+"""
+import argparse
+import os
+import re
+import statistics
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA_SQL = os.path.join(BACKEND_DIR, 'database', 'schema.sql')
+FULLTEXT_MIGRATION = os.path.join(BACKEND_DIR, 'database', 'migrations', '001_fulltext_search.sql')
+
+VOCABULARY = [
+    'python', 'javascript', 'rust', 'history', 'internet', 'rocket', 'science', 'physics', 'chemistry',
+    'biology', 'machine', 'learning', 'neural', 'networks', 'cooking', 'baking', 'bread', 'guitar',
+    'piano', 'music', 'theory', 'painting', 'watercolor', 'photography', 'finance', 'investing',
+    'budgeting', 'marketing', 'design', 'typography', 'blockchain', 'ethereum', 'smart', 'contracts',
+    'gardening', 'composting', 'astronomy', 'telescopes', 'philosophy', 'ethics', 'logic', 'statistics',
+    'probability', 'algebra', 'calculus', 'geometry', 'spanish', 'japanese', 'grammar', 'writing',
+    'poetry', 'fiction', 'meditation', 'yoga', 'running', 'nutrition', 'sleep', 'productivity',
+    'introduction', 'basics', 'advanced', 'guide', 'beginners', 'mastering', 'fundamentals', 'practical',
+]
+
+QUERIES = [
+    'python', 'machine learning', 'history of the internet', 'pyth', 'machine lear', 'rocket science',
+    'watercolor painting for beginners', 'smart contracts', 'calc', 'japanese grammar', 'sleep nutrition',
+    'advanced guitar theory', 'python -rust', '"machine learning" basics',
+]
+
+
+def extract_function(schema_sql, name):
+    match = re.search(rf"CREATE OR REPLACE FUNCTION {name}\(.*?\n\$\$;", schema_sql, re.DOTALL)
+    if not match:
+        raise RuntimeError(f"Function {name} not found in {SCHEMA_SQL}")
+    return match.group(0)
+
+
+def setup(cursor, rows):
+    print(f"Creating a synthetic catalog of {rows} paths in schema search_bench...")
+    cursor.execute("DROP SCHEMA IF EXISTS search_bench CASCADE")
+    cursor.execute("CREATE SCHEMA search_bench")
+    cursor.execute("SET search_path TO search_bench, public")
+    cursor.execute("""
+        CREATE TABLE learning_paths (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            title TEXT NOT NULL,
+            short_description TEXT,
+            long_description TEXT,
+            canonical_path_id BIGINT
+        )
+    """)
+    # Seeds random() for this session, so every run benchmarks the same catalog.
+    cursor.execute("SELECT setseed(0.42)")
+    cursor.execute("""
+        INSERT INTO learning_paths (title, short_description, long_description)
+        SELECT
+            (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(n)s)::int], ' ')
+             FROM generate_series(1, 3 + g %% 3)),
+            (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(n)s)::int], ' ')
+             FROM generate_series(1, 10 + g %% 5)),
+            (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(n)s)::int], ' ')
+             FROM generate_series(1, 60 + g %% 20))
+        FROM generate_series(1, %(rows)s) AS g
+    """, {'words': VOCABULARY, 'n': len(VOCABULARY), 'rows': rows})
+
+    print("Building trigram indexes for the ILIKE search...")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public")
+    for column in ('title', 'short_description', 'long_description'):
+        cursor.execute(f"CREATE INDEX ON learning_paths USING gin ({column} gin_trgm_ops)")
+
+    print("Applying the full-text migration...")
+    with open(FULLTEXT_MIGRATION) as f:
+        cursor.execute(f.read())
+
+    with open(SCHEMA_SQL) as f:
+        cursor.execute(extract_function(f.read(), 'search_paths_keyword'))
+    cursor.execute("ANALYZE learning_paths")
+
+
+def time_queries(cursor, sql, params_for, runs):
+    timings = []
+    for _ in range(runs):
+        for query in QUERIES:
+            started = time.perf_counter()
+            cursor.execute(sql, params_for(query))
+            cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Synthetic catalog size (default 100000)')
+    parser.add_argument('--runs', type=int, default=10, help='Passes over the query set per RPC (default 10)')
+    parser.add_argument('--limit', type=int, default=10, help='match_count passed to both RPCs (default 10)')
+    parser.add_argument('--keep', action='store_true', help='Keep the search_bench schema afterwards')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL not found in the environment or .env file")
+
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    cursor = connection.cursor()
+    try:
+        setup(cursor, args.rows)
+        cursor.execute("SET search_path TO search_bench, public")
+
+        print(f"Running {len(QUERIES)} queries x {args.runs} passes against each RPC...")
+        results = {
+            'search_paths_keyword (ILIKE)': time_queries(
+                cursor, "SELECT * FROM search_paths_keyword(%s, %s)",
+                lambda q: (f"%{q}%", args.limit), args.runs),
+            'search_paths_fulltext (tsvector)': time_queries(
+                cursor, "SELECT * FROM search_paths_fulltext(%s, %s)",
+                lambda q: (q, args.limit), args.runs),
+        }
+
+        print(f"\n{'RPC':<36}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, stats in results.items():
+            print(f"{name:<36}{stats['mean']:>10.2f}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
+
+        print("\nTop results per query (full-text):")
+        for query in QUERIES:
+            cursor.execute("SELECT title, result_in, rank FROM search_paths_fulltext(%s, 3)", (query,))
+            top = ", ".join(f"{title[:40]!r} ({result_in}, {rank:.3f})" for title, result_in, rank in cursor.fetchall())
+            print(f"  {query!r}: {top or '-'}")
+    finally:
+        if not args.keep:
+            cursor.execute("DROP SCHEMA IF EXISTS search_bench CASCADE")
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
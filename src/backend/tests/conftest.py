@@ -0,0 +1,19 @@
+import os
+import sys
+
+# The app package connects its clients and loads the contract ABIs at import time; these
+# placeholders let it import without a .env. Nothing here reaches a real network service.
+for name, value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_SERVICE_KEY": "test.service.key",
+    "ETHEREUM_NODE_URL": "http://localhost:8545",
+    "PATH_REGISTRY_CONTRACT_ADDRESS": "0x" + "11" * 20,
+    "NFT_CONTRACT_ADDRESS": "0x" + "22" * 20,
+    "GEMINI_API_KEY": "test-key",
+}.items():
+    os.environ.setdefault(name, value)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# blockchain_service opens contracts/*.json relative to the working directory.
+os.chdir(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,100 @@
+import re
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("supabase", reason="the backend requirements are not installed")
+
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import keccak
+from web3.exceptions import TransactionNotFound
+
+from app import app
+from app.services import blockchain_service
+
+CHAIN_ID = 31337
+SIGNER = Account.from_key("0x" + "a1" * 32)
+USER = "0xAb5801a7D398351b8bE11C439e05C5B3259aeC9B"
+
+
+def contract_source():
+    with open('contracts/NoodlCertificate.sol') as f:
+        return f.read()
+
+
+def contract_digest(voucher, verifying_contract):
+    """The digest NoodlCertificate._hashVoucher computes, derived from the contract source."""
+    source = contract_source()
+    name, version = re.search(r'EIP712\("([^"]+)",\s*"([^"]+)"\)', source).groups()
+    voucher_typehash = keccak(text=re.search(r'MINT_VOUCHER_TYPEHASH =\s*keccak256\("([^"]+)"\)', source).group(1))
+    domain_typehash = keccak(text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)")
+
+    domain_separator = keccak(encode(
+        ['bytes32', 'bytes32', 'bytes32', 'uint256', 'address'],
+        [domain_typehash, keccak(text=name), keccak(text=version), CHAIN_ID, verifying_contract]))
+    struct_hash = keccak(encode(
+        ['bytes32', 'address', 'uint256', 'bytes32', 'uint256'],
+        [voucher_typehash, voucher['to'], voucher['pathId'], keccak(text=voucher['uri']), voucher['nonce']]))
+    return keccak(b'\x19\x01' + domain_separator + struct_hash)
+
+
+@pytest.fixture
+def signed_voucher():
+    with mock.patch.object(blockchain_service, 'account', SIGNER), \
+            mock.patch.object(blockchain_service, '_get_chain_id', return_value=CHAIN_ID):
+        yield blockchain_service.sign_mint_voucher(USER, 7, "ipfs://bafkreimetadata")
+
+
+def test_voucher_signature_recovers_to_the_signer_on_the_contract_digest(signed_voucher):
+    digest = contract_digest(signed_voucher['voucher'], blockchain_service.nft_contract.address)
+    assert Account._recover_hash(digest, signature=signed_voucher['signature']) == SIGNER.address
+
+
+@pytest.mark.parametrize('field, value', [('to', "0x" + "33" * 20), ('pathId', 8), ('uri', "ipfs://other"),
+                                          ('nonce', 1)])
+def test_tampered_voucher_does_not_recover_to_the_signer(signed_voucher, field, value):
+    voucher = dict(signed_voucher['voucher'], **{field: value})
+    digest = contract_digest(voucher, blockchain_service.nft_contract.address)
+    assert Account._recover_hash(digest, signature=signed_voucher['signature']) != SIGNER.address
+
+
+def test_voucher_for_another_contract_does_not_recover_to_the_signer(signed_voucher):
+    digest = contract_digest(signed_voucher['voucher'], "0x" + "44" * 20)
+    assert Account._recover_hash(digest, signature=signed_voucher['signature']) != SIGNER.address
+
+
+def test_each_voucher_gets_a_fresh_nonce():
+    # The contract refuses a nonce it has seen, so reissuing a voucher must never reuse one.
+    with mock.patch.object(blockchain_service, 'account', SIGNER), \
+            mock.patch.object(blockchain_service, '_get_chain_id', return_value=CHAIN_ID):
+        nonces = {blockchain_service.sign_mint_voucher(USER, 7, "ipfs://bafkreimetadata")['voucher']['nonce']
+                  for _ in range(20)}
+    assert len(nonces) == 20
+    assert 'require(!usedVoucherNonces[voucher.nonce]' in contract_source()
+
+
+def test_confirming_a_redemption_twice_records_it_once():
+    redeemed = {'to': USER, 'path_id': 7, 'token_id': 74418501, 'nonce': 42}
+    voucher_record = {'metadata_url': "ipfs://bafkreimetadata", 'image_gateway_url': "https://gateway/ipfs/image"}
+    saved = []
+
+    with mock.patch.object(blockchain_service, 'get_redeemed_voucher', return_value=redeemed), \
+            mock.patch('app.services.supabase_service.get_nft_voucher', return_value=voucher_record), \
+            mock.patch('app.services.supabase_service.get_nft_by_user_and_path',
+                       side_effect=lambda *args: saved[0] if saved else None), \
+            mock.patch('app.services.supabase_service.save_user_nft', side_effect=lambda *args: saved.append(args)), \
+            mock.patch('app.services.supabase_service.mark_nft_voucher_redeemed'):
+        client = app.test_client()
+        for _ in range(2):
+            response = client.post('/paths/7/voucher/confirm', json={'user_wallet': USER, 'tx_hash': '0x9a1e'})
+            assert response.status_code == 200
+
+    assert len(saved) == 1
+
+
+def test_confirming_a_pending_redemption_asks_to_retry():
+    with mock.patch.object(blockchain_service, 'get_redeemed_voucher', side_effect=TransactionNotFound('pending')):
+        response = app.test_client().post('/paths/7/voucher/confirm', json={'user_wallet': USER, 'tx_hash': '0x9a1e'})
+    assert response.status_code == 202
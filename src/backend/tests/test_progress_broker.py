@@ -0,0 +1,76 @@
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("supabase", reason="the backend requirements are not installed")
+
+from app import app, socketio
+from app.routes.websocket_routes import NAMESPACE
+from app.services import task_log_service
+from app.services.pubsub_service import END_OF_STREAM, ProgressBroker, progress_broker
+
+
+def drain(subscription):
+    events = []
+    while not subscription.empty():
+        events.append(subscription.get_nowait())
+    return events
+
+
+def test_events_fan_out_to_every_subscriber_and_history_is_retained():
+    broker = ProgressBroker(history_limit=2, retain_seconds=60)
+    broker.open('task-1')
+    first = broker.subscribe('task-1')
+    broker.publish('task-1', {'seq': 1})
+    second = broker.subscribe('task-1')
+    broker.publish('task-1', {'seq': 2})
+    broker.publish('task-1', {'seq': 3})
+    broker.close('task-1')
+
+    assert drain(first) == [{'seq': 1}, {'seq': 2}, {'seq': 3}, END_OF_STREAM]
+    assert drain(second) == [{'seq': 2}, {'seq': 3}, END_OF_STREAM]
+    # The bounded history outlives the task for late joiners.
+    assert broker.get_history('task-1') == [{'seq': 2}, {'seq': 3}]
+    assert broker.subscribe('task-1') is None
+
+
+def progress_events(received):
+    return [(message['name'], message['args'][0]) for message in received]
+
+
+def test_join_replays_the_backlog_then_forwards_live_events():
+    client = socketio.test_client(app, namespace=NAMESPACE)
+    backlog = [{'seq': 1, 'status': 'Planning'}, {'seq': 2, 'status': 'Writing level 1'}]
+    progress_broker.open('task-2')
+    try:
+        with mock.patch.object(task_log_service, 'get_backlog', return_value=(backlog, True)) as get_backlog:
+            client.emit('join', {'task_id': 'task-2', 'after': 0}, namespace=NAMESPACE)
+        get_backlog.assert_called_once_with('task-2', 0)
+        assert progress_events(client.get_received(NAMESPACE)) == [
+            ('progress', {'task_id': 'task-2', 'seq': 1, 'status': 'Planning'}),
+            ('progress', {'task_id': 'task-2', 'seq': 2, 'status': 'Writing level 1'}),
+        ]
+
+        progress_broker.publish('task-2', {'seq': 3, 'status': 'Writing level 2'})
+    finally:
+        progress_broker.close('task-2')
+
+    assert progress_events(client.get_received(NAMESPACE)) == [
+        ('progress', {'task_id': 'task-2', 'seq': 3, 'status': 'Writing level 2'}),
+        ('end', {'task_id': 'task-2'}),
+    ]
+    client.disconnect(namespace=NAMESPACE)
+
+
+def test_join_of_a_finished_task_ends_after_the_replay():
+    client = socketio.test_client(app, namespace=NAMESPACE)
+    backlog = [{'seq': 4, 'status': 'SUCCESS: path created'}]
+    with mock.patch.object(task_log_service, 'get_backlog', return_value=(backlog, True)):
+        client.emit('join', {'task_id': 'task-3', 'after': 3}, namespace=NAMESPACE)
+
+    assert progress_events(client.get_received(NAMESPACE)) == [
+        ('progress', {'task_id': 'task-3', 'seq': 4, 'status': 'SUCCESS: path created'}),
+        ('end', {'task_id': 'task-3'}),
+    ]
+    client.disconnect(namespace=NAMESPACE)
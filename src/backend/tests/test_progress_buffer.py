@@ -0,0 +1,108 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("supabase", reason="the backend requirements are not installed")
+
+from app.services import supabase_service
+from app.services.progress_buffer_service import ProgressWriteBuffer
+
+
+class FakeSupabase:
+    """Fails the given RPCs and records every RPC call."""
+
+    def __init__(self, failing=('record_level_progress_bulk',)):
+        self.failing = failing
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        if name in self.failing:
+            return SimpleNamespace(execute=mock.Mock(side_effect=RuntimeError("function does not exist")))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[]))
+
+
+def test_flush_falls_back_per_wallet_when_bulk_rpc_fails():
+    client = FakeSupabase()
+    buffer = ProgressWriteBuffer(supabase_service._write_buffered_progress,
+                                 flush_interval_seconds=3600, max_pending=1000)
+    try:
+        with mock.patch.object(supabase_service, 'supabase_client', client), \
+                mock.patch.object(supabase_service, 'progress_buffer', buffer):
+            buffer.add('0xAbC', 1, 0, 3, 5)
+            buffer.add('0xdef', 2, 1, 4, 5)
+
+            flusher = threading.Thread(target=buffer.flush, daemon=True)
+            flusher.start()
+            flusher.join(timeout=5)
+            assert not flusher.is_alive(), "flush deadlocked in the per-wallet fallback"
+
+        batch_calls = {params['p_wallet_address']: params['p_items']
+                       for name, params in client.calls if name == 'record_level_progress_batch'}
+        assert batch_calls == {
+            '0xabc': [{'path_id': 1, 'level_index': 0, 'correct_answers': 3, 'total_questions': 5}],
+            '0xdef': [{'path_id': 2, 'level_index': 1, 'correct_answers': 4, 'total_questions': 5}],
+        }
+        assert buffer.stats()['pending'] == 0
+        assert buffer.stats()['written'] == 2
+    finally:
+        buffer.close()
+
+
+def test_entries_that_still_fail_are_queued_again():
+    client = FakeSupabase(failing=('record_level_progress_bulk', 'record_level_progress_batch'))
+    buffer = ProgressWriteBuffer(supabase_service._write_buffered_progress,
+                                 flush_interval_seconds=3600, max_pending=1000)
+
+    def upsert_legacy(user_wallet, path_id, level_index, correct_answers, total_questions):
+        if user_wallet == '0xdef':
+            raise RuntimeError("connection reset")
+        if user_wallet == '0x123':
+            raise ValueError(f"User not found for wallet {user_wallet}")
+
+    try:
+        with mock.patch.object(supabase_service, 'supabase_client', client), \
+                mock.patch.object(supabase_service, 'progress_buffer', buffer), \
+                mock.patch.object(supabase_service, '_upsert_level_progress_legacy', side_effect=upsert_legacy), \
+                mock.patch.object(supabase_service, '_read_path_completion', return_value=False):
+            buffer.add('0xabc', 1, 0, 3, 5)
+            buffer.add('0xdef', 2, 1, 4, 5)
+            buffer.add('0x123', 3, 1, 5, 5)
+
+            assert buffer.flush() == 2
+
+        # The transient failure is retried on the next flush; the wallet without a user is dropped.
+        assert buffer.get('0xdef', 2, 1)['correct_answers'] == 4
+        assert buffer.get('0x123', 3, 1) is None
+        assert buffer.stats()['pending'] == 1
+        assert buffer.stats()['written'] == 2
+        assert buffer.stats()['failed_flushes'] == 1
+    finally:
+        with mock.patch.object(buffer, '_flush_fn', return_value=[]):
+            buffer.close()
+
+
+def test_direct_write_supersedes_buffered_results_that_failed_to_flush():
+    client = FakeSupabase(failing=('record_level_progress_bulk',))
+    buffer = ProgressWriteBuffer(supabase_service._write_buffered_progress,
+                                 flush_interval_seconds=3600, max_pending=1000)
+    try:
+        with mock.patch.object(supabase_service, 'supabase_client', client), \
+                mock.patch.object(supabase_service, 'progress_buffer', buffer), \
+                mock.patch.object(supabase_service, '_write_level_progress_batch',
+                                  side_effect=[RuntimeError("connection reset"), {1: False}]) as write_batch:
+            buffer.add('0xabc', 1, 0, 2, 5)
+
+            # The older buffered score fails to flush, then the newer batch is written directly.
+            completion = supabase_service.record_level_progress_batch(
+                '0xabc', [{'path_id': 1, 'level_index': 0, 'correct_answers': 5, 'total_questions': 5}])
+
+        assert completion == {1: False}
+        assert [call.args[1][0]['correct_answers'] for call in write_batch.call_args_list] == [2, 5]
+        # The stale score must not be flushed on top of the direct write later.
+        assert buffer.get('0xabc', 1, 0) is None
+    finally:
+        buffer.close()
@@ -0,0 +1,56 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("supabase", reason="the backend requirements are not installed")
+
+from app.services import supabase_service
+from app.services.cache_service import LRUCache
+
+
+@pytest.fixture
+def cache():
+    with mock.patch.object(supabase_service, 'search_result_cache', LRUCache(max_size=10)) as cache:
+        yield cache
+
+
+def test_concurrent_misses_share_one_search(cache):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_search(query_text):
+        started.set()
+        release.wait(5)
+        return [{'id': 1}], []
+
+    with mock.patch.object(supabase_service, 'hybrid_search_paths', side_effect=slow_search) as search:
+        outcomes = []
+        shared_before = supabase_service._search_flights.shared
+        threads = [threading.Thread(target=lambda: outcomes.append(supabase_service.cached_hybrid_search_paths(
+            'Rust  Basics'))) for _ in range(3)]
+        threads[0].start()
+        assert started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while supabase_service._search_flights.shared < shared_before + 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+    assert search.call_count == 1
+    assert [results for results, _, _ in outcomes] == [[{'id': 1}]] * 3
+
+
+def test_result_is_not_cached_when_the_catalog_changes_mid_search(cache):
+    def search_during_create(query_text):
+        supabase_service._bump_catalog_version()
+        return [{'id': 1}], []
+
+    with mock.patch.object(supabase_service, 'hybrid_search_paths', side_effect=search_during_create):
+        supabase_service.cached_hybrid_search_paths('rust')
+
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,41 @@
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("supabase", reason="the backend requirements are not installed")
+
+from eth_account import Account
+
+from app.services import blockchain_service
+from app.services.blockchain_service import SignerPool
+
+
+@pytest.fixture
+def pool_and_node():
+    pool = SignerPool([Account.create()], strategy='least_pending', min_balance_wei=0, balance_check_interval=60)
+    with mock.patch.object(blockchain_service.w3.eth, 'get_transaction_count', return_value=5) as node:
+        yield pool, pool.signers[0], node
+
+
+def test_unsent_nonce_is_reused_without_colliding_with_ones_in_flight(pool_and_node):
+    pool, signer, node = pool_and_node
+    first, second = pool.allocate_nonce(signer), pool.allocate_nonce(signer)
+    assert (first, second) == (5, 6)
+
+    # The first send fails while the second is still being sent: the node has seen neither yet.
+    pool.release_nonce(signer, first, broadcast=False)
+    assert pool.allocate_nonce(signer) == 5
+    assert pool.allocate_nonce(signer) == 7
+    assert node.call_count == 1
+
+
+def test_resyncs_from_the_node_only_once_nothing_is_unsent(pool_and_node):
+    pool, signer, node = pool_and_node
+    first, second = pool.allocate_nonce(signer), pool.allocate_nonce(signer)
+    pool.release_nonce(signer, first, broadcast=False)
+    pool.release_nonce(signer, second, broadcast=True)
+
+    node.return_value = 7
+    assert pool.allocate_nonce(signer) == 7
+    assert node.call_count == 2
@@ -0,0 +1,62 @@
+import threading
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("flask", reason="the backend requirements are not installed")
+pytest.importorskip("numpy", reason="the backend requirements are not installed")
+
+from app.services import vector_index_service
+from app.services.vector_index_service import PathVectorIndex
+
+
+def path_row(path_id, vector, model='text-embedding-004'):
+    embedding = [0.0] * 4
+    embedding[vector] = 1.0
+    return {'id': path_id, 'title': f"Path {path_id}", 'short_description': '', 'title_embedding': embedding,
+            'embedding_model': model}
+
+
+def make_index(rows, compact_ratio=0.25):
+    db = {row['id']: row for row in rows}
+    with mock.patch.object(threading.Thread, 'start'):
+        index = PathVectorIndex(
+            dim=4, hnsw_threshold=10 ** 6, load_fn=lambda: list(db.values()),
+            versions_fn=lambda: {path_id: row['embedding_model'] for path_id, row in db.items()},
+            fetch_fn=lambda ids: [db[path_id] for path_id in ids],
+            reconcile_interval_seconds=60, compact_ratio=compact_ratio)
+    index.load(index._load_fn())
+    return index, db
+
+
+def test_reconcile_picks_up_re_embedded_paths():
+    index, db = make_index([path_row(1, 0), path_row(2, 1)])
+
+    # A backfill re-embeds path 1 with a new model, outside this process.
+    db[1] = path_row(1, 2, model='gemini-embedding-001')
+    index.reconcile()
+
+    assert [match['id'] for match in index.search([0, 0, 1, 0], 0.5, 5)] == [1]
+    assert index.search([1, 0, 0, 0], 0.5, 5) == []
+
+
+def test_removed_rows_are_compacted_past_the_ratio():
+    index, db = make_index([path_row(path_id, path_id % 4) for path_id in range(1, 9)], compact_ratio=0.25)
+    backend = index._backend
+
+    index.remove(1)
+    del db[1]
+    index.reconcile()
+    assert backend.dead_rows == 1
+
+    index.remove(2)
+    del db[2]
+    index.reconcile()
+    assert backend.dead_rows == 0
+    assert len(backend) == 6
+    assert {match['id'] for match in index.search([0, 0, 0, 1], 0.5, 5)} == {3, 7}
+
+
+def test_index_is_disabled_without_numpy():
+    with mock.patch.object(vector_index_service, 'np', None):
+        assert not vector_index_service.is_available()
@@ -70,6 +70,16 @@ def search_for_paths(query):
                                                                                                            list) else []
 
 
+def suggest_paths_as_you_type(query):
+    # Keystrokes only hit the in-memory suggestion index; the full hybrid search runs on "Search".
+    if not query or len(query) < 2:
+        return []
+    results = make_api_request("GET", f"{BACKEND_URL}/search/suggest", params={"q": query}, timeout=5) or []
+
+    return [[item.get('id'), item.get('title'), "suggestion"] for item in results] if isinstance(results,
+                                                                                                  list) else []
+
+
 def generate_path_live(topic, wallet):
     if not topic or not wallet:
         gr.Warning("Topic and wallet address are required.")
@@ -83,29 +93,36 @@ def generate_path_live(topic, wallet):
         if 'similar_path' in start_res:
             similar = start_res['similar_path']
             error_msg += f"\n\n**Similar Path Found:**\n- **ID:** {similar['id']}\n- **Title:** {similar['title']}"
+        elif 'task_id' in start_res:
+            error_msg += f"\n\n**Generation in progress:** `{start_res['task_id']}` ({start_res.get('title')})"
         yield error_msg, gr.Button(visible=False), gr.Button(visible=False)
         return
 
     task_id = start_res['task_id']
-    log = [f"### 🚀 Generation Started\n\nTask ID: `{task_id}`\n\n---"]
+    if start_res.get('attached'):
+        log = [f"### 🔗 Already Being Generated\n\n**{start_res.get('title')}** is already in progress; "
+               f"following it.\n\nTask ID: `{task_id}`\n\n---"]
+    else:
+        log = [f"### 🚀 Generation Started\n\nTask ID: `{task_id}`\n\n---"]
     yield "\n".join(log), gr.Button(visible=False), gr.Button(visible=False)
 
     final_path_id = None
     tx_url = None
-    last_log_count = 0
+    last_seq = 0
+    finished = False
 
     while True:
         time.sleep(2)
-        status_res = make_api_request("GET", f"{BACKEND_URL}/paths/generate/status/{task_id}")
+        status_res = make_api_request("GET", f"{BACKEND_URL}/paths/generate/status/{task_id}",
+                                      params={"after": last_seq})
         if "error" in status_res:
             log.append(f"**Error fetching status:** {json.dumps(status_res, indent=2)}")
             yield "\n".join(log), gr.Button(visible=False), gr.Button(visible=False)
             break
 
-        progress_data = status_res.get('progress', [])
+        new_logs = status_res.get('progress', [])
 
-        if len(progress_data) > last_log_count:
-            new_logs = progress_data[last_log_count:]
+        if new_logs:
             for item in new_logs:
                 log.append(f"- {item['status']}")
 
@@ -117,12 +134,13 @@ def generate_path_live(topic, wallet):
                         if tx_url:
                             log.append(f"\n\n[🔗 View Transaction on Block Explorer]({tx_url})")
 
-            last_log_count = len(progress_data)
+            last_seq = status_res.get('last_seq', last_seq)
+            finished = any("SUCCESS" in item['status'] or "ERROR" in item['status'] for item in new_logs)
             yield "\n".join(log), gr.Button(visible=final_path_id is not None,
                                             value=f"Continue to Path {final_path_id}"), gr.Button(
                 visible=tx_url is not None, link=tx_url)
 
-        if any("SUCCESS" in item['status'] or "ERROR" in item['status'] for item in progress_data):
+        if finished:
             break
 
 
@@ -477,6 +495,9 @@ def create_and_launch_demo_ui(port):
         # Dashboard Logic
         refresh_dashboard_button.click(fn=refresh_dashboard, inputs=[user_wallet], outputs=dashboard_outputs)
         search_button.click(search_for_paths, search_query_input, search_results_df)
+        search_query_input.change(suggest_paths_as_you_type, search_query_input, search_results_df,
+                                  show_progress="hidden")
+        search_query_input.submit(search_for_paths, search_query_input, search_results_df)
 
         generate_button.click(fn=generate_path_live, inputs=[generate_topic_input, user_wallet],
                               outputs=[generation_progress_output, generate_continue_button, generate_tx_button])